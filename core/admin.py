@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, Establishment, TimeSlot, Booking
+from . import db, services
+from .models import CustomUser, Establishment, TimeSlot, Booking, SlotFacet, DailyOccupancy, ArchivedTimeSlot, Waitlist
 
 
 @admin.register(CustomUser)
@@ -17,7 +18,7 @@ class CustomUserAdmin(UserAdmin):
 
 @admin.register(Establishment)
 class EstablishmentAdmin(admin.ModelAdmin):
-    list_display = ['name', 'establishment_type', 'city', 'owner']
+    list_display = ['name', 'establishment_type', 'city', 'max_seating', 'owner']
     list_filter = ['establishment_type', 'city', 'wifi_available', 'power_outlets']
     search_fields = ['name', 'city', 'address']
 
@@ -28,9 +29,23 @@ class TimeSlotAdmin(admin.ModelAdmin):
     list_filter = ['date', 'is_group_only', 'establishment']
     search_fields = ['title', 'establishment__name']
     
+    readonly_fields = ['reserved_places']
+    
     def available_places(self, obj):
+        # Lit le compteur dénormalisé : aucune requête supplémentaire par ligne
         return obj.available_capacity()
     available_places.short_description = 'Places disponibles'
+    
+    def changelist_view(self, request, extra_context=None):
+        if request.method != 'GET':
+            return super().changelist_view(request, extra_context)
+        # Liste en lecture seule : servie par la réplique (voir core/db.py),
+        # rendue dans le bloc car le gabarit évalue le queryset
+        with db.read_replica():
+            response = super().changelist_view(request, extra_context)
+            if hasattr(response, 'render'):
+                response.render()
+        return response
 
 
 @admin.register(Booking)
@@ -38,3 +53,71 @@ class BookingAdmin(admin.ModelAdmin):
     list_display = ['user', 'time_slot', 'number_of_places', 'status', 'created_at']
     list_filter = ['status', 'created_at']
     search_fields = ['user__username', 'time_slot__title']
+    actions = ['mark_completed', 'mark_no_show']
+    
+    def _record_attendance(self, request, queryset, attended):
+        # Un par un : verrou, signaux et rollups comme depuis le dashboard
+        recorded = 0
+        for booking in queryset:
+            try:
+                services.record_attendance(booking, attended)
+            except ValueError:
+                continue
+            recorded += 1
+        self.message_user(request, f'{recorded} réservation(s) pointée(s).')
+    
+    @admin.action(description='Pointer présent')
+    def mark_completed(self, request, queryset):
+        self._record_attendance(request, queryset, True)
+    
+    @admin.action(description='Pointer absent')
+    def mark_no_show(self, request, queryset):
+        self._record_attendance(request, queryset, False)
+
+
+@admin.register(Waitlist)
+class WaitlistAdmin(admin.ModelAdmin):
+    list_display = ['time_slot', 'user', 'number_of_places', 'created_at']
+    list_filter = ['created_at']
+    search_fields = ['user__username', 'time_slot__title']
+
+
+@admin.register(SlotFacet)
+class SlotFacetAdmin(admin.ModelAdmin):
+    list_display = ['date', 'city', 'establishment_type', 'wifi_available', 'slot_count', 'free_places']
+    list_filter = ['establishment_type', 'wifi_available', 'date']
+    search_fields = ['city', 'city_key']
+    
+    def has_add_permission(self, request):
+        # Table maintenue automatiquement
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DailyOccupancy)
+class DailyOccupancyAdmin(admin.ModelAdmin):
+    list_display = ['establishment', 'date', 'hour', 'capacity', 'reserved', 'cancelled', 'completed', 'no_show']
+    list_filter = ['date', 'establishment']
+    
+    def has_add_permission(self, request):
+        # Rollup maintenu automatiquement
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedTimeSlot)
+class ArchivedTimeSlotAdmin(admin.ModelAdmin):
+    list_display = ['title', 'establishment', 'date', 'start_time', 'end_time', 'reserved_places', 'archived_at']
+    list_filter = ['date', 'establishment']
+    search_fields = ['title', 'establishment__name']
+    
+    def has_add_permission(self, request):
+        # Table froide alimentée par `complete_past_bookings`
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
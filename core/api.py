@@ -0,0 +1,276 @@
+"""
+API JSON en lecture seule, versionnée : /api/v1/.
+
+- `timeslots/` et `timeslots/<id>/` : créneaux à venir (filtres `city`,
+  `date`, `establishment`) ;
+- `establishments/` et `establishments/<id>/` (filtres `city`, `type`) ;
+- `availability/?ids=1,2,3` : places disponibles, format compact.
+
+`fields=title,date,available` restreint les champs renvoyés (et les
+colonnes lues). Les listes sont paginées par curseur (`cursor`, `limit`) :
+aucun OFFSET, la page suivante repart de la dernière ligne.
+
+Chaque réponse porte un ETag fort calculé depuis les versions des lignes
+(`updated_at`, et le compteur de places réservées, qui change sans toucher
+`updated_at`). Une requête conditionnelle (`If-None-Match`) dont l'ETag
+correspond reçoit un 304 après une seule requête légère sur ces colonnes,
+sans sérialisation : une intégration qui interroge l'API en boucle ne coûte
+presque rien tant que rien ne change.
+"""
+import hashlib
+from datetime import date
+
+from django.http import JsonResponse
+from django.db.models import F
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_GET
+
+from .models import Establishment, TimeSlot
+from .pagination import after_cursor, encode_position
+from . import db, facets, realtime
+
+API_VERSION = 'v1'
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+MAX_AVAILABILITY_IDS = 200
+
+# Nom dans l'API -> chemin ORM lu par values()
+TIME_SLOT_FIELDS = {
+    'id': 'pk',
+    'title': 'title',
+    'description': 'description',
+    'date': 'date',
+    'start_time': 'start_time',
+    'end_time': 'end_time',
+    'total_capacity': 'total_capacity',
+    'available': 'available',
+    'price_info': 'price_info',
+    'is_group_only': 'is_group_only',
+    'establishment': 'establishment_id',
+    'establishment_name': 'establishment__name',
+    'city': 'establishment__city',
+    'updated_at': 'updated_at',
+}
+ESTABLISHMENT_FIELDS = {
+    'id': 'pk',
+    'name': 'name',
+    'establishment_type': 'establishment_type',
+    'address': 'address',
+    'city': 'city',
+    'description': 'description',
+    'wifi_available': 'wifi_available',
+    'power_outlets': 'power_outlets',
+    'quiet_zone': 'quiet_zone',
+    'free_coffee': 'free_coffee',
+    'max_seating': 'max_seating',
+    'latitude': 'latitude',
+    'longitude': 'longitude',
+    'updated_at': 'updated_at',
+}
+# Colonnes qui versionnent une ligne (ETag)
+TIME_SLOT_VERSION = ('pk', 'updated_at', 'reserved_places', 'establishment__updated_at')
+ESTABLISHMENT_VERSION = ('pk', 'updated_at')
+
+
+class ApiError(Exception):
+    """Paramètre invalide : réponse 400 avec le message."""
+
+
+def _error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def _selected_fields(params, available):
+    """Champs demandés par `fields=` (tous par défaut), dans l'ordre demandé."""
+    if not params.get('fields'):
+        return list(available)
+    names = list(dict.fromkeys(name.strip() for name in params['fields'].split(',') if name.strip()))
+    unknown = [name for name in names if name not in available]
+    if unknown or not names:
+        raise ApiError(f"Champ(s) inconnu(s) : {', '.join(unknown) or '(aucun)'}.")
+    return names
+
+
+def _limit(params):
+    try:
+        return min(max(int(params.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+    except ValueError:
+        raise ApiError('Paramètre limit invalide.')
+
+
+def _serialize(queryset, fields, mapping):
+    paths = [mapping[name] for name in fields]
+    return [{name: row[path] for name, path in zip(fields, paths)} for row in queryset.values(*paths)]
+
+
+def _etag(*parts):
+    return quote_etag(hashlib.sha1(repr((API_VERSION,) + parts).encode()).hexdigest())
+
+
+def _respond(request, etag, build):
+    """
+    304 si l'ETag correspond à `If-None-Match`, sinon la réponse JSON
+    construite par `build()` (appelée seulement dans ce cas).
+    """
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(build())
+    response['ETag'] = etag
+    # Toujours revalider : le 304 est presque gratuit
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+# Créneaux
+
+def _time_slots(params):
+    time_slots = TimeSlot.objects.filter(date__gte=date.today()).annotate(
+        available=F('total_capacity') - F('reserved_places'),
+    )
+    try:
+        if params.get('city'):
+            time_slots = time_slots.filter(establishment__city_key=facets.city_key(params['city']))
+        if params.get('date'):
+            time_slots = time_slots.filter(date=date.fromisoformat(params['date']))
+        if params.get('establishment'):
+            time_slots = time_slots.filter(establishment_id=int(params['establishment']))
+    except ValueError:
+        raise ApiError('Filtre date ou establishment invalide.')
+    return time_slots
+
+
+@require_GET
+@db.replica_reads
+def time_slot_list(request):
+    try:
+        fields = _selected_fields(request.GET, TIME_SLOT_FIELDS)
+        limit = _limit(request.GET)
+        time_slots = _time_slots(request.GET)
+    except ApiError as error:
+        return _error(str(error))
+
+    page = after_cursor(time_slots, request.GET.get('cursor')).order_by('date', 'start_time', 'pk')[:limit + 1]
+    versions = list(page.values_list('date', 'start_time', *TIME_SLOT_VERSION))
+    next_cursor = None
+    if len(versions) > limit:
+        slot_date, start_time, pk = versions[limit - 1][:3]
+        next_cursor = encode_position(slot_date, start_time, pk)
+    etag = _etag('timeslots', fields, versions[:limit], next_cursor)
+
+    def build():
+        return {
+            'version': API_VERSION,
+            'results': _serialize(page[:limit], fields, TIME_SLOT_FIELDS) if versions else [],
+            'next_cursor': next_cursor,
+        }
+
+    return _respond(request, etag, build)
+
+
+@require_GET
+@db.replica_reads
+def time_slot_detail(request, pk):
+    try:
+        fields = _selected_fields(request.GET, TIME_SLOT_FIELDS)
+    except ApiError as error:
+        return _error(str(error))
+    time_slot = TimeSlot.objects.filter(pk=pk).annotate(available=F('total_capacity') - F('reserved_places'))
+    version = time_slot.values_list(*TIME_SLOT_VERSION).first()
+    if version is None:
+        return _error('Créneau introuvable.', status=404)
+
+    def build():
+        return {'version': API_VERSION, 'result': _serialize(time_slot, fields, TIME_SLOT_FIELDS)[0]}
+
+    return _respond(request, _etag('timeslot', fields, version), build)
+
+
+def _availability_ids(params):
+    """Ids demandés (triés), ou la réponse d'erreur."""
+    try:
+        ids = sorted({int(pk) for pk in params.get('ids', '').split(',') if pk.strip()})
+    except ValueError:
+        return _error('Paramètre ids invalide.')
+    if not ids or len(ids) > MAX_AVAILABILITY_IDS:
+        return _error(f'Paramètre ids requis ({MAX_AVAILABILITY_IDS} au plus).')
+    return ids
+
+
+@require_GET
+@db.replica_reads
+def availability(request):
+    ids = _availability_ids(request.GET)
+    if isinstance(ids, JsonResponse):
+        return ids
+
+    # Les données sont la version : une seule requête dans tous les cas
+    results = sorted(realtime.availability(ids), key=lambda row: row['time_slot'])
+    return _respond(request, _etag('availability', results), lambda: {'version': API_VERSION, 'results': results})
+
+
+@require_GET
+@db.replica_reads
+async def availability_async(request):
+    """Variante async de `availability` (voir settings.ASYNC_VIEWS)."""
+    ids = _availability_ids(request.GET)
+    if isinstance(ids, JsonResponse):
+        return ids
+    results = sorted(await realtime.aavailability(ids), key=lambda row: row['time_slot'])
+    return _respond(request, _etag('availability', results), lambda: {'version': API_VERSION, 'results': results})
+
+
+# Établissements
+
+def _establishments(params):
+    establishments = Establishment.objects.all()
+    if params.get('city'):
+        establishments = establishments.filter(city_key=facets.city_key(params['city']))
+    if params.get('type'):
+        establishments = establishments.filter(establishment_type=params['type'])
+    return establishments
+
+
+@require_GET
+@db.replica_reads
+def establishment_list(request):
+    try:
+        fields = _selected_fields(request.GET, ESTABLISHMENT_FIELDS)
+        limit = _limit(request.GET)
+        after = int(request.GET.get('cursor') or 0)
+    except ApiError as error:
+        return _error(str(error))
+    except ValueError:
+        return _error('Paramètre cursor invalide.')
+
+    page = _establishments(request.GET).filter(pk__gt=after).order_by('pk')[:limit + 1]
+    versions = list(page.values_list(*ESTABLISHMENT_VERSION))
+    next_cursor = str(versions[limit - 1][0]) if len(versions) > limit else None
+    etag = _etag('establishments', fields, versions[:limit], next_cursor)
+
+    def build():
+        return {
+            'version': API_VERSION,
+            'results': _serialize(page[:limit], fields, ESTABLISHMENT_FIELDS) if versions else [],
+            'next_cursor': next_cursor,
+        }
+
+    return _respond(request, etag, build)
+
+
+@require_GET
+@db.replica_reads
+def establishment_detail(request, pk):
+    try:
+        fields = _selected_fields(request.GET, ESTABLISHMENT_FIELDS)
+    except ApiError as error:
+        return _error(str(error))
+    establishment = Establishment.objects.filter(pk=pk)
+    version = establishment.values_list(*ESTABLISHMENT_VERSION).first()
+    if version is None:
+        return _error('Établissement introuvable.', status=404)
+
+    def build():
+        return {'version': API_VERSION, 'result': _serialize(establishment, fields, ESTABLISHMENT_FIELDS)[0]}
+
+    return _respond(request, _etag('establishment', fields, version), build)
@@ -0,0 +1,162 @@
+"""
+Cycle de vie des réservations passées.
+
+- `complete_past_bookings` passe à COMPLETED les réservations confirmées dont
+  le créneau est terminé depuis plus de ATTENDANCE_DAYS jours ;
+- `archive_time_slots` déplace les créneaux antérieurs à la rétention (et
+  leurs réservations) vers les tables froides ArchivedTimeSlot et
+  ArchivedBooking, pour que les tables chaudes restent petites ;
+- `purge_past_waitlists` supprime les listes d'attente des créneaux
+  terminés : plus personne ne peut y être promu (voir
+  services.promote_waitlist).
+
+Les deux traitent des paquets d'ids parcourus par clé primaire, chacun dans
+sa propre transaction courte : aucun verrou d'écriture n'est tenu sur toute
+la table, et un traitement interrompu reprend là où il s'était arrêté (les
+lignes déjà traitées ne sont plus sélectionnées). Relancer est sans effet.
+
+Pendant ATTENDANCE_DAYS jours, les réservations passées restent confirmées :
+l'établissement pointe la présence (COMPLETED) ou l'absence (NO_SHOW, voir
+services.record_attendance). Passé ce délai, une réservation non pointée
+est présumée honorée : elle devient COMPLETED sans compter dans le taux
+d'absence (occupancy.summary), qui ne porte que sur les pointages.
+
+Le passage à COMPLETED ne change pas TimeSlot.reserved_places (voir
+Booking.OCCUPYING_STATUSES) : les facettes et le cache de listing restent
+valides, seuls les rollups d'occupation des jours touchés sont recalculés.
+
+L'archivage contourne les signaux (DELETE direct) : les rollups des jours
+archivés sont conservés tels quels, c'est l'historique des statistiques.
+Les listes d'attente n'ont pas de table froide : les inscriptions encore
+rattachées aux créneaux archivés sont supprimées avec eux.
+La limite d'archivage est toujours un premier jour de mois, pour que les
+rollups client mensuels ne mélangent jamais jours archivés et jours chauds.
+"""
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from . import db, occupancy, search
+from .models import ArchivedBooking, ArchivedTimeSlot, Booking, SlotFacet, TimeSlot, Waitlist
+
+COMPLETE_CHUNK_SIZE = 500
+ARCHIVE_CHUNK_SIZE = 200
+DEFAULT_RETENTION_DAYS = 365
+ATTENDANCE_DAYS = 7
+
+TIME_SLOT_FIELDS = (
+    'id', 'establishment_id', 'title', 'description', 'date', 'start_time', 'end_time',
+    'total_capacity', 'price_info', 'is_group_only', 'reserved_places', 'created_at', 'updated_at',
+)
+BOOKING_FIELDS = (
+    'id', 'user_id', 'time_slot_id', 'number_of_places', 'status', 'notes', 'created_at', 'updated_at',
+)
+
+
+def _ended(now):
+    """Créneaux terminés à `now` (heure locale, comme les champs date/heure)."""
+    return Q(time_slot__date__lt=now.date()) | Q(time_slot__date=now.date(), time_slot__end_time__lte=now.time())
+
+
+def _chunks(queryset, chunk_size):
+    """Paquets successifs d'ids d'un queryset, par clé primaire croissante."""
+    last_pk = 0
+    while True:
+        ids = list(queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return
+        yield ids
+        last_pk = ids[-1]
+
+
+def past_bookings(now=None, attendance_days=ATTENDANCE_DAYS):
+    """
+    Réservations confirmées (présence non pointée) dont le créneau est
+    terminé depuis plus de `attendance_days` jours.
+    """
+    now = timezone.localtime(now) - timedelta(days=attendance_days)
+    return Booking.objects.filter(_ended(now), status='CONFIRMED')
+
+
+def complete_past_bookings(now=None, chunk_size=COMPLETE_CHUNK_SIZE, attendance_days=ATTENDANCE_DAYS):
+    """
+    Passe à COMPLETED les réservations confirmées des créneaux terminés
+    depuis plus de `attendance_days` jours, par paquets d'UPDATE. Les
+    absences pointées (NO_SHOW) sont conservées. Retourne le nombre de
+    réservations modifiées.
+    """
+    completed = 0
+    for ids in _chunks(past_bookings(now, attendance_days), chunk_size):
+        with db.write_transaction():
+            scopes = list(Booking.objects.filter(pk__in=ids, status='CONFIRMED').values_list(
+                'time_slot__establishment_id', 'time_slot__date', 'user_id'
+            ))
+            # Filtre sur le statut : une annulation concurrente n'est pas écrasée
+            completed += Booking.objects.filter(pk__in=ids, status='CONFIRMED').update(
+                status='COMPLETED', updated_at=timezone.now()
+            )
+            occupancy.schedule(scopes)
+    return completed
+
+
+def past_waitlists(now=None):
+    """Inscriptions en liste d'attente dont le créneau est terminé."""
+    now = timezone.localtime(now)
+    return Waitlist.objects.filter(_ended(now))
+
+
+def purge_past_waitlists(now=None):
+    """Supprime les listes d'attente des créneaux terminés. Retourne le nombre d'inscriptions."""
+    deleted, _ = past_waitlists(now).delete()
+    return deleted
+
+
+def archive_before(today=None, retention_days=DEFAULT_RETENTION_DAYS):
+    """Limite d'archivage : premier jour du mois de (aujourd'hui - rétention)."""
+    today = today or timezone.localdate()
+    return occupancy.month_of(today - timedelta(days=retention_days))
+
+
+def archivable_time_slots(before):
+    return TimeSlot.objects.filter(date__lt=before)
+
+
+def _delete_ids(model, column, ids):
+    """DELETE direct, sans signaux ni collecte des objets liés."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {model._meta.db_table} WHERE {column} IN ({', '.join(['%s'] * len(ids))})",
+            ids,
+        )
+
+
+def archive_time_slots(before, chunk_size=ARCHIVE_CHUNK_SIZE):
+    """
+    Déplace les créneaux antérieurs à `before` et leurs réservations vers
+    les tables froides. Retourne (créneaux, réservations) archivés.
+    """
+    archived_slots = archived_bookings = 0
+    for ids in _chunks(archivable_time_slots(before), chunk_size):
+        with db.write_transaction():
+            time_slots = [
+                ArchivedTimeSlot(**row)
+                for row in TimeSlot.objects.filter(pk__in=ids).values(*TIME_SLOT_FIELDS)
+            ]
+            bookings = [
+                ArchivedBooking(**row)
+                for row in Booking.objects.filter(time_slot_id__in=ids).values(*BOOKING_FIELDS)
+            ]
+            ArchivedTimeSlot.objects.bulk_create(time_slots)
+            ArchivedBooking.objects.bulk_create(bookings)
+            _delete_ids(Booking, 'time_slot_id', ids)
+            # Clé étrangère vers le créneau : à supprimer avant lui
+            _delete_ids(Waitlist, 'time_slot_id', ids)
+            _delete_ids(TimeSlot, 'id', ids)
+            search.get_backend().remove_time_slots(ids)
+        archived_slots += len(time_slots)
+        archived_bookings += len(bookings)
+    # Facettes des jours passés : jamais lues, et leurs créneaux sont partis
+    SlotFacet.objects.filter(date__lt=before).delete()
+    return archived_slots, archived_bookings
@@ -0,0 +1,202 @@
+"""
+Capacité physique des établissements (places assises).
+
+Des créneaux d'un même établissement peuvent se chevaucher (ex. « Journée »
+et « Matinée »). `Establishment.max_seating` borne le nombre de personnes
+présentes à un instant donné :
+
+- à la création d'un créneau, la somme des capacités des créneaux en cours à
+  chaque instant ne doit pas dépasser max_seating ;
+- à la réservation, la somme des places réservées à chaque instant non plus
+  (utile si max_seating a été abaissé après coup).
+
+La charge d'une journée est indexée par `DayLoad` : une fonction en escalier
+(instants de changement triés + charge entre deux instants). Ajouter un
+intervalle ou lire le pic sur un intervalle coûte une recherche
+dichotomique plus le nombre de segments couverts, sans comparer les
+créneaux deux à deux ; valider des milliers de créneaux reste linéaire.
+"""
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+from .models import Establishment, SlotCapacityExceeded, TimeSlot
+
+
+class SeatingCapacityExceeded(SlotCapacityExceeded):
+    """Les places assises de l'établissement sont dépassées sur l'intervalle."""
+
+
+class DayLoad:
+    """
+    Charge (places) au cours d'une journée, en fonction en escalier.
+
+    `times[i]` est un instant de changement ; `loads[i]` la charge sur
+    [times[i], times[i + 1]). Avant le premier instant la charge est nulle.
+    """
+
+    def __init__(self):
+        self.times = []
+        self.loads = []
+
+    def _split(self, moment):
+        """Ajoute un instant de changement (sans changer la charge) ; retourne son indice."""
+        index = bisect_left(self.times, moment)
+        if index < len(self.times) and self.times[index] == moment:
+            return index
+        previous = self.loads[index - 1] if index else 0
+        self.times.insert(index, moment)
+        self.loads.insert(index, previous)
+        return index
+
+    def add(self, start, end, load):
+        """Ajoute `load` places sur [start, end)."""
+        first = self._split(start)
+        last = self._split(end)
+        for index in range(first, last):
+            self.loads[index] += load
+
+    def peak(self, start, end):
+        """Charge maximale sur [start, end)."""
+        # Segment contenant `start`, jusqu'au dernier segment commençant avant `end`
+        first = max(bisect_right(self.times, start) - 1, 0)
+        last = bisect_left(self.times, end)
+        return max(self.loads[first:last], default=0)
+
+
+def day_load(intervals):
+    """DayLoad construit depuis des (début, fin, places)."""
+    load = DayLoad()
+    for start, end, places in intervals:
+        load.add(start, end, places)
+    return load
+
+
+def _overlapping(establishment_id, slot_date, start, end, exclude_pk=None):
+    """Créneaux de l'établissement qui chevauchent [start, end) ce jour-là (index establishment/date)."""
+    time_slots = TimeSlot.objects.filter(
+        establishment_id=establishment_id, date=slot_date, start_time__lt=end, end_time__gt=start,
+    )
+    if exclude_pk is not None:
+        time_slots = time_slots.exclude(pk=exclude_pk)
+    return time_slots
+
+
+def check_time_slot(time_slot, max_seating=None):
+    """
+    Lève SeatingCapacityExceeded si le créneau ferait dépasser les places
+    assises de son établissement.
+    """
+    if max_seating is None:
+        max_seating = time_slot.establishment.max_seating
+    if max_seating is None:
+        return
+    rows = _overlapping(
+        time_slot.establishment_id, time_slot.date, time_slot.start_time, time_slot.end_time,
+        exclude_pk=time_slot.pk,
+    ).values_list('start_time', 'end_time', 'total_capacity')
+    offered = day_load(rows).peak(time_slot.start_time, time_slot.end_time)
+    if offered + time_slot.total_capacity > max_seating:
+        raise SeatingCapacityExceeded(
+            f'Capacité de l\'établissement dépassée : {offered} place(s) déjà proposée(s) '
+            f'sur ce créneau horaire, {max_seating} place(s) assise(s) au total.'
+        )
+
+
+def over_capacity(establishment, time_slots):
+    """
+    Créneaux (non sauvegardés) qui, ajoutés dans l'ordre, feraient dépasser
+    les places assises. Une requête pour les créneaux existants de la
+    période ; les créneaux retenus s'ajoutent à la charge des suivants.
+    """
+    if establishment.max_seating is None or not time_slots:
+        return []
+    dates = {time_slot.date for time_slot in time_slots}
+    loads = defaultdict(DayLoad)
+    for slot_date, start, end, places in TimeSlot.objects.filter(
+        establishment=establishment, date__gte=min(dates), date__lte=max(dates),
+    ).values_list('date', 'start_time', 'end_time', 'total_capacity'):
+        if slot_date in dates:
+            loads[slot_date].add(start, end, places)
+
+    rejected = []
+    for time_slot in time_slots:
+        load = loads[time_slot.date]
+        if load.peak(time_slot.start_time, time_slot.end_time) + time_slot.total_capacity > establishment.max_seating:
+            rejected.append(time_slot)
+        else:
+            load.add(time_slot.start_time, time_slot.end_time, time_slot.total_capacity)
+    return rejected
+
+
+def seats_available(time_slot, lock=False):
+    """
+    Places assises libres sur l'intervalle du créneau (réservations des
+    créneaux qui le chevauchent), ou None si l'établissement n'a pas de limite.
+
+    Avec `lock`, la ligne de l'établissement est verrouillée jusqu'à la fin de
+    la transaction : deux réservations sur des créneaux qui se chevauchent ne
+    peuvent pas se croiser.
+    """
+    establishments = Establishment.objects.filter(pk=time_slot.establishment_id)
+    if lock:
+        if time_slot.establishment.max_seating is None:
+            return None
+        establishments = establishments.select_for_update()
+    max_seating = establishments.values_list('max_seating', flat=True).first()
+    if max_seating is None:
+        return None
+    rows = _overlapping(
+        time_slot.establishment_id, time_slot.date, time_slot.start_time, time_slot.end_time,
+    ).values_list('start_time', 'end_time', 'reserved_places')
+    return max_seating - day_load(rows).peak(time_slot.start_time, time_slot.end_time)
+
+
+def reserve_seats(time_slot, number_of_places):
+    """
+    À appeler dans la transaction de la réservation : lève
+    SeatingCapacityExceeded s'il ne reste pas assez de places assises.
+    """
+    available = seats_available(time_slot, lock=True)
+    if available is not None and number_of_places > available:
+        raise SeatingCapacityExceeded(f'Seulement {max(available, 0)} place(s) assise(s) disponible(s).')
+
+
+def reserve_group_seats(time_slots, number_of_places):
+    """
+    Contrôle des places assises pour une réservation de groupe sur plusieurs
+    créneaux, à appeler dans sa transaction. Retourne les (créneau, places
+    assises libres) en échec ; liste vide si tout passe.
+
+    Les établissements limités sont verrouillés en une requête et la charge
+    de leurs journées lue en une autre. Les places du groupe s'ajoutent à la
+    charge au fil des créneaux : deux créneaux du lot qui se chevauchent ne
+    peuvent pas ensemble dépasser la limite.
+    """
+    establishment_ids = {time_slot.establishment_id for time_slot in time_slots}
+    limits = dict(
+        Establishment.objects.select_for_update().filter(
+            pk__in=establishment_ids, max_seating__isnull=False,
+        ).order_by('pk').values_list('pk', 'max_seating')
+    )
+    if not limits:
+        return []
+
+    dates = {time_slot.date for time_slot in time_slots if time_slot.establishment_id in limits}
+    loads = defaultdict(DayLoad)
+    for establishment_id, slot_date, start, end, places in TimeSlot.objects.filter(
+        establishment_id__in=limits, date__in=dates,
+    ).values_list('establishment_id', 'date', 'start_time', 'end_time', 'reserved_places'):
+        loads[(establishment_id, slot_date)].add(start, end, places)
+
+    rejected = []
+    for time_slot in time_slots:
+        max_seating = limits.get(time_slot.establishment_id)
+        if max_seating is None:
+            continue
+        load = loads[(time_slot.establishment_id, time_slot.date)]
+        available = max_seating - load.peak(time_slot.start_time, time_slot.end_time)
+        if number_of_places > available:
+            rejected.append((time_slot, max(available, 0)))
+        else:
+            load.add(time_slot.start_time, time_slot.end_time, number_of_places)
+    return rejected
@@ -0,0 +1,11 @@
+from . import notifications
+
+
+def unread_notifications(request):
+    """
+    Nombre de notifications non lues pour le menu. Passé comme fonction :
+    la requête n'est faite que si le gabarit l'affiche.
+    """
+    if not request.user.is_authenticated:
+        return {}
+    return {'unread_notifications': lambda: notifications.unread_count(request.user)}
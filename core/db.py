@@ -0,0 +1,199 @@
+"""
+Réglages de connexion propres au moteur de base de données, et routage des
+lectures vers une réplique.
+
+SQLite : les PRAGMA de `settings.SQLITE_PRAGMAS` sont appliqués à chaque
+nouvelle connexion (journal WAL, attente du verrou, mmap...). Ils ne sont
+pas conservés dans le fichier, sauf `journal_mode=WAL` qui l'est. Les
+transactions restent DEFERRED ; les chemins d'écriture passent par
+`write_transaction` (BEGIN IMMEDIATE).
+
+Réplique en lecture : `ReplicaRouter` envoie vers `settings.READ_REPLICA_ALIAS`
+les lectures faites dans `read_replica()`, ou dans une vue décorée par
+`replica_reads` (accueil, détail, API, statistiques). Toutes les écritures,
+et les autres lectures, restent sur `default`. Les lectures repassent sur
+le primaire :
+
+- dès que la requête en cours a écrit, et dans une transaction ouverte sur
+  le primaire ;
+- pendant `REPLICA_PIN_SECONDS` après une écriture de la même session
+  (cookie posé par `ReplicaPinMiddleware`) : l'utilisateur voit sa nouvelle
+  réservation malgré le retard de réplication.
+
+Sans alias de réplique déclaré dans DATABASES, le routeur ne change rien.
+"""
+import contextvars
+import time
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+PIN_COOKIE = 'primary_until'
+DEFAULT_PIN_SECONDS = 5
+# Applications jamais lues sur la réplique : une session tout juste créée
+# (connexion) doit être relue sur le primaire
+NEVER_REPLICATED = frozenset({'sessions'})
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def sqlite_pragmas(connection):
+    """Valeurs courantes des PRAGMA réglés (diagnostic, tests)."""
+    with connection.cursor() as cursor:
+        values = {}
+        for name in getattr(settings, 'SQLITE_PRAGMAS', {}):
+            cursor.execute(f'PRAGMA {name}')
+            values[name] = cursor.fetchone()[0]
+    return values
+
+
+@contextmanager
+def write_transaction(using=DEFAULT_DB_ALIAS):
+    """
+    transaction.atomic() des chemins d'écriture (décorateur ou bloc `with`).
+
+    Sous SQLite, la transaction la plus externe s'ouvre par BEGIN IMMEDIATE :
+    le verrou d'écriture est pris dès l'ouverture, en attendant au besoin
+    (busy_timeout). Une transaction DEFERRED qui a déjà lu échoue au
+    contraire aussitôt (« database is locked ») si un autre écrivain l'a
+    devancée. Les autres blocs atomiques, en lecture seule notamment,
+    restent DEFERRED et ne bloquent pas les écrivains. Imbriqué, ou sur un
+    autre moteur, équivaut à transaction.atomic().
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        with transaction.atomic(using=using):
+            yield
+        return
+    # Le mode est relu à la connexion : l'ouvrir d'abord
+    connection.ensure_connection()
+    mode = connection.transaction_mode
+    connection.transaction_mode = 'IMMEDIATE'
+    try:
+        with transaction.atomic(using=using):
+            connection.transaction_mode = mode
+            yield
+    finally:
+        connection.transaction_mode = mode
+
+
+class Routing:
+    """État de routage d'une requête HTTP (ou d'un bloc `read_replica`)."""
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+_routing = contextvars.ContextVar('db_routing', default=None)
+_replica_reads = contextvars.ContextVar('db_replica_reads', default=False)
+
+
+def replica_alias():
+    """Alias de la réplique, ou None si elle n'est pas déclarée dans DATABASES."""
+    alias = getattr(settings, 'READ_REPLICA_ALIAS', None)
+    if not alias or alias == DEFAULT_DB_ALIAS or alias not in connections.settings:
+        return None
+    return alias
+
+
+def read_alias():
+    """Base qui sert les lectures dans le contexte courant."""
+    alias = replica_alias()
+    routing = _routing.get()
+    if (
+        alias is None
+        or not _replica_reads.get()
+        or routing.pinned
+        or routing.wrote
+        or connections[DEFAULT_DB_ALIAS].in_atomic_block
+    ):
+        return DEFAULT_DB_ALIAS
+    return alias
+
+
+@contextmanager
+def routing(pinned=False):
+    """Nouvel état de routage : suit les écritures faites dans le bloc."""
+    state = Routing(pinned)
+    token = _routing.set(state)
+    try:
+        yield state
+    finally:
+        _routing.reset(token)
+
+
+@contextmanager
+def read_replica():
+    """Lectures du bloc sur la réplique (sauf épinglage, voir le module)."""
+    with routing() if _routing.get() is None else nullcontext():
+        token = _replica_reads.set(True)
+        try:
+            yield
+        finally:
+            _replica_reads.reset(token)
+
+
+def replica_reads(view):
+    """Décorateur des vues en lecture seule, synchrones ou async : voir `read_replica`."""
+    if iscoroutinefunction(view):
+        async def wrapper(request, *args, **kwargs):
+            with read_replica():
+                return await view(request, *args, **kwargs)
+    else:
+        def wrapper(request, *args, **kwargs):
+            with read_replica():
+                return view(request, *args, **kwargs)
+    return wraps(view)(wrapper)
+
+
+class ReplicaRouter:
+    """Routeur de bases de données (settings.DATABASE_ROUTERS)."""
+
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get() or model._meta.app_label in NEVER_REPLICATED:
+            return None
+        # Explicite, même pour le primaire : sinon Django relirait les objets
+        # liés sur la base de l'instance, peut-être la réplique
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None and model._meta.app_label not in NEVER_REPLICATED:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Mêmes données sur le primaire et la réplique
+        return True
+
+
+def is_pinned(request):
+    """La session a écrit récemment : ses lectures restent sur le primaire."""
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def pin(response):
+    """Épingle la session au primaire pour `REPLICA_PIN_SECONDS`."""
+    seconds = getattr(settings, 'REPLICA_PIN_SECONDS', DEFAULT_PIN_SECONDS)
+    response.set_cookie(
+        PIN_COOKIE, f'{time.time() + seconds:.3f}', max_age=seconds, httponly=True, samesite='Lax',
+    )
@@ -0,0 +1,211 @@
+"""
+Facettes de la page d'accueil (villes, types, WiFi) avec compteurs.
+
+SlotFacet agrège par (date, ville normalisée, type, équipements) le nombre
+de créneaux et de places libres. Les signaux y reportent des écarts
+(`apply_slot_change`, `add_free_places`, `move_establishment`, et `add_slots`
+pour les créations en masse) au lieu de tout recompter ; la lecture
+(`read`) est un unique parcours d'index sur `date >= aujourd'hui`.
+"""
+from collections import defaultdict
+from datetime import date
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from . import db
+from .models import SlotFacet, TimeSlot
+from .search import normalize
+
+AMENITIES = ('wifi_available', 'power_outlets', 'quiet_zone', 'free_coffee')
+KEY_FIELDS = ('date', 'city_key', 'establishment_type') + AMENITIES
+
+
+def city_key(city):
+    """« Orléans » et « orleans » partagent la même facette."""
+    return normalize(city).strip()
+
+
+def slot_contribution(time_slot_id):
+    """
+    Lit en une requête la clé de facette d'un créneau et ses places libres.
+
+    Retourne (clé, libellé de ville, places libres) ou None si le créneau
+    n'existe pas.
+    """
+    row = TimeSlot.objects.filter(pk=time_slot_id).values(
+        'date', 'total_capacity', 'reserved_places',
+        'establishment__city', 'establishment__establishment_type',
+        *(f'establishment__{name}' for name in AMENITIES),
+    ).first()
+    if row is None:
+        return None
+    key = {
+        'date': row['date'],
+        'city_key': city_key(row['establishment__city']),
+        'establishment_type': row['establishment__establishment_type'],
+        **{name: row[f'establishment__{name}'] for name in AMENITIES},
+    }
+    return key, row['establishment__city'], row['total_capacity'] - row['reserved_places']
+
+
+def _adjust(key, city, slots_delta, free_delta):
+    """Ajoute des écarts à une ligne de facette, créée au besoin."""
+    if not slots_delta and not free_delta:
+        return
+    updated = SlotFacet.objects.filter(**key).update(
+        slot_count=F('slot_count') + slots_delta,
+        free_places=F('free_places') + free_delta,
+        city=city,
+    )
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            SlotFacet.objects.create(city=city, slot_count=slots_delta, free_places=free_delta, **key)
+    except IntegrityError:
+        # Ligne créée entre-temps par une autre transaction
+        SlotFacet.objects.filter(**key).update(
+            slot_count=F('slot_count') + slots_delta,
+            free_places=F('free_places') + free_delta,
+        )
+
+
+def apply_slot_change(before, after):
+    """
+    Reporte le passage d'un créneau de l'état `before` à `after` (résultats
+    de slot_contribution, None si absent).
+    """
+    if before is not None:
+        key, city, free = before
+        _adjust(key, city, -1, -free)
+    if after is not None:
+        key, city, free = after
+        _adjust(key, city, 1, free)
+
+
+def add_free_places(contribution, delta):
+    """Les places libres du créneau (voir slot_contribution) ont varié de `delta`."""
+    key, city, _ = contribution
+    _adjust(key, city, 0, delta)
+
+
+def add_slots(time_slots):
+    """
+    Ajoute des créneaux créés en masse (bulk_create, sans signaux), regroupés
+    par clé de facette. `time_slots` doivent porter leur établissement.
+    """
+    totals = defaultdict(lambda: [None, 0, 0])
+    for time_slot in time_slots:
+        establishment = time_slot.establishment
+        key = (
+            time_slot.date, city_key(establishment.city), establishment.establishment_type,
+            *(getattr(establishment, name) for name in AMENITIES),
+        )
+        total = totals[key]
+        total[0] = establishment.city
+        total[1] += 1
+        total[2] += time_slot.total_capacity - time_slot.reserved_places
+    for key, (city, slots, free) in totals.items():
+        _adjust(dict(zip(KEY_FIELDS, key)), city, slots, free)
+
+
+def establishment_contributions(establishment_id):
+    """
+    Contributions de tous les créneaux d'un établissement, regroupées par
+    date (une requête) : utilisé quand sa ville, son type ou ses
+    équipements changent.
+    """
+    rows = TimeSlot.objects.filter(establishment_id=establishment_id).order_by().values(
+        'date', 'establishment__city', 'establishment__establishment_type',
+        *(f'establishment__{name}' for name in AMENITIES),
+    ).annotate(slots=Count('pk'), free=Sum(F('total_capacity') - F('reserved_places')))
+    return [
+        ({
+            'date': row['date'],
+            'city_key': city_key(row['establishment__city']),
+            'establishment_type': row['establishment__establishment_type'],
+            **{name: row[f'establishment__{name}'] for name in AMENITIES},
+        }, row['establishment__city'], row['slots'], row['free'] or 0)
+        for row in rows
+    ]
+
+
+def move_establishment(before, after):
+    """Déplace les contributions d'un établissement de `before` vers `after`."""
+    for key, city, slots, free in before:
+        _adjust(key, city, -slots, -free)
+    for key, city, slots, free in after:
+        _adjust(key, city, slots, free)
+
+
+@db.write_transaction()
+def rebuild():
+    """Recalcule entièrement la table depuis les créneaux."""
+    totals = defaultdict(lambda: [None, 0, 0])
+    rows = TimeSlot.objects.order_by().values(
+        'date', 'establishment__city', 'establishment__establishment_type',
+        *(f'establishment__{name}' for name in AMENITIES),
+    ).annotate(slots=Count('pk'), free=Sum(F('total_capacity') - F('reserved_places')))
+    for row in rows:
+        key = (
+            row['date'], city_key(row['establishment__city']), row['establishment__establishment_type'],
+            *(row[f'establishment__{name}'] for name in AMENITIES),
+        )
+        total = totals[key]
+        total[0] = row['establishment__city']
+        total[1] += row['slots']
+        total[2] += row['free'] or 0
+
+    SlotFacet.objects.all().delete()
+    SlotFacet.objects.bulk_create(
+        SlotFacet(city=city, slot_count=slots, free_places=free, **dict(zip(KEY_FIELDS, key)))
+        for key, (city, slots, free) in totals.items()
+    )
+    return len(totals)
+
+
+def read(filters):
+    """
+    Compteurs de facettes pour la barre de filtres, en une seule requête.
+
+    Chaque facette est comptée avec les autres filtres actifs (ville, type,
+    WiFi, date) mais pas le sien, pour que l'utilisateur voie ce qu'il
+    obtiendrait en changeant ce critère.
+    """
+    selected_city = city_key(filters.get('city_filter', ''))
+    selected_type = filters.get('establishment_type_filter', '')
+    wifi_only = bool(filters.get('wifi_filter'))
+    try:
+        selected_date = date.fromisoformat(filters.get('date_filter') or '')
+    except ValueError:
+        selected_date = None
+
+    facets = SlotFacet.objects.filter(date__gte=date.today(), slot_count__gt=0)
+    if selected_date is not None:
+        facets = facets.filter(date=selected_date)
+    rows = facets.values_list(
+        'city_key', 'city', 'establishment_type', 'wifi_available', 'slot_count', 'free_places'
+    )
+
+    cities, types = {}, defaultdict(int)
+    wifi = {'slots': 0, 'free_places': 0}
+    for key, label, establishment_type, has_wifi, slots, free in rows:
+        city_match = not selected_city or selected_city in key
+        type_match = not selected_type or establishment_type == selected_type
+        wifi_match = not wifi_only or has_wifi
+        city = cities.setdefault(key, {'key': key, 'label': label, 'slots': 0, 'free_places': 0})
+        if type_match and wifi_match:
+            city['slots'] += slots
+            city['free_places'] += free
+        if city_match and wifi_match:
+            types[establishment_type] += slots
+        if city_match and type_match and has_wifi:
+            wifi['slots'] += slots
+            wifi['free_places'] += free
+
+    return {
+        'cities': sorted(cities.values(), key=lambda city: city['label'].lower()),
+        'types': dict(types),
+        'wifi': wifi,
+    }
@@ -1,6 +1,9 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from .models import CustomUser, Booking, TimeSlot, Establishment
+from . import recurrence
+
+INPUT_CLASS = 'w-full px-4 py-3 rounded-2xl border border-slate-300 focus:border-indigo-500 focus:ring-2 focus:ring-indigo-200 outline-none transition'
 
 
 class CustomUserCreationForm(UserCreationForm):
@@ -106,6 +109,81 @@ class TimeSlotForm(forms.ModelForm):
         }
 
 
+class RecurringTimeSlotForm(forms.Form):
+    """
+    Génération de créneaux récurrents : jours, plages horaires, période et
+    exceptions, avec les champs communs à tous les créneaux.
+    """
+    establishment = forms.ModelChoiceField(
+        queryset=Establishment.objects.none(), label='Établissement',
+        widget=forms.Select(attrs={'class': INPUT_CLASS + ' bg-white'}),
+    )
+    title = forms.CharField(max_length=200, label='Titre', widget=forms.TextInput(attrs={
+        'class': INPUT_CLASS, 'placeholder': 'Ex: Matinée Coworking',
+    }))
+    description = forms.CharField(required=False, label='Description', widget=forms.Textarea(attrs={
+        'class': INPUT_CLASS, 'rows': '3',
+    }))
+    total_capacity = forms.IntegerField(min_value=1, label='Nombre de places', widget=forms.NumberInput(attrs={
+        'class': INPUT_CLASS, 'min': '1',
+    }))
+    price_info = forms.CharField(max_length=100, label='Information tarifaire', widget=forms.TextInput(attrs={
+        'class': INPUT_CLASS, 'placeholder': 'Ex: Gratuit, 10€, Consommation obligatoire',
+    }))
+    is_group_only = forms.BooleanField(required=False, label='Réservation de groupe uniquement')
+    start_date = forms.DateField(label='Du', widget=forms.DateInput(attrs={'class': INPUT_CLASS, 'type': 'date'}))
+    end_date = forms.DateField(label='Au', widget=forms.DateInput(attrs={'class': INPUT_CLASS, 'type': 'date'}))
+    weekdays = forms.TypedMultipleChoiceField(
+        choices=list(enumerate(recurrence.WEEKDAY_LABELS)), coerce=int, label='Jours',
+        widget=forms.CheckboxSelectMultiple,
+    )
+    time_ranges = forms.CharField(label='Plages horaires', widget=forms.TextInput(attrs={
+        'class': INPUT_CLASS, 'placeholder': '09:00-12:00, 14:00-18:00',
+    }))
+    exceptions = forms.CharField(required=False, label='Dates exclues', widget=forms.TextInput(attrs={
+        'class': INPUT_CLASS, 'placeholder': '2025-12-25, 2026-01-01',
+    }))
+
+    def __init__(self, *args, owner=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if owner is not None:
+            self.fields['establishment'].queryset = Establishment.objects.filter(owner=owner)
+
+    def clean_time_ranges(self):
+        try:
+            return recurrence.parse_time_ranges(self.cleaned_data['time_ranges'])
+        except ValueError as error:
+            raise forms.ValidationError(str(error))
+
+    def clean_exceptions(self):
+        try:
+            return recurrence.parse_dates(self.cleaned_data['exceptions'])
+        except ValueError:
+            raise forms.ValidationError('Dates invalides (format attendu AAAA-MM-JJ).')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start_date, end_date = cleaned_data.get('start_date'), cleaned_data.get('end_date')
+        if start_date and end_date and start_date > end_date:
+            raise forms.ValidationError('La date de fin doit suivre la date de début.')
+        return cleaned_data
+
+    def rule(self):
+        data = self.cleaned_data
+        return recurrence.RecurrenceRule(
+            weekdays=frozenset(data['weekdays']),
+            time_ranges=data['time_ranges'],
+            start_date=data['start_date'],
+            end_date=data['end_date'],
+            exceptions=data['exceptions'],
+        )
+
+    def slot_fields(self):
+        return {name: self.cleaned_data[name] for name in (
+            'title', 'description', 'total_capacity', 'price_info', 'is_group_only'
+        )}
+
+
 class EstablishmentForm(forms.ModelForm):
     """
     Formulaire de création/modification d'établissement.
@@ -113,7 +191,7 @@ class EstablishmentForm(forms.ModelForm):
     class Meta:
         model = Establishment
         fields = ['name', 'establishment_type', 'address', 'city', 'description', 'logo', 
-                  'wifi_available', 'power_outlets', 'quiet_zone', 'free_coffee']
+                  'wifi_available', 'power_outlets', 'quiet_zone', 'free_coffee', 'max_seating']
         widgets = {
             'name': forms.TextInput(attrs={
                 'class': 'w-full px-4 py-3 rounded-2xl border border-slate-300 focus:border-indigo-500 focus:ring-2 focus:ring-indigo-200 outline-none transition',
@@ -147,4 +225,9 @@ class EstablishmentForm(forms.ModelForm):
             'free_coffee': forms.CheckboxInput(attrs={
                 'class': 'w-5 h-5 text-indigo-600 border-slate-300 rounded focus:ring-indigo-500'
             }),
+            'max_seating': forms.NumberInput(attrs={
+                'class': 'w-full px-4 py-3 rounded-2xl border border-slate-300 focus:border-indigo-500 focus:ring-2 focus:ring-indigo-200 outline-none transition',
+                'min': '1',
+                'placeholder': 'Ex: 40 (laisser vide si pas de limite)'
+            }),
         }
@@ -0,0 +1,186 @@
+"""
+Géolocalisation des établissements, sans service externe.
+
+- Géocodage hors ligne : le code postal de l'adresse, sinon la ville, est
+  cherché dans un gazetteer embarqué (core/data/gazetteer.csv).
+- Index spatial : chaque établissement porte un geohash indexé. Une recherche
+  par rayon ne lit que les cellules geohash qui recouvrent le cercle (plages
+  `geohash >= préfixe AND geohash < préfixe + '{'` sur l'index B-tree, valables
+  sur toutes les bases), puis filtre les candidats à la distance exacte.
+"""
+import csv
+import math
+import re
+from functools import lru_cache
+from pathlib import Path
+
+from django.db.models import Q
+
+from .search import normalize
+
+GAZETTEER_PATH = Path(__file__).resolve().parent / 'data' / 'gazetteer.csv'
+EARTH_RADIUS_KM = 6371.0
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9
+POSTCODE_RE = re.compile(r'\b(\d{5})\b')
+
+
+# Gazetteer
+
+@lru_cache(maxsize=1)
+def _gazetteer():
+    """Charge le gazetteer : (index par code postal, index par ville normalisée)."""
+    by_postcode, by_city = {}, {}
+    with open(GAZETTEER_PATH, encoding='utf-8') as handle:
+        for row in csv.DictReader(handle):
+            point = (float(row['latitude']), float(row['longitude']))
+            if row['postcode']:
+                by_postcode[row['postcode']] = point
+            else:
+                by_city[_city_key(row['name'])] = point
+    return by_postcode, by_city
+
+
+def _city_key(city):
+    # « Saint-Étienne », « saint etienne » et « ST ETIENNE » ne font qu'un
+    key = ' '.join(re.findall(r'\w+', normalize(city)))
+    return re.sub(r'^st ', 'saint ', key)
+
+
+def geocode(address='', city=''):
+    """
+    Retourne (latitude, longitude) pour une adresse, ou None si inconnue.
+
+    Le code postal (plus précis, ex. arrondissements) est prioritaire sur la ville.
+    """
+    by_postcode, by_city = _gazetteer()
+    for postcode in POSTCODE_RE.findall(f'{address} {city}'):
+        if postcode in by_postcode:
+            return by_postcode[postcode]
+    return by_city.get(_city_key(city))
+
+
+def locate(establishment, force=False):
+    """
+    Renseigne latitude, longitude et geohash d'un établissement (sans le
+    sauvegarder). Retourne True si une position a été trouvée.
+    """
+    if force or establishment.latitude is None or establishment.longitude is None:
+        point = geocode(establishment.address, establishment.city)
+        establishment.latitude, establishment.longitude = point if point else (None, None)
+    if establishment.latitude is None or establishment.longitude is None:
+        establishment.geohash = ''
+        return False
+    establishment.geohash = encode_geohash(establishment.latitude, establishment.longitude)
+    return True
+
+
+# Geohash
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Encode un point en geohash (base 32, bits longitude/latitude entrelacés)."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def _cell_size_degrees(precision):
+    """(hauteur, largeur) en degrés d'une cellule geohash de cette précision."""
+    total_bits = precision * 5
+    lon_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lon_bits)
+
+
+def _precision_for_radius(latitude, radius_km):
+    """Précision la plus fine dont une cellule couvre au moins le rayon dans les deux axes."""
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = _cell_size_degrees(precision)
+        height_km = height * 111.32
+        width_km = width * 111.32 * max(math.cos(math.radians(latitude)), 0.01)
+        if height_km >= radius_km and width_km >= radius_km:
+            return precision
+    return 1
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """
+    Préfixes geohash (cellule centrale et ses 8 voisines) recouvrant le
+    cercle de `radius_km` autour du point.
+    """
+    precision = _precision_for_radius(latitude, radius_km)
+    height, width = _cell_size_degrees(precision)
+    cells = set()
+    for d_lat in (-height, 0.0, height):
+        for d_lon in (-width, 0.0, width):
+            lat = min(max(latitude + d_lat, -89.999999), 89.999999)
+            lon = (longitude + d_lon + 180.0) % 360.0 - 180.0
+            cells.add(encode_geohash(lat, lon, precision))
+    return sorted(cells)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Distance orthodromique entre deux points, en kilomètres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def cells_filter(cells, field='geohash'):
+    """Condition ORM : le geohash commence par l'un des préfixes (plages indexées)."""
+    condition = Q()
+    for cell in cells:
+        condition |= Q(**{f'{field}__gte': cell, f'{field}__lt': cell + '{'})
+    return condition
+
+
+# Requêtes
+
+def within_radius(latitude, longitude, radius_km, queryset=None):
+    """
+    Établissements à moins de `radius_km` du point : {id: distance en km}.
+    """
+    from .models import Establishment
+    if queryset is None:
+        queryset = Establishment.objects.all()
+    candidates = queryset.filter(
+        cells_filter(covering_cells(latitude, longitude, radius_km))
+    ).values_list('pk', 'latitude', 'longitude')
+    distances = {}
+    for pk, lat, lon in candidates:
+        distance = haversine_km(latitude, longitude, lat, lon)
+        if distance <= radius_km:
+            distances[pk] = distance
+    return distances
+
+
+def nearest(latitude, longitude, limit=10, max_radius_km=50.0, queryset=None):
+    """
+    Les `limit` établissements les plus proches : [(id, distance en km)].
+
+    Le rayon de recherche double à partir de 1 km jusqu'à trouver assez de
+    candidats (ou atteindre `max_radius_km`).
+    """
+    radius = 1.0
+    while True:
+        distances = within_radius(latitude, longitude, radius, queryset=queryset)
+        if len(distances) >= limit or radius >= max_radius_km:
+            break
+        radius = min(radius * 2, max_radius_km)
+    return sorted(distances.items(), key=lambda item: item[1])[:limit]
@@ -0,0 +1,90 @@
+"""
+Export iCalendar (RFC 5545) des réservations.
+
+`calendar_lines` est un générateur : les réservations sont lues par paquets
+(`QuerySet.iterator`) et chaque événement est produit dès qu'il est prêt,
+ce qui permet de le servir dans une StreamingHttpResponse sans charger tout
+l'historique en mémoire.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.utils import timezone
+
+PRODID = '-//Work&Vibe//Réservations//FR'
+UID_DOMAIN = 'workandvibe'
+ITERATOR_CHUNK_SIZE = 200
+FIELDS = (
+    'pk', 'status', 'number_of_places', 'updated_at',
+    'time_slot__title', 'time_slot__date', 'time_slot__start_time', 'time_slot__end_time',
+    'time_slot__establishment__name', 'time_slot__establishment__address',
+    'time_slot__establishment__city',
+)
+
+
+def escape_text(value):
+    """Échappe une valeur TEXT (antislash, virgule, point-virgule, retours à la ligne)."""
+    return (
+        str(value or '')
+        .replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def fold(line):
+    """Replie une ligne de contenu à 75 octets (suite préfixée d'une espace)."""
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    start, limit = 0, 75
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        # Ne pas couper un caractère UTF-8 multi-octets
+        while end < len(encoded) and encoded[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode())
+        start, limit = end, 74
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _utc(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _local(slot_date, slot_time):
+    """Date et heure d'un créneau (heure locale du site) en UTC."""
+    return _utc(timezone.make_aware(datetime.combine(slot_date, slot_time)))
+
+
+def event_lines(row):
+    """Lignes VEVENT d'une réservation (ligne `values(*FIELDS)`)."""
+    place = ', '.join(filter(None, (
+        row['time_slot__establishment__name'],
+        row['time_slot__establishment__address'],
+        row['time_slot__establishment__city'],
+    )))
+    yield 'BEGIN:VEVENT'
+    yield f"UID:booking-{row['pk']}@{UID_DOMAIN}"
+    yield f"DTSTAMP:{_utc(row['updated_at'])}"
+    yield f"DTSTART:{_local(row['time_slot__date'], row['time_slot__start_time'])}"
+    yield f"DTEND:{_local(row['time_slot__date'], row['time_slot__end_time'])}"
+    yield f"SUMMARY:{escape_text(row['time_slot__title'])}"
+    yield f'LOCATION:{escape_text(place)}'
+    yield f"DESCRIPTION:{row['number_of_places']} place(s) réservée(s)"
+    yield 'STATUS:CANCELLED' if row['status'] == 'CANCELLED' else 'STATUS:CONFIRMED'
+    yield 'END:VEVENT'
+
+
+def calendar_lines(bookings):
+    """Calendrier complet, ligne par ligne (repliées, terminées par CRLF)."""
+    yield fold('BEGIN:VCALENDAR')
+    yield fold('VERSION:2.0')
+    yield fold(f'PRODID:{PRODID}')
+    yield fold('CALSCALE:GREGORIAN')
+    yield fold('X-WR-CALNAME:Mes réservations Work&Vibe')
+    for row in bookings.order_by('time_slot__date', 'time_slot__start_time', 'pk').values(*FIELDS).iterator(
+        chunk_size=ITERATOR_CHUNK_SIZE
+    ):
+        for line in event_lines(row):
+            yield fold(line)
+    yield fold('END:VCALENDAR')
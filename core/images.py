@@ -0,0 +1,169 @@
+"""
+Miniatures des logos d'établissement et des avatars.
+
+À l'enregistrement d'une nouvelle image, le traitement est confié (après le
+commit) à un pool de threads, hors du chemin de la requête :
+- l'orientation EXIF est appliquée puis les métadonnées sont supprimées
+  (position GPS, appareil...) ;
+- chaque largeur de `RENDITIONS` est produite en WebP et en JPEG ;
+- les fichiers sont nommés d'après l'empreinte du contenu d'origine
+  (`thumbs/logo/<empreinte>-<largeur>.webp`) : ils peuvent être servis avec
+  un cache navigateur illimité, et retraiter une image inchangée ne
+  réécrit rien.
+
+L'empreinte est enregistrée sur l'objet (`logo_digest`, `avatar_digest`) ;
+tant qu'elle est vide, les gabarits servent le fichier d'origine (voir le
+tag `responsive_image`).
+"""
+import hashlib
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .models import CustomUser, Establishment
+
+logger = logging.getLogger(__name__)
+
+# Largeurs produites (px), de la plus petite à la plus grande
+RENDITIONS = {
+    'logo': (160, 400, 800),
+    'avatar': (64, 128, 256),
+}
+# Type d'image -> (modèle, champ image, champ empreinte)
+TARGETS = {
+    'logo': (Establishment, 'logo', 'logo_digest'),
+    'avatar': (CustomUser, 'avatar', 'avatar_digest'),
+}
+# Extension -> (format Pillow, options d'encodage)
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+DIGEST_LENGTH = 16
+DEFAULT_WORKERS = 2
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def rendition_name(kind, digest, width, extension):
+    return f'thumbs/{kind}/{digest}-{width}.{extension}'
+
+
+def file_digest(file):
+    """Empreinte (SHA-256 tronqué) du contenu d'un fichier ouvert."""
+    sha = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(64 * 1024), b''):
+        sha.update(chunk)
+    file.seek(0)
+    return sha.hexdigest()[:DIGEST_LENGTH]
+
+
+def _flatten(image):
+    """Image RVB (fond blanc sous la transparence), encodable en JPEG."""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render_renditions(kind, file):
+    """
+    Produit les miniatures d'une image (fichier ouvert) et retourne son
+    empreinte. Les miniatures déjà présentes ne sont pas réécrites.
+    """
+    digest = file_digest(file)
+    with Image.open(file) as original:
+        # Applique la rotation EXIF ; les images produites ne portent aucune métadonnée
+        image = _flatten(ImageOps.exif_transpose(original))
+    for width in RENDITIONS[kind]:
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.Resampling.LANCZOS)
+        for extension, (image_format, options) in FORMATS.items():
+            name = rendition_name(kind, digest, width, extension)
+            if default_storage.exists(name):
+                continue
+            buffer = io.BytesIO()
+            resized.save(buffer, image_format, **options)
+            default_storage.save(name, ContentFile(buffer.getvalue()))
+    return digest
+
+
+def process(kind, pk):
+    """
+    Traite l'image courante d'un objet et enregistre son empreinte.
+
+    L'empreinte n'est écrite que si l'image n'a pas changé entre-temps ;
+    `updated_at` (établissements) est mis à jour pour renouveler les
+    fragments en cache qui affichent l'image. Retourne l'empreinte, ou None.
+    """
+    model, field, digest_field = TARGETS[kind]
+    name = model.objects.filter(pk=pk).values_list(field, flat=True).first()
+    digest = ''
+    if name:
+        try:
+            with default_storage.open(name, 'rb') as file:
+                digest = render_renditions(kind, file)
+        except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+            logger.warning('Image illisible, miniatures non produites : %s', name, exc_info=True)
+            return None
+    changes = {digest_field: digest}
+    if any(model_field.name == 'updated_at' for model_field in model._meta.concrete_fields):
+        changes['updated_at'] = timezone.now()
+    model.objects.filter(pk=pk, **{field: name}).update(**changes)
+    return digest or None
+
+
+def run_in_worker(kind, pk):
+    """`process` dans un thread du pool : referme ensuite ses connexions."""
+    try:
+        return process(kind, pk)
+    except Exception:
+        logger.exception('Échec du traitement de %s %s', kind, pk)
+    finally:
+        connections.close_all()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'IMAGE_PIPELINE_WORKERS', DEFAULT_WORKERS),
+                    thread_name_prefix='images',
+                )
+    return _executor
+
+
+def image_changed(instance, kind, before_name):
+    """
+    À appeler avant l'enregistrement : si l'image a changé, efface
+    l'empreinte (les gabarits reviennent au fichier d'origine) et retourne
+    True.
+    """
+    _, field, digest_field = TARGETS[kind]
+    if (getattr(instance, field).name or '') == (before_name or ''):
+        return False
+    setattr(instance, digest_field, '')
+    return True
+
+
+def schedule(kind, pk):
+    """Planifie le traitement après le commit (synchrone si IMAGE_PIPELINE_ASYNC est faux)."""
+    if getattr(settings, 'IMAGE_PIPELINE_ASYNC', True):
+        transaction.on_commit(lambda: get_executor().submit(run_in_worker, kind, pk))
+    else:
+        transaction.on_commit(partial(process, kind, pk))
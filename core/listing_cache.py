@@ -0,0 +1,180 @@
+"""
+Cache des résultats de la page d'accueil, par combinaison de filtres.
+
+Une entrée contient les ids ordonnés d'une page de créneaux, le curseur
+suivant et le total. Elle n'expire pas par TTL mais par version : sa clé
+inclut la version des « portées » dont elle dépend, et toute modification
+d'un créneau, d'un établissement ou d'une réservation incrémente uniquement
+les portées touchées (voir `invalidate_slot` / `invalidate_city`).
+
+Portées :
+- pair:<ville>:<date> : créneaux d'une ville pour une date (`*` = toutes) ;
+- city:<ville> : établissements d'une ville (nom, équipements, ville...).
+"""
+import hashlib
+import uuid
+from datetime import date
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+
+from . import db
+from .search import normalize
+
+PREFIX = 'core:listing'
+ENTRY_TIMEOUT = 60 * 60
+# Entrée calculée sur la réplique : elle peut précéder une invalidation
+# encore en cours de réplication, d'où une durée de vie courte
+REPLICA_ENTRY_TIMEOUT = 60
+ALL = '*'
+
+
+def _version_key(token):
+    return f'{PREFIX}:v:{token}'
+
+
+def _versions(tokens):
+    """Versions courantes des portées ; une portée inconnue reçoit une version neuve."""
+    keys = [_version_key(token) for token in tokens]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        version = found.get(key)
+        if version is None:
+            version = uuid.uuid4().hex
+            # add() : ne pas écraser une version posée entre-temps par un autre processus
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+        versions.append(version)
+    return versions
+
+
+def _bump(tokens):
+    """Invalide les portées ; à exécuter après le commit des données."""
+    cache.set_many({_version_key(token): uuid.uuid4().hex for token in tokens}, None)
+
+
+def _scope(filters):
+    """Portées (ville, date) d'une combinaison de filtres."""
+    city = normalize(filters.get('city_filter', '')).strip()
+    # Le filtre ville cherche la ville normalisée comme sous-chaîne : seule
+    # une ville connue peut être ciblée, et toute ville qui la contient
+    # l'invalide (voir _city_scopes)
+    if not city or city not in known_cities():
+        city = ALL
+    try:
+        slot_date = date.fromisoformat(filters.get('date_filter') or '').isoformat()
+    except ValueError:
+        slot_date = ALL
+    return city, slot_date
+
+
+def listing_key(filters, cursor=None):
+    """Clé de cache d'une page de résultats, versionnée par portées."""
+    city, slot_date = _scope(filters)
+    normalized = tuple(sorted(
+        (name, normalize(str(value)).strip()) for name, value in filters.items()
+    ))
+    versions = _versions([f'pair:{city}:{slot_date}', f'city:{city}'])
+    # « Libre maintenant » dépend de l'heure : une entrée par minute
+    moment = timezone.localtime().strftime('%H:%M') if filters.get('now_filter') else ''
+    raw = repr((normalized, cursor or '', date.today().isoformat(), moment, versions))
+    return f'{PREFIX}:entry:{hashlib.sha1(raw.encode()).hexdigest()}'
+
+
+def get_entry(key):
+    """Lit une entrée et compte le succès ou l'échec."""
+    entry = cache.get(key)
+    _count('hits' if entry is not None else 'misses')
+    return entry
+
+
+def _timeout():
+    return ENTRY_TIMEOUT if db.read_alias() == DEFAULT_DB_ALIAS else REPLICA_ENTRY_TIMEOUT
+
+
+def set_entry(key, entry):
+    cache.set(key, entry, _timeout())
+
+
+def facet_counts(filters):
+    """
+    Compteurs de facettes (voir core/facets.py), en cache : toute modification
+    de créneau ou de réservation incrémente pair:*:*, tout changement
+    d'établissement city:*.
+    """
+    normalized = tuple(sorted((name, normalize(str(value)).strip()) for name, value in filters.items()))
+    versions = _versions([f'pair:{ALL}:{ALL}', f'city:{ALL}'])
+    raw = repr((normalized, date.today().isoformat(), versions))
+    key = f'{PREFIX}:facets:{hashlib.sha1(raw.encode()).hexdigest()}'
+    counts = cache.get(key)
+    if counts is None:
+        from . import facets
+        counts = facets.read(filters)
+        cache.set(key, counts, _timeout())
+    return counts
+
+
+def known_cities():
+    """Villes ayant des créneaux à venir, normalisées."""
+    return {city['key'] for city in facet_counts({})['cities']}
+
+
+def _city_scopes(city):
+    """
+    Portées de ville touchées par un changement dans `city` : la ville
+    elle-même et toute ville connue dont le nom y est contenu. Le filtre
+    ville est une sous-chaîne : l'entrée en cache de « paris » liste aussi
+    les créneaux de « Cormeilles-en-Parisis ».
+    """
+    city = normalize(city).strip()
+    return {city} | {known for known in known_cities() if known and known in city}
+
+
+def invalidate_slot(city, slot_date):
+    """Un créneau (ou ses réservations) a changé dans `city` à `slot_date`."""
+    slot_date = slot_date.isoformat() if hasattr(slot_date, 'isoformat') else str(slot_date)
+
+    def bump():
+        _bump([
+            f'pair:{c}:{d}'
+            for c in sorted(_city_scopes(city)) + [ALL]
+            for d in (slot_date, ALL)
+        ])
+    transaction.on_commit(bump)
+
+
+def invalidate_city(*cities):
+    """Un établissement a changé : toutes les dates des villes concernées."""
+    def bump():
+        scopes = set().union(*(_city_scopes(city) for city in cities if city))
+        _bump([f'city:{ALL}'] + [f'city:{scope}' for scope in sorted(scopes)])
+    transaction.on_commit(bump)
+
+
+def _count(name):
+    key = f'{PREFIX}:stats:{name}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Compteur absent (premier appel ou éviction)
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def stats():
+    """Compteurs de succès / échecs du cache depuis la dernière remise à zéro."""
+    values = cache.get_many([f'{PREFIX}:stats:hits', f'{PREFIX}:stats:misses'])
+    hits = values.get(f'{PREFIX}:stats:hits', 0)
+    misses = values.get(f'{PREFIX}:stats:misses', 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else 0.0,
+    }
+
+
+def reset_stats():
+    cache.delete_many([f'{PREFIX}:stats:hits', f'{PREFIX}:stats:misses'])
@@ -0,0 +1,190 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import date
+from pathlib import Path
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from core.models import TimeSlot
+from .bench_views import QUANTILES, _quantile
+
+MODES = (('sync', '0'), ('async', '1'))
+# (scénario, poids dans le mélange)
+SCENARIOS = (
+    ('index', 15),
+    ('index?city', 15),
+    ('index?date+city', 10),
+    ('timeslot_detail', 35),
+    ('api_availability', 25),
+)
+SAMPLE_SIZE = 300
+AVAILABILITY_IDS = 10
+
+
+class Command(BaseCommand):
+    """
+    Compare, sous ASGI, les vues publiques synchrones et leurs variantes
+    async (settings.ASYNC_VIEWS) : accueil, détail d'un créneau,
+    disponibilités.
+
+    Pour chaque mode, un processus séparé (les URL sont choisies au
+    démarrage) sert `--requests` requêtes GET anonymes par le vrai
+    ASGIHandler de Django, appelé en mémoire par `--concurrency` clients
+    concurrents d'une même boucle d'événements : on mesure le coût du
+    gestionnaire (passages par un thread, ORM async), pas celui du réseau
+    ni d'un serveur (uvicorn, daphne) en particulier. Les données sont
+    celles de la base courante (voir `generate_dataset`).
+
+    Affiche débit et latences p50/p95/p99 par scénario pour les deux
+    modes ; `--output` écrit le tout en JSON.
+    """
+    help = 'Compare débit et latences des vues publiques synchrones et async sous ASGI.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=32, help='Clients concurrents.')
+        parser.add_argument('--requests', type=int, default=2000, help='Requêtes mesurées par mode.')
+        parser.add_argument('--warmup', type=int, default=200, help='Requêtes de chauffe, non mesurées.')
+        parser.add_argument('--seed', type=int, default=42, help='Graine aléatoire (mélange reproductible).')
+        parser.add_argument('--output', help='Fichier JSON de résultats.')
+        parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['requests'] < 1 or options['warmup'] < 0:
+            raise CommandError('--concurrency et --requests doivent être au moins 1, --warmup positif.')
+        if options['worker']:
+            self.stdout.write(json.dumps(self._worker(options)))
+            return
+
+        manage = Path(settings.BASE_DIR) / 'manage.py'
+        report = {}
+        for mode, flag in MODES:
+            command = [
+                sys.executable, str(manage), 'bench_asgi', '--worker',
+                '--concurrency', str(options['concurrency']), '--requests', str(options['requests']),
+                '--warmup', str(options['warmup']), '--seed', str(options['seed']),
+            ]
+            completed = subprocess.run(
+                command, env={**os.environ, 'ASYNC_VIEWS': flag}, capture_output=True, text=True,
+            )
+            if completed.returncode != 0:
+                raise CommandError(f'Échec du mode {mode} :\n{completed.stderr or completed.stdout}')
+            report[mode] = json.loads(completed.stdout.strip().splitlines()[-1])
+
+        self.stdout.write(f"{'scénario':<18} {'mode':<6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'erreurs':>8}")
+        for name, _ in SCENARIOS:
+            for mode, _ in MODES:
+                view = report[mode]['views'].get(name)
+                if view is not None:
+                    self.stdout.write(
+                        f"{name:<18} {mode:<6} {view['p50_ms']:>8} {view['p95_ms']:>8} "
+                        f"{view['p99_ms']:>8} {view['errors']:>8}"
+                    )
+        sync_rps, async_rps = report['sync']['throughput_rps'], report['async']['throughput_rps']
+        self.stdout.write(f'Débit : sync {sync_rps} req/s, async {async_rps} req/s')
+        self.stdout.write(self.style.SUCCESS(f'Rapport async / sync : x{async_rps / max(sync_rps, 1e-9):.2f}'))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                handle.write(json.dumps(report, indent=2, ensure_ascii=False) + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Résultats écrits dans {options['output']}"))
+
+    def _worker(self, options):
+        """Exécuté dans le sous-processus : chauffe, mesure, retourne le résumé."""
+        self.sample = list(TimeSlot.objects.filter(date__gte=date.today(), is_group_only=False).values_list(
+            'pk', 'date', 'establishment__city',
+        ).order_by('?')[:SAMPLE_SIZE])
+        if not self.sample:
+            raise CommandError('Aucun créneau à venir : lancer d\'abord generate_dataset.')
+        self.application = ASGIHandler()
+        asyncio.run(self._run(options['warmup'], options['concurrency'], options['seed'] + 1))
+        results, elapsed = asyncio.run(self._run(options['requests'], options['concurrency'], options['seed']))
+        return {
+            'async_views': settings.ASYNC_VIEWS,
+            'concurrency': options['concurrency'],
+            'requests': options['requests'],
+            'throughput_rps': round(options['requests'] / elapsed, 1),
+            'views': {name: self._summary(samples) for name, samples in sorted(results.items())},
+        }
+
+    def _request(self, scenario, rng):
+        """Retourne (chemin, paramètres GET) du scénario."""
+        slot_id, slot_date, city = rng.choice(self.sample)
+        if scenario == 'index':
+            return reverse('index'), {}
+        if scenario == 'index?city':
+            return reverse('index'), {'city': city}
+        if scenario == 'index?date+city':
+            return reverse('index'), {'city': city, 'date': slot_date.isoformat()}
+        if scenario == 'timeslot_detail':
+            return reverse('timeslot_detail', args=[slot_id]), {}
+        if scenario == 'api_availability':
+            ids = {pk for pk, _, _ in rng.sample(self.sample, min(AVAILABILITY_IDS, len(self.sample)))}
+            return reverse('api_availability'), {'ids': ','.join(map(str, sorted(ids)))}
+        raise CommandError(f'Scénario inconnu : {scenario}')
+
+    async def _call(self, path, params):
+        """Une requête GET servie par l'ASGIHandler ; retourne le statut HTTP."""
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '',
+            'query_string': urlencode(params).encode(), 'headers': [(b'host', b'localhost')],
+            'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+        }
+        finished = asyncio.Event()
+        received = False
+        status = None
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await finished.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif message['type'] == 'http.response.body' and not message.get('more_body'):
+                finished.set()
+
+        await self.application(scope, receive, send)
+        return status
+
+    async def _run(self, count, concurrency, seed):
+        """Exécute `count` requêtes ; retourne ({scénario: [(ms, erreur)]}, durée totale)."""
+        names, weights = zip(*SCENARIOS)
+        plan = random.Random(seed).choices(names, weights=weights, k=count)
+        results = defaultdict(list)
+
+        async def client(offset):
+            rng = random.Random(seed * 1000 + offset)
+            for scenario in plan[offset::concurrency]:
+                path, params = self._request(scenario, rng)
+                began = time.perf_counter()
+                try:
+                    error = (await self._call(path, params)) != 200
+                except Exception:
+                    error = True
+                results[scenario].append(((time.perf_counter() - began) * 1000, error))
+
+        began = time.perf_counter()
+        await asyncio.gather(*(client(offset) for offset in range(concurrency)))
+        return results, time.perf_counter() - began
+
+    def _summary(self, samples):
+        latencies = sorted(elapsed for elapsed, _ in samples)
+        summary = {'requests': len(samples), 'errors': sum(error for _, error in samples)}
+        summary.update({name: round(_quantile(latencies, q), 2) for name, q in QUANTILES})
+        return summary
@@ -0,0 +1,116 @@
+import threading
+import time
+import uuid
+from datetime import date, time as dt_time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, OperationalError
+from django.db.models import Sum
+
+from core.models import CustomUser, Establishment, TimeSlot, Booking
+from core import services
+
+
+class Command(BaseCommand):
+    """
+    Benchmark de contention : plusieurs threads réservent le même créneau.
+
+    Crée un établissement et un créneau temporaires, lance `--threads` clients
+    qui réservent en boucle jusqu'à ce que le créneau soit complet, puis
+    vérifie qu'aucune place n'a été survendue. Les données créées sont
+    supprimées à la fin.
+    """
+    MAX_LOCK_ERRORS = 50
+    help = 'Mesure le débit de réservation concurrente et vérifie l\'absence de survente.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Nombre de clients concurrents.')
+        parser.add_argument('--capacity', type=int, default=200, help='Capacité du créneau testé.')
+        parser.add_argument('--places', type=int, default=1, help='Places demandées par réservation.')
+
+    def handle(self, *args, **options):
+        threads_count = options['threads']
+        places = options['places']
+        tag = uuid.uuid4().hex[:8]
+
+        owner = CustomUser.objects.create(username=f'bench_owner_{tag}', user_type='ETABLISSEMENT')
+        try:
+            establishment = Establishment.objects.create(
+                owner=owner, name=f'Bench {tag}', establishment_type='COWORKING',
+                address='1 rue du Benchmark', city='Bench',
+            )
+            time_slot = TimeSlot.objects.create(
+                establishment=establishment, title='Créneau de contention',
+                date=date.today() + timedelta(days=1),
+                start_time=dt_time(9, 0), end_time=dt_time(12, 0),
+                total_capacity=options['capacity'],
+            )
+            users = [
+                CustomUser.objects.create(username=f'bench_user_{tag}_{i}')
+                for i in range(threads_count)
+            ]
+            stats = self._run(time_slot, users, places)
+
+            time_slot.refresh_from_db()
+            confirmed = Booking.objects.filter(
+                time_slot=time_slot, status='CONFIRMED'
+            ).aggregate(total=Sum('number_of_places'))['total'] or 0
+        finally:
+            CustomUser.objects.filter(username__startswith=f'bench_user_{tag}_').delete()
+            owner.delete()
+
+        elapsed = stats['elapsed'] or 1e-9
+        self.stdout.write(f"Threads : {threads_count}")
+        self.stdout.write(f"Réservations confirmées : {stats['confirmed']}")
+        self.stdout.write(f"Refus (complet/partiel) : {stats['rejected']}")
+        self.stdout.write(f"Erreurs de verrou : {stats['errors']}")
+        self.stdout.write(f"Places réservées : {confirmed} / {time_slot.total_capacity}")
+        self.stdout.write(f"Débit : {stats['confirmed'] / elapsed:.1f} réservations/s")
+
+        if confirmed > time_slot.total_capacity or confirmed != time_slot.reserved_places:
+            raise CommandError(
+                f'Survente détectée : {confirmed} place(s) confirmée(s), '
+                f'compteur {time_slot.reserved_places}, capacité {time_slot.total_capacity}.'
+            )
+        self.stdout.write(self.style.SUCCESS('Aucune survente.'))
+
+    def _run(self, time_slot, users, places):
+        stats = {'confirmed': 0, 'rejected': 0, 'errors': 0}
+        lock = threading.Lock()
+        start = threading.Barrier(len(users) + 1)
+
+        def worker(user):
+            slot = TimeSlot.objects.get(pk=time_slot.pk)
+            start.wait()
+            errors = 0
+            try:
+                while errors < self.MAX_LOCK_ERRORS:
+                    try:
+                        result = services.reserve_places(user, slot, places)
+                    except OperationalError:
+                        # SQLite : verrou d'écriture non obtenu dans le délai imparti
+                        errors += 1
+                        with lock:
+                            stats['errors'] += 1
+                        continue
+                    with lock:
+                        if result.confirmed:
+                            stats['confirmed'] += 1
+                        else:
+                            stats['rejected'] += 1
+                    if result.status == services.BookingResult.SOLD_OUT:
+                        break
+                    if not result.confirmed and result.available < places:
+                        break
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=(user,)) for user in users]
+        for thread in workers:
+            thread.start()
+        start.wait()
+        began = time.perf_counter()
+        for thread in workers:
+            thread.join()
+        stats['elapsed'] = time.perf_counter() - began
+        return stats
@@ -0,0 +1,96 @@
+import json
+import time
+import uuid
+from datetime import date, time as dt_time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.models import Booking, CustomUser, Establishment, TimeSlot
+
+
+class Command(BaseCommand):
+    """
+    Benchmark de la réservation de groupe.
+
+    Crée un établissement temporaire et deux séries identiques de `--slots`
+    créneaux, puis réserve `--places` places sur chaque créneau :
+    - en `--slots` appels successifs à la vue `book_timeslot` ;
+    - en un seul appel à l'API `group_booking`.
+    Affiche durée et nombre de requêtes SQL des deux approches. Les données
+    créées sont supprimées à la fin.
+    """
+    help = 'Compare la réservation de groupe à des réservations créneau par créneau.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slots', type=int, default=20, help='Nombre de créneaux réservés.')
+        parser.add_argument('--places', type=int, default=6, help='Places réservées par créneau.')
+        parser.add_argument('--rounds', type=int, default=3, help='Répétitions (meilleur temps retenu).')
+
+    def handle(self, *args, **options):
+        slots_count, places, rounds = options['slots'], options['places'], options['rounds']
+        if slots_count < 1 or places < 1 or rounds < 1:
+            raise CommandError('--slots, --places et --rounds doivent être au moins 1.')
+        tag = uuid.uuid4().hex[:8]
+
+        owner = CustomUser.objects.create(username=f'bench_owner_{tag}', user_type='ETABLISSEMENT')
+        company = CustomUser.objects.create(username=f'bench_company_{tag}', user_type='ENTREPRISE')
+        try:
+            establishment = Establishment.objects.create(
+                owner=owner, name=f'Bench {tag}', establishment_type='COWORKING',
+                address='1 rue du Benchmark', city='Bench',
+            )
+            client = Client(HTTP_HOST='localhost')
+            client.force_login(company)
+
+            sequential, grouped = [], []
+            for _ in range(rounds):
+                time_slots = self._create_slots(establishment, slots_count, places)
+                sequential.append(self._measure(lambda: [
+                    client.post(reverse('book_timeslot', args=[time_slot.pk]), {'number_of_places': places})
+                    for time_slot in time_slots
+                ]))
+                self._check(time_slots, places)
+
+                time_slots = self._create_slots(establishment, slots_count, places)
+                body = json.dumps({'time_slots': [time_slot.pk for time_slot in time_slots], 'number_of_places': places})
+                grouped.append(self._measure(lambda: client.post(
+                    reverse('group_booking'), body, content_type='application/json'
+                )))
+                self._check(time_slots, places)
+        finally:
+            company.delete()
+            owner.delete()
+
+        (sequential_time, sequential_queries), (grouped_time, grouped_queries) = min(sequential), min(grouped)
+        self.stdout.write(f'Créneaux : {slots_count}, places par créneau : {places}, meilleur de {rounds}')
+        self.stdout.write(
+            f'book_timeslot x {slots_count} : {sequential_time * 1000:.1f} ms, {sequential_queries} requête(s)'
+        )
+        self.stdout.write(f'group_booking x 1 : {grouped_time * 1000:.1f} ms, {grouped_queries} requête(s)')
+        self.stdout.write(self.style.SUCCESS(f'Accélération : x{sequential_time / max(grouped_time, 1e-9):.1f}'))
+
+    def _create_slots(self, establishment, count, places):
+        first_day = date.today() + timedelta(days=1)
+        return TimeSlot.objects.bulk_create([
+            TimeSlot(
+                establishment=establishment, title='Créneau de groupe', date=first_day + timedelta(days=index),
+                start_time=dt_time(9, 0), end_time=dt_time(12, 0), total_capacity=places * 2,
+            )
+            for index in range(count)
+        ])
+
+    def _measure(self, run):
+        with CaptureQueriesContext(connection) as context:
+            began = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - began
+        return elapsed, len(context.captured_queries)
+
+    def _check(self, time_slots, places):
+        booked = Booking.objects.filter(time_slot__in=time_slots, number_of_places=places).count()
+        if booked != len(time_slots):
+            raise CommandError(f'{booked} réservation(s) créée(s) sur {len(time_slots)} créneau(x).')
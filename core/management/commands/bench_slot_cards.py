@@ -0,0 +1,81 @@
+import time
+import uuid
+from datetime import date, time as dt_time, timedelta
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import render_to_string
+
+from core.models import CustomUser, Establishment, TimeSlot
+from core.templatetags.slot_cards import slot_card_key
+
+
+class Command(BaseCommand):
+    """
+    Benchmark du cache des cartes de créneaux.
+
+    Crée un établissement temporaire avec `--cards` créneaux, puis rend la
+    liste des cartes de la page d'accueil :
+    - à froid : fragments absents du cache, chaque carte est rendue ;
+    - à chaud : toutes les cartes sont lues dans le cache.
+    Affiche le meilleur temps de chaque mode. Les données créées sont
+    supprimées à la fin.
+    """
+    help = 'Mesure le rendu des cartes de créneaux, cache froid puis chaud.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cards', type=int, default=500, help='Nombre de cartes rendues.')
+        parser.add_argument('--rounds', type=int, default=5, help='Répétitions (meilleur temps retenu).')
+
+    def handle(self, *args, **options):
+        cards, rounds = options['cards'], options['rounds']
+        if cards < 1 or rounds < 1:
+            raise CommandError('--cards et --rounds doivent être au moins 1.')
+        tag = uuid.uuid4().hex[:8]
+
+        owner = CustomUser.objects.create(username=f'bench_owner_{tag}', user_type='ETABLISSEMENT')
+        try:
+            establishment = Establishment.objects.create(
+                owner=owner, name=f'Bench {tag}', establishment_type='COWORKING',
+                address='1 rue du Benchmark', city='Bench', wifi_available=True, quiet_zone=True,
+            )
+            first_day = date.today() + timedelta(days=1)
+            TimeSlot.objects.bulk_create([
+                TimeSlot(
+                    establishment=establishment, title=f'Créneau {index}', date=first_day + timedelta(days=index // 8),
+                    start_time=dt_time(8 + index % 8, 0), end_time=dt_time(9 + index % 8, 0), total_capacity=10,
+                )
+                for index in range(cards)
+            ])
+            time_slots = list(
+                TimeSlot.objects.filter(establishment=establishment).select_related('establishment')
+                .order_by('date', 'start_time', 'pk')
+            )
+            keys = [slot_card_key(time_slot, 'index') for time_slot in time_slots]
+
+            def render():
+                return render_to_string('core/partials/timeslot_cards.html', {'time_slots': time_slots})
+
+            cold, warm = [], []
+            for _ in range(rounds):
+                cache.delete_many(keys)
+                cold.append(self._measure(render))
+                warm.append(self._measure(render))
+            cached_html = render()
+            cache.delete_many(keys)
+            if render() != cached_html:
+                raise CommandError('Le rendu en cache diffère du rendu complet.')
+            cache.delete_many(keys)
+        finally:
+            owner.delete()
+
+        cold_time, warm_time = min(cold), min(warm)
+        self.stdout.write(f'Cartes : {cards}, meilleur de {rounds}')
+        self.stdout.write(f'Cache froid : {cold_time * 1000:.1f} ms')
+        self.stdout.write(f'Cache chaud : {warm_time * 1000:.1f} ms')
+        self.stdout.write(self.style.SUCCESS(f'Accélération : x{cold_time / max(warm_time, 1e-9):.1f}'))
+
+    def _measure(self, run):
+        began = time.perf_counter()
+        run()
+        return time.perf_counter() - began
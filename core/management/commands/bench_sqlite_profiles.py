@@ -0,0 +1,61 @@
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+PROFILES = ('default', 'tuned')
+
+
+class Command(BaseCommand):
+    """
+    Compare le débit de réservation concurrente selon le profil SQLite.
+
+    Pour chaque profil (`default` : journal d'origine, sans PRAGMA ;
+    `tuned` : WAL, synchronous=NORMAL, busy_timeout, mmap), crée une base
+    SQLite temporaire, la migre, puis lance `bench_booking_contention`
+    dans un processus séparé (le profil est lu au démarrage, depuis
+    l'environnement). Affiche le débit et les erreurs de verrou des deux
+    profils.
+    """
+    help = 'Compare le débit de réservation concurrente des profils SQLite (journal d\'origine / WAL).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Clients concurrents.')
+        parser.add_argument('--capacity', type=int, default=400, help='Capacité du créneau testé.')
+
+    def handle(self, *args, **options):
+        manage = Path(settings.BASE_DIR) / 'manage.py'
+        results = {}
+        for profile in PROFILES:
+            with tempfile.TemporaryDirectory() as directory:
+                env = {
+                    **os.environ,
+                    'DB_ENGINE': 'sqlite',
+                    'DB_NAME': str(Path(directory) / 'bench.sqlite3'),
+                    'SQLITE_PROFILE': profile,
+                }
+                self._run([sys.executable, str(manage), 'migrate', '-v0'], env)
+                output = self._run([
+                    sys.executable, str(manage), 'bench_booking_contention',
+                    '--threads', str(options['threads']), '--capacity', str(options['capacity']),
+                ], env)
+            throughput = re.search(r'Débit : ([\d.]+)', output)
+            errors = re.search(r'Erreurs de verrou : (\d+)', output)
+            results[profile] = (float(throughput.group(1)), int(errors.group(1)))
+            self.stdout.write(
+                f'{profile} : {results[profile][0]:.1f} réservations/s, {results[profile][1]} erreur(s) de verrou'
+            )
+
+        default, tuned = results['default'][0], results['tuned'][0]
+        self.stdout.write(self.style.SUCCESS(f'Gain du profil WAL : x{tuned / max(default, 1e-9):.1f}'))
+
+    def _run(self, command, env):
+        completed = subprocess.run(command, env=env, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise CommandError(f"Échec de {' '.join(command[2:])} :\n{completed.stderr or completed.stdout}")
+        return completed.stdout
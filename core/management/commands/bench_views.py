@@ -0,0 +1,244 @@
+import json
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max, Min
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Booking, CustomUser, Establishment, TimeSlot
+
+QUANTILES = (('p50_ms', 0.5), ('p95_ms', 0.95), ('p99_ms', 0.99))
+# (scénario, poids dans le mélange)
+SCENARIOS = (
+    ('index', 10),
+    ('index?city', 8),
+    ('index?date+city', 6),
+    ('index?type+wifi', 6),
+    ('index?search', 5),
+    ('index?geo', 5),
+    ('timeslot_detail', 25),
+    ('book_timeslot', 10),
+    ('my_bookings', 15),
+    ('establishment_dashboard', 10),
+)
+SAMPLE_SIZE = 500
+USERS_PER_ROLE = 20
+
+
+def _quantile(values, q):
+    """Quantile par rang le plus proche sur une liste triée."""
+    return values[min(len(values) - 1, max(0, round(q * len(values)) - 1))]
+
+
+class Command(BaseCommand):
+    """
+    Banc de charge des vues principales, via le client de test Django.
+
+    `--concurrency` threads envoient au total `--requests` requêtes tirées
+    selon le mélange pondéré SCENARIOS : accueil avec différentes
+    combinaisons de filtres, détail d'un créneau, réservation, « mes
+    réservations » et dashboard. Les données sont celles de la base
+    courante (voir `generate_dataset`) ; les réservations du banc sont faites
+    par des comptes temporaires, supprimés à la fin avec leurs réservations.
+
+    Le résultat (latences p50/p95/p99 et requêtes SQL par scénario) est un
+    JSON, écrit dans `--output` ou affiché : c'est la référence à comparer
+    d'une version à l'autre. `--baseline` affiche l'écart avec une
+    référence précédente.
+    """
+    help = 'Mesure latences et requêtes SQL des vues principales sous charge concurrente (JSON).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=8, help='Clients concurrents (threads).')
+        parser.add_argument('--requests', type=int, default=1000, help='Requêtes mesurées au total.')
+        parser.add_argument('--warmup', type=int, default=50, help='Requêtes de chauffe, non mesurées.')
+        parser.add_argument('--seed', type=int, default=42, help='Graine aléatoire (mélange reproductible).')
+        parser.add_argument('--output', help='Fichier JSON de résultats (sinon sortie standard).')
+        parser.add_argument('--baseline', help='Résultats précédents (JSON) à comparer.')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['requests'] < 1 or options['warmup'] < 0:
+            raise CommandError('--concurrency et --requests doivent être au moins 1, --warmup positif.')
+        self.sample = self._sample_data()
+        tag = uuid.uuid4().hex[:8]
+        bookers = CustomUser.objects.bulk_create([
+            CustomUser(username=f'bench_booker_{tag}_{index}', user_type='PARTICULIER')
+            for index in range(options['concurrency'])
+        ])
+        self.sample['bookers'] = [user.pk for user in bookers]
+        self.local = threading.local()
+        try:
+            self._run(options['warmup'], options['concurrency'], options['seed'] + 1)
+            results, elapsed = self._run(options['requests'], options['concurrency'], options['seed'])
+        finally:
+            CustomUser.objects.filter(username__startswith=f'bench_booker_{tag}_').delete()
+
+        report = {
+            'created_at': timezone.now().isoformat(timespec='seconds'),
+            'concurrency': options['concurrency'],
+            'requests': options['requests'],
+            'seed': options['seed'],
+            'throughput_rps': round(options['requests'] / elapsed, 1),
+            'dataset': {
+                'establishments': Establishment.objects.count(),
+                'time_slots': TimeSlot.objects.count(),
+                'bookings': Booking.objects.count(),
+            },
+            'views': {name: self._summary(samples) for name, samples in sorted(results.items())},
+        }
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                handle.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Résultats écrits dans {options['output']}"))
+        else:
+            self.stdout.write(output)
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as handle:
+                self._compare(json.load(handle), report)
+
+    def _sample_data(self):
+        """Échantillons d'ids (créneaux à venir, clients, gérants) et de filtres, tirés de la base."""
+        today = date.today()
+        bounds = TimeSlot.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            raise CommandError('Aucun créneau : lancer d\'abord generate_dataset.')
+        rng = random.Random(0)
+        candidates = [rng.randint(bounds['low'], bounds['high']) for _ in range(SAMPLE_SIZE * 4)]
+        time_slots = list(TimeSlot.objects.filter(pk__in=candidates, date__gte=today, is_group_only=False).values_list(
+            'pk', 'date', 'establishment__city',
+        )[:SAMPLE_SIZE])
+        if not time_slots:
+            raise CommandError('Aucun créneau à venir dans l\'échantillon.')
+        customers = list(Booking.objects.filter(
+            status='CONFIRMED', time_slot__date__gte=today,
+        ).values_list('user_id', flat=True).distinct()[:USERS_PER_ROLE])
+        owners = list(Establishment.objects.values_list('owner_id', flat=True).distinct()[:USERS_PER_ROLE])
+        point = Establishment.objects.exclude(latitude=None).values_list('latitude', 'longitude').first()
+        return {
+            'time_slots': time_slots,
+            'customers': customers,
+            'owners': owners,
+            'point': point,
+        }
+
+    def _client(self, user_id=None):
+        """Client du thread courant, connecté à `user_id` (session créée une fois par thread)."""
+        clients = getattr(self.local, 'clients', None)
+        if clients is None:
+            clients = self.local.clients = {}
+        if user_id not in clients:
+            client = Client(HTTP_HOST='localhost', raise_request_exception=False)
+            if user_id is not None:
+                client.force_login(CustomUser.objects.get(pk=user_id))
+            clients[user_id] = client
+        return clients[user_id]
+
+    def _request(self, scenario, rng):
+        """Retourne (client, méthode, url, données), ou None si le scénario est impossible sur ces données."""
+        sample = self.sample
+        slot_id, slot_date, city = rng.choice(sample['time_slots'])
+        index = reverse('index')
+        if scenario == 'index':
+            return self._client(), 'get', index, {}
+        if scenario == 'index?city':
+            return self._client(), 'get', index, {'city': city}
+        if scenario == 'index?date+city':
+            return self._client(), 'get', index, {'city': city, 'date': slot_date.isoformat()}
+        if scenario == 'index?type+wifi':
+            return self._client(), 'get', index, {'type': rng.choice(('BAR', 'CAFE', 'COWORKING')), 'wifi': '1'}
+        if scenario == 'index?search':
+            return self._client(), 'get', index, {'search': rng.choice(('comptoir', 'atelier gare', 'coworking'))}
+        if scenario == 'index?geo':
+            if sample['point'] is None:
+                return None
+            latitude, longitude = sample['point']
+            return self._client(), 'get', index, {'lat': latitude, 'lng': longitude, 'radius': 5}
+        if scenario == 'timeslot_detail':
+            return self._client(), 'get', reverse('timeslot_detail', args=[slot_id]), {}
+        if scenario == 'book_timeslot':
+            client = self._client(rng.choice(sample['bookers']))
+            return client, 'post', reverse('book_timeslot', args=[slot_id]), {'number_of_places': 1}
+        if scenario == 'my_bookings':
+            if not sample['customers']:
+                return None
+            return self._client(rng.choice(sample['customers'])), 'get', reverse('my_bookings'), {}
+        if scenario == 'establishment_dashboard':
+            if not sample['owners']:
+                return None
+            return self._client(rng.choice(sample['owners'])), 'get', reverse('establishment_dashboard'), {}
+        raise CommandError(f'Scénario inconnu : {scenario}')
+
+    def _run(self, count, concurrency, seed):
+        """Exécute `count` requêtes ; retourne ({scénario: [(ms, requêtes, erreur)]}, durée totale)."""
+        names, weights = zip(*SCENARIOS)
+        plan = random.Random(seed).choices(names, weights=weights, k=count)
+        results = defaultdict(list)
+        lock = threading.Lock()
+
+        def worker(offset):
+            rng = random.Random(seed * 1000 + offset)
+            try:
+                for scenario in plan[offset::concurrency]:
+                    request = self._request(scenario, rng)
+                    if request is None:
+                        continue
+                    client, method, url, data = request
+                    # Toutes les bases : réplique en lecture comprise (core/db.py)
+                    with ExitStack() as stack:
+                        contexts = [
+                            stack.enter_context(CaptureQueriesContext(connection))
+                            for connection in connections.all()
+                        ]
+                        began = time.perf_counter()
+                        try:
+                            response = getattr(client, method)(url, data)
+                            error = response.status_code >= 500
+                        except Exception:
+                            error = True
+                        elapsed = (time.perf_counter() - began) * 1000
+                    with lock:
+                        queries = sum(len(context.captured_queries) for context in contexts)
+                        results[scenario].append((elapsed, queries, error))
+            finally:
+                connections.close_all()
+
+        began = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, range(concurrency)))
+        return results, time.perf_counter() - began
+
+    def _summary(self, samples):
+        latencies = sorted(elapsed for elapsed, _, _ in samples)
+        queries = [count for _, count, _ in samples]
+        summary = {'requests': len(samples), 'errors': sum(error for _, _, error in samples)}
+        summary.update({name: round(_quantile(latencies, q), 2) for name, q in QUANTILES})
+        summary['queries_mean'] = round(sum(queries) / len(queries), 1)
+        summary['queries_max'] = max(queries)
+        return summary
+
+    def _compare(self, baseline, report):
+        self.stdout.write(f"Comparaison avec la référence du {baseline.get('created_at', '?')} :")
+        for name, current in report['views'].items():
+            previous = baseline.get('views', {}).get(name)
+            if previous is None:
+                self.stdout.write(f'  {name} : nouveau scénario')
+                continue
+            change = (current['p95_ms'] - previous['p95_ms']) / max(previous['p95_ms'], 1e-9) * 100
+            line = (
+                f"  {name} : p95 {previous['p95_ms']} -> {current['p95_ms']} ms ({change:+.0f} %), "
+                f"requêtes max {previous['queries_max']} -> {current['queries_max']}"
+            )
+            regressed = change > 20 or current['queries_max'] > previous['queries_max']
+            self.stdout.write(self.style.WARNING(line) if regressed else line)
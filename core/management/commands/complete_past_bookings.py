@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+from core import archive
+
+
+class Command(BaseCommand):
+    """
+    Termine les réservations passées et archive les vieux créneaux.
+
+    À planifier (cron), par exemple toutes les heures :
+        python manage.py complete_past_bookings
+    Les réservations confirmées des créneaux terminés depuis plus de
+    --attendance-days jours (délai laissé aux établissements pour pointer
+    présences et absences) passent à COMPLETED : non pointées, elles sont
+    présumées honorées et ne comptent pas dans le taux d'absence. Les
+    listes d'attente des créneaux terminés sont vidées, puis les créneaux
+    antérieurs à la rétention (--retention-days, arrondi au premier jour du
+    mois) sont déplacés dans les tables froides. Traitement
+    par paquets, chacun dans sa transaction : relançable sans risque.
+    """
+    help = 'Passe les réservations passées à « Terminé » et archive les créneaux anciens.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention-days', type=int, default=archive.DEFAULT_RETENTION_DAYS,
+            help=f'Jours conservés dans les tables chaudes (défaut {archive.DEFAULT_RETENTION_DAYS}).',
+        )
+        parser.add_argument(
+            '--attendance-days', type=int, default=archive.ATTENDANCE_DAYS,
+            help=f'Délai de pointage des présences avant de terminer (défaut {archive.ATTENDANCE_DAYS}).',
+        )
+        parser.add_argument('--no-archive', action='store_true', help='Ne fait que terminer les réservations.')
+        parser.add_argument('--chunk-size', type=int, default=archive.COMPLETE_CHUNK_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Compte sans rien modifier.')
+
+    def handle(self, *args, **options):
+        if options['retention_days'] < 1:
+            raise CommandError('La rétention doit être d\'au moins un jour.')
+        if options['attendance_days'] < 0:
+            raise CommandError('Le délai de pointage ne peut pas être négatif.')
+        if options['chunk_size'] < 1:
+            raise CommandError('La taille de paquet doit être au moins 1.')
+        before = archive.archive_before(retention_days=options['retention_days'])
+
+        if options['dry_run']:
+            pending = archive.past_bookings(attendance_days=options['attendance_days']).count()
+            self.stdout.write(f'{pending} réservation(s) à terminer.')
+            self.stdout.write(f'{archive.past_waitlists().count()} inscription(s) en liste d\'attente à supprimer.')
+            if not options['no_archive']:
+                self.stdout.write(
+                    f'{archive.archivable_time_slots(before).count()} créneau(x) antérieur(s) au {before} à archiver.'
+                )
+            return
+
+        completed = archive.complete_past_bookings(
+            chunk_size=options['chunk_size'], attendance_days=options['attendance_days'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'{completed} réservation(s) terminée(s).'))
+        purged = archive.purge_past_waitlists()
+        self.stdout.write(self.style.SUCCESS(f'{purged} inscription(s) en liste d\'attente supprimée(s).'))
+        if not options['no_archive']:
+            slots, bookings = archive.archive_time_slots(before, chunk_size=options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f'{slots} créneau(x) et {bookings} réservation(s) antérieurs au {before} archivés.'
+            ))
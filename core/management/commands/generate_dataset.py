@@ -0,0 +1,216 @@
+import bisect
+import csv
+import itertools
+import math
+import random
+import time
+from datetime import date, time as dt_time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core import facets, geo, listing_cache, occupancy, search
+from core.models import Booking, CustomUser, Establishment, TimeSlot
+
+NAMES = ('Le Comptoir', 'La Fabrique', "L'Atelier", 'Le Repaire', 'La Terrasse', 'Le Quai', 'La Cantine', 'Le Bureau')
+NAME_SUFFIXES = ('du Marché', 'des Arts', 'de la Gare', 'du Port', 'Saint-Louis', 'Central', 'des Halles', 'du Canal')
+TITLES = ('Matinée coworking', 'Après-midi calme', 'Journée focus', 'Afterwork laptop', 'Brunch & wifi')
+PRICES = ('Gratuit', '1 consommation', '5 €', '10 € la journée')
+# (heure de début, durée en heures)
+SCHEDULES = ((8, 4), (9, 3), (10, 2), (13, 4), (14, 3), (16, 2), (18, 3))
+
+
+class Command(BaseCommand):
+    """
+    Génère un jeu de données synthétique à grande échelle pour les tests de
+    charge (voir aussi `bench_views`).
+
+    Exemple : python manage.py generate_dataset --establishments 10000 --slots 1000000 --bookings 5000000
+
+    La popularité des villes du gazetteer suit une loi de Zipf (`--city-skew`) :
+    quelques grandes villes concentrent établissements, créneaux et
+    réservations, comme en production. Les créneaux couvrent `--past-days`
+    jours passés (réservations terminées) et `--days` jours à venir.
+
+    Tout passe par `bulk_create` par tranches de `--chunk-size` créneaux,
+    chacune dans sa transaction : les signaux sont donc contournés, et le
+    compteur de places réservées est calculé à la génération. L'index de
+    recherche, les facettes et l'occupation sont reconstruits à la fin. Les
+    comptes créés portent le préfixe `--prefix` ; `--clear` supprime d'abord
+    les données d'une génération précédente (suppression ORM, lente sur de
+    gros volumes : sur une base dédiée, `flush` est plus rapide).
+
+    Le nombre de réservations obtenu est proche de `--bookings`, sans y être
+    exactement égal (les créneaux pleins en limitent le nombre).
+    """
+    help = 'Génère un jeu de données synthétique (établissements, créneaux, réservations) pour les tests de charge.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--establishments', type=int, default=10000)
+        parser.add_argument('--slots', type=int, default=1000000)
+        parser.add_argument('--bookings', type=int, default=5000000, help='Nombre visé de réservations.')
+        parser.add_argument('--customers', type=int, default=50000, help='Nombre de clients.')
+        parser.add_argument('--days', type=int, default=60, help='Jours à venir couverts par les créneaux.')
+        parser.add_argument('--past-days', type=int, default=30, help='Jours passés couverts par les créneaux.')
+        parser.add_argument('--city-skew', type=float, default=1.1, help='Exposant de Zipf de la popularité des villes.')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Créneaux insérés par transaction.')
+        parser.add_argument('--seed', type=int, default=42, help='Graine aléatoire (jeu reproductible).')
+        parser.add_argument('--prefix', default='gen', help='Préfixe des noms d\'utilisateur générés.')
+        parser.add_argument('--clear', action='store_true', help='Supprime d\'abord les données du même préfixe.')
+
+    def handle(self, *args, **options):
+        for name in ('establishments', 'slots', 'customers', 'chunk_size'):
+            if options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')} doit être au moins 1.")
+        if options['bookings'] < 0 or options['days'] < 0 or options['past_days'] < 0:
+            raise CommandError('--bookings, --days et --past-days ne peuvent pas être négatifs.')
+        self.rng = random.Random(options['seed'])
+        self.prefix = options['prefix']
+        self.chunk_size = options['chunk_size']
+        began = time.perf_counter()
+
+        if options['clear']:
+            deleted, _ = CustomUser.objects.filter(username__startswith=f'{self.prefix}_').delete()
+            self.stdout.write(f'{deleted} ligne(s) supprimée(s).')
+        if CustomUser.objects.filter(username__startswith=f'{self.prefix}_').exists():
+            raise CommandError(f'Des données « {self.prefix} » existent déjà : --clear ou un autre --prefix.')
+
+        cities = self._cities(options['city_skew'])
+        owners = self._users('owner', math.ceil(options['establishments'] / 5), 'ETABLISSEMENT')
+        customers = self._users('customer', options['customers'], 'PARTICULIER')
+        establishments = self._establishments(options['establishments'], cities, owners)
+        self.stdout.write(f'{len(owners) + len(customers)} utilisateur(s), {len(establishments)} établissement(s)')
+
+        slots, bookings = self._slots_and_bookings(establishments, customers, options)
+        self.stdout.write(f'{slots} créneau(x), {bookings} réservation(s)')
+
+        self.stdout.write('Reconstruction de l\'index de recherche, des facettes et de l\'occupation...')
+        with transaction.atomic():
+            search.get_backend().rebuild()
+        facets.rebuild()
+        today = date.today()
+        occupancy.rebuild(since=today - timedelta(days=options['past_days']), until=today + timedelta(days=options['days']))
+        listing_cache.invalidate_city(*{name for (name, _, _), _ in cities})
+
+        self.stdout.write(self.style.SUCCESS(f'Jeu de données généré en {time.perf_counter() - began:.1f} s.'))
+
+    def _cities(self, skew):
+        """Villes du gazetteer (hors codes postaux) et leur poids de popularité (Zipf)."""
+        with open(geo.GAZETTEER_PATH, encoding='utf-8') as handle:
+            rows = [row for row in csv.DictReader(handle) if not row['postcode']]
+        return [
+            ((row['name'], float(row['latitude']), float(row['longitude'])), 1 / (rank ** skew))
+            for rank, row in enumerate(rows, start=1)
+        ]
+
+    def _users(self, role, count, user_type):
+        """Crée `count` comptes (mot de passe inutilisable) et retourne leurs ids."""
+        password = make_password(None)
+        pks = []
+        for start in range(0, count, self.chunk_size):
+            users = CustomUser.objects.bulk_create([
+                CustomUser(username=f'{self.prefix}_{role}_{index}', user_type=user_type, password=password)
+                for index in range(start, min(start + self.chunk_size, count))
+            ])
+            pks += [user.pk for user in users]
+        return pks
+
+    def _establishments(self, count, cities, owners):
+        """Crée les établissements ; retourne [(id, poids de popularité)]."""
+        places, weights = zip(*cities)
+        types = [value for value, _ in Establishment.ESTABLISHMENT_TYPE_CHOICES]
+        created = []
+        for start in range(0, count, self.chunk_size):
+            size = min(self.chunk_size, count - start)
+            chosen = self.rng.choices(range(len(places)), weights=weights, k=size)
+            batch = []
+            for offset, city_index in enumerate(chosen):
+                city, latitude, longitude = places[city_index]
+                latitude += self.rng.gauss(0, 0.02)
+                longitude += self.rng.gauss(0, 0.03)
+                batch.append(Establishment(
+                    owner_id=owners[(start + offset) % len(owners)],
+                    name=f'{self.rng.choice(NAMES)} {self.rng.choice(NAME_SUFFIXES)}',
+                    establishment_type=self.rng.choice(types),
+                    address=f'{self.rng.randint(1, 120)} rue de la République',
+                    city=city,
+                    city_key=facets.city_key(city),
+                    wifi_available=self.rng.random() < 0.8,
+                    power_outlets=self.rng.random() < 0.6,
+                    quiet_zone=self.rng.random() < 0.3,
+                    free_coffee=self.rng.random() < 0.2,
+                    latitude=latitude,
+                    longitude=longitude,
+                    geohash=geo.encode_geohash(latitude, longitude),
+                ))
+            with transaction.atomic():
+                batch = Establishment.objects.bulk_create(batch)
+            # Popularité propre de l'établissement (Pareto) dans celle de sa ville
+            created += [
+                (establishment.pk, weights[city_index] * self.rng.paretovariate(2.0))
+                for establishment, city_index in zip(batch, chosen)
+            ]
+        return created
+
+    def _slots_and_bookings(self, establishments, customers, options):
+        today = date.today()
+        pks, weights = zip(*establishments)
+        cumulative = list(itertools.accumulate(weights))
+        total_weight = cumulative[-1]
+        # Demande d'un créneau : proportionnelle à la racine du poids de son
+        # établissement (atténuée, sinon les créneaux des grandes villes
+        # plafonnent à leur capacité), normalisée sur les créneaux tirés
+        drawn_mean = sum(weight * math.sqrt(weight) for weight in weights) / total_weight
+        mean_bookings = options['bookings'] / options['slots']
+
+        slots_total = bookings_total = 0
+        for start in range(0, options['slots'], self.chunk_size):
+            size = min(self.chunk_size, options['slots'] - start)
+            time_slots, plans = [], []
+            for _ in range(size):
+                index = bisect.bisect_left(cumulative, self.rng.random() * total_weight)
+                slot_date = today + timedelta(days=self.rng.randint(-options['past_days'], options['days']))
+                start_hour, hours = self.rng.choice(SCHEDULES)
+                capacity = self.rng.randint(4, 30)
+                plan = self._plan_bookings(
+                    capacity, mean_bookings * math.sqrt(weights[index]) / drawn_mean, customers, past=slot_date < today,
+                )
+                time_slots.append(TimeSlot(
+                    establishment_id=pks[index],
+                    title=self.rng.choice(TITLES),
+                    date=slot_date,
+                    start_time=dt_time(start_hour, 0),
+                    end_time=dt_time(start_hour + hours, 0),
+                    total_capacity=capacity,
+                    price_info=self.rng.choice(PRICES),
+                    reserved_places=sum(places for _, places, status in plan if status in Booking.OCCUPYING_STATUSES),
+                ))
+                plans.append(plan)
+            with transaction.atomic():
+                time_slots = TimeSlot.objects.bulk_create(time_slots)
+                bookings = [
+                    Booking(user_id=user_id, time_slot_id=time_slot.pk, number_of_places=places, status=status)
+                    for time_slot, plan in zip(time_slots, plans)
+                    for user_id, places, status in plan
+                ]
+                Booking.objects.bulk_create(bookings, batch_size=self.chunk_size)
+            slots_total += len(time_slots)
+            bookings_total += len(bookings)
+            self.stdout.write(f'  {slots_total} créneau(x), {bookings_total} réservation(s)...')
+        return slots_total, bookings_total
+
+    def _plan_bookings(self, capacity, mean, customers, past):
+        """Réservations d'un créneau : [(client, places, statut)], sans dépasser la capacité."""
+        count = round(self.rng.expovariate(1 / mean)) if mean > 0 else 0
+        plan, remaining = [], capacity
+        for user_id in self.rng.sample(customers, min(count, len(customers))):
+            places = 1 if self.rng.random() < 0.8 else self.rng.randint(2, 3)
+            if self.rng.random() < 0.1:
+                plan.append((user_id, places, 'CANCELLED'))
+                continue
+            if places > remaining:
+                break
+            remaining -= places
+            plan.append((user_id, places, 'COMPLETED' if past else 'CONFIRMED'))
+        return plan
@@ -0,0 +1,77 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from core import recurrence
+from core.models import Establishment
+
+
+class Command(BaseCommand):
+    """
+    Génère des créneaux récurrents pour un établissement.
+
+    Exemple : python manage.py generate_timeslots 3 --from 2026-01-05 --to 2026-03-31
+              --days MO,TU,WE,TH,FR --times 09:00-12:00,14:00-18:00 --except 2026-01-01
+              --title "Coworking" --capacity 8 --price Gratuit
+    """
+    help = 'Génère des créneaux récurrents (jours, plages horaires, période, exceptions).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('establishment', type=int, help="Id de l'établissement.")
+        parser.add_argument('--from', dest='start_date', type=date.fromisoformat, required=True)
+        parser.add_argument('--to', dest='end_date', type=date.fromisoformat, required=True)
+        parser.add_argument('--days', required=True, help='Jours : MO,TU,... ou lun,mar,...')
+        parser.add_argument('--times', required=True, help='Plages : 09:00-12:00,14:00-18:00')
+        parser.add_argument('--except', dest='exceptions', default='', help='Dates exclues, séparées par des virgules.')
+        parser.add_argument('--title', required=True)
+        parser.add_argument('--description', default='')
+        parser.add_argument('--capacity', type=int, required=True)
+        parser.add_argument('--price', default='Gratuit')
+        parser.add_argument('--group-only', action='store_true')
+        parser.add_argument('--dry-run', action='store_true', help='Affiche le plan sans rien créer.')
+
+    def handle(self, *args, **options):
+        try:
+            establishment = Establishment.objects.get(pk=options['establishment'])
+        except Establishment.DoesNotExist:
+            raise CommandError(f"Établissement {options['establishment']} introuvable.")
+        if options['capacity'] < 1:
+            raise CommandError('La capacité doit être au moins 1.')
+        if options['start_date'] > options['end_date']:
+            raise CommandError('La date de fin doit suivre la date de début.')
+
+        try:
+            rule = recurrence.RecurrenceRule(
+                weekdays=recurrence.parse_weekdays(options['days']),
+                time_ranges=recurrence.parse_time_ranges(options['times']),
+                start_date=options['start_date'],
+                end_date=options['end_date'],
+                exceptions=recurrence.parse_dates(options['exceptions']),
+            )
+            slot_fields = {
+                'title': options['title'],
+                'description': options['description'],
+                'total_capacity': options['capacity'],
+                'price_info': options['price'],
+                'is_group_only': options['group_only'],
+            }
+            if options['dry_run']:
+                result = recurrence.plan(establishment, rule, **slot_fields)
+            else:
+                result = recurrence.create(establishment, rule, **slot_fields)
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        for (slot_date, start, end), existing in result.conflicts:
+            self.stdout.write(
+                f'Ignoré : {slot_date} {start:%H:%M}-{end:%H:%M} chevauche « {existing.title} »'
+            )
+        for time_slot in result.over_capacity:
+            self.stdout.write(
+                f'Ignoré : {time_slot.date} {time_slot.start_time:%H:%M}-{time_slot.end_time:%H:%M} '
+                f'dépasse les places assises ({result.establishment.max_seating})'
+            )
+        verb = 'à créer' if options['dry_run'] else 'créé(s)'
+        ignored = len(result.conflicts) + len(result.over_capacity)
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(result.to_create)} créneau(x) {verb}, {ignored} ignoré(s).'
+        ))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from core import geo
+from core.models import Establishment
+
+
+class Command(BaseCommand):
+    """
+    Géocode les établissements depuis le gazetteer embarqué (sans réseau).
+
+    Par défaut, seuls les établissements sans position sont traités ;
+    --force recalcule toutes les positions.
+    """
+    help = 'Géocode les établissements hors ligne et met à jour leur geohash.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Recalcule aussi les positions existantes.')
+
+    def handle(self, *args, **options):
+        establishments = Establishment.objects.all()
+        if not options['force']:
+            establishments = establishments.filter(latitude__isnull=True)
+
+        located, missing, changed = 0, [], []
+        for establishment in establishments.iterator():
+            if geo.locate(establishment, force=options['force']):
+                located += 1
+            else:
+                missing.append(establishment)
+            changed.append(establishment)
+
+        Establishment.objects.bulk_update(changed, ['latitude', 'longitude', 'geohash'], batch_size=500)
+
+        for establishment in missing:
+            self.stdout.write(f'Adresse inconnue du gazetteer : {establishment}')
+        self.stdout.write(self.style.SUCCESS(f'{located} établissement(s) géocodé(s), {len(missing)} sans position.'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from core import listing_cache
+
+
+class Command(BaseCommand):
+    """
+    Affiche les compteurs de succès / échecs du cache de la page d'accueil.
+
+    Avec un cache local (LocMemCache), les compteurs sont ceux du processus
+    courant : utiliser un backend partagé pour observer le serveur.
+    """
+    help = 'Affiche (et remet à zéro) les compteurs du cache de listing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Remet les compteurs à zéro.')
+
+    def handle(self, *args, **options):
+        stats = listing_cache.stats()
+        self.stdout.write(f"Succès : {stats['hits']}")
+        self.stdout.write(f"Échecs : {stats['misses']}")
+        self.stdout.write(f"Taux de succès : {stats['hit_ratio']:.1%}")
+        if options['reset']:
+            listing_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS('Compteurs remis à zéro.'))
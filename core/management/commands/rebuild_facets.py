@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from core import facets
+
+
+class Command(BaseCommand):
+    """
+    Reconstruit la table de facettes SlotFacet depuis les créneaux.
+
+    Les signaux la tiennent à jour au fil de l'eau ; cette commande corrige
+    les écarts laissés par les mises à jour en masse (QuerySet.update, bulk_create).
+    """
+    help = 'Reconstruit la table de facettes (villes, types, équipements).'
+
+    def handle(self, *args, **options):
+        count = facets.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'{count} ligne(s) de facettes reconstruite(s).'))
@@ -0,0 +1,35 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from core import occupancy
+
+
+class Command(BaseCommand):
+    """
+    Recalcule les rollups d'occupation (DailyOccupancy, CustomerOccupancy).
+
+    À planifier chaque nuit (cron) : par défaut, recalcule les 7 derniers
+    jours et les 30 prochains pour rattraper les mises à jour en masse
+    (QuerySet.update) qui échappent aux signaux, puis compacte la table.
+    --all reconstruit tout l'historique (première mise en place).
+    """
+    help = 'Recalcule et compacte les rollups d\'occupation des établissements.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=date.fromisoformat, help='Premier jour (AAAA-MM-JJ).')
+        parser.add_argument('--until', type=date.fromisoformat, help='Dernier jour (AAAA-MM-JJ).')
+        parser.add_argument('--all', action='store_true', help='Tout l\'historique.')
+        parser.add_argument('--establishment', type=int, help='Un seul établissement.')
+
+    def handle(self, *args, **options):
+        since, until = options['since'], options['until']
+        if not options['all']:
+            today = date.today()
+            since = since or today - timedelta(days=7)
+            until = until or today + timedelta(days=30)
+
+        written = occupancy.rebuild(since=since, until=until, establishment_id=options['establishment'])
+        compacted = occupancy.compact()
+        self.stdout.write(self.style.SUCCESS(
+            f'{written} ligne(s) horaires recalculée(s), {compacted} ligne(s) vide(s) supprimée(s).'
+        ))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from core.models import TimeSlot, Booking
+
+
+class Command(BaseCommand):
+    """
+    Vérifie et reconstruit le compteur TimeSlot.reserved_places.
+
+    Le compteur est maintenu par Booking.save(), mais les mises à jour en masse
+    (QuerySet.update, bulk_create) le contournent : cette commande le recalcule
+    depuis les réservations confirmées ou terminées.
+    """
+    help = 'Vérifie et reconstruit le compteur de places réservées des créneaux.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Vérifie seulement, sans rien modifier (code retour non nul si écart).',
+        )
+
+    def handle(self, *args, **options):
+        confirmed = Booking.objects.filter(
+            time_slot=OuterRef('pk'), status__in=Booking.OCCUPYING_STATUSES
+        ).order_by().values('time_slot').annotate(total=Sum('number_of_places')).values('total')
+        expected = Coalesce(Subquery(confirmed), Value(0))
+
+        with transaction.atomic():
+            drifted = list(
+                TimeSlot.objects.annotate(expected=expected)
+                .exclude(reserved_places=F('expected'))
+                .values_list('pk', 'reserved_places', 'expected')
+            )
+
+            for pk, stored, computed in drifted:
+                self.stdout.write(f'Créneau #{pk} : {stored} enregistrée(s), {computed} attendue(s)')
+
+            if options['check']:
+                if drifted:
+                    raise CommandError(f'{len(drifted)} créneau(x) avec un compteur incorrect.')
+                self.stdout.write(self.style.SUCCESS('Tous les compteurs sont corrects.'))
+                return
+
+            updated = TimeSlot.objects.filter(pk__in=[pk for pk, _, _ in drifted]).update(
+                reserved_places=expected
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'{updated} créneau(x) corrigé(s).'))
+
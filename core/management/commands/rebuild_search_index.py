@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core import search
+
+
+class Command(BaseCommand):
+    """
+    Reconstruit entièrement l'index de recherche plein texte.
+
+    Les signaux tiennent l'index à jour au fil de l'eau ; cette commande sert
+    après des imports en masse (bulk_create, QuerySet.update) qui les contournent.
+    """
+    help = 'Reconstruit l\'index de recherche plein texte des créneaux.'
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        with transaction.atomic():
+            count = backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'{count} créneau(x) indexé(s) ({type(backend).__name__}).'
+        ))
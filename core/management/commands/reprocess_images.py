@@ -0,0 +1,41 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import images
+
+
+class Command(BaseCommand):
+    """
+    (Re)produit les miniatures des logos et avatars existants.
+
+    À lancer après la mise en place du traitement des images, ou après un
+    changement des largeurs (`RENDITIONS`) ou des formats. Les miniatures
+    déjà présentes sont conservées (noms dérivés du contenu) : relancer la
+    commande ne coûte que la lecture des images.
+    """
+    help = 'Produit les miniatures WebP/JPEG des logos et avatars existants.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=sorted(images.TARGETS), help='Limiter à un type d\'image.')
+        parser.add_argument(
+            '--missing-only', action='store_true', help='Seulement les images sans empreinte (jamais traitées).',
+        )
+        parser.add_argument('--workers', type=int, default=4, help='Threads de traitement.')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers doit être au moins 1.')
+        kinds = [options['kind']] if options['kind'] else sorted(images.TARGETS)
+        for kind in kinds:
+            model, field, digest_field = images.TARGETS[kind]
+            objects = model.objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+            if options['missing_only']:
+                objects = objects.filter(**{digest_field: ''})
+            pks = list(objects.values_list('pk', flat=True))
+            with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                digests = list(pool.map(partial(images.run_in_worker, kind), pks))
+            failed = digests.count(None)
+            self.stdout.write(f'{kind} : {len(pks) - failed} image(s) traitée(s), {failed} échec(s)')
+        self.stdout.write(self.style.SUCCESS('Miniatures à jour.'))
@@ -0,0 +1,50 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core import db
+
+
+class Command(BaseCommand):
+    """
+    Copie la base SQLite principale dans le fichier de la réplique, pour
+    essayer le routage des lectures (core/db.py) en local :
+
+        DB_REPLICA_NAME=replica.sqlite3 python manage.py sync_sqlite_replica --interval 2
+
+    La copie passe par l'API de sauvegarde en ligne de SQLite : cohérente,
+    sans arrêter le serveur. Avec `--interval`, elle est refaite toutes les
+    N secondes, ce qui simule le retard d'une réplication asynchrone.
+    """
+    help = 'Recopie la base SQLite principale dans la réplique en lecture (essais locaux).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help='Recopie périodique (secondes) ; 0 : une fois.')
+
+    def handle(self, *args, **options):
+        alias = db.replica_alias()
+        if alias is None:
+            raise CommandError('Aucune réplique déclarée : définir DB_REPLICA_NAME.')
+        primary, replica = connections[DEFAULT_DB_ALIAS], connections[alias]
+        if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            raise CommandError('Réservé aux bases SQLite.')
+        if str(primary.settings_dict['NAME']) == str(replica.settings_dict['NAME']):
+            raise CommandError('La réplique doit être un autre fichier que la base principale.')
+
+        while True:
+            began = time.perf_counter()
+            source = sqlite3.connect(primary.settings_dict['NAME'])
+            target = sqlite3.connect(replica.settings_dict['NAME'], timeout=20)
+            try:
+                source.backup(target)
+            finally:
+                source.close()
+                target.close()
+            self.stdout.write(self.style.SUCCESS(
+                f'Réplique à jour en {(time.perf_counter() - began) * 1000:.0f} ms.'
+            ))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
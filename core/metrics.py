@@ -0,0 +1,193 @@
+"""
+Mesures de performance par requête (voir core/middleware.py).
+
+Chaque requête produit un `RequestSample` (durée totale, nombre et durée des
+requêtes SQL, durée de rendu des gabarits, taille de la réponse) ajouté à
+un tampon circulaire : une `deque` bornée, dont `append` est atomique,
+donc sans verrou sur le chemin des requêtes. Les plus anciennes mesures
+sont écrasées ; `/metrics` agrège la fenêtre courante par nom d'URL au
+format texte de Prometheus (résumés avec quantiles).
+
+Budgets de requêtes SQL : `settings.QUERY_BUDGETS` ({nom d'URL: maximum}).
+Un dépassement est journalisé ; avec `QUERY_BUDGET_STRICT`, la requête
+échoue (`QueryBudgetExceeded`), ce qui fait échouer le test qui l'a émise.
+"""
+import contextvars
+import logging
+import time
+from collections import deque, namedtuple
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUFFER_SIZE = 2048
+QUANTILES = (0.5, 0.95, 0.99)
+PREFIX = 'workandvibe'
+
+RequestSample = namedtuple('RequestSample', (
+    'view', 'method', 'status', 'duration', 'queries', 'db_duration', 'template_duration', 'size',
+    'over_budget',
+))
+
+# (nom de la métrique, champ de RequestSample, description)
+SUMMARIES = (
+    ('request_duration_seconds', 'duration', 'Durée totale de traitement de la requête.'),
+    ('db_queries', 'queries', 'Nombre de requêtes SQL par requête HTTP.'),
+    ('db_duration_seconds', 'db_duration', 'Temps passé dans la base de données.'),
+    ('template_duration_seconds', 'template_duration', 'Temps de rendu des gabarits.'),
+    ('response_size_bytes', 'size', 'Taille du corps de la réponse (hors flux).'),
+)
+
+_buffer = deque(maxlen=getattr(settings, 'METRICS_BUFFER_SIZE', DEFAULT_BUFFER_SIZE))
+# Mesures de la requête en cours (None hors requête instrumentée)
+current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Une vue a dépassé son budget de requêtes SQL (mode strict)."""
+
+
+class Collector:
+    """Compteurs d'une requête en cours, alimentés par le middleware."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_duration = 0.0
+        self.template_duration = 0.0
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        """Compte et chronomètre une requête SQL."""
+        began = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_duration += time.perf_counter() - began
+            self.queries += 1
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    """
+    Compte la requête SQL dans les mesures de la requête HTTP en cours, s'il
+    y en a une. Elle est retrouvée par la variable de contexte, que
+    sync_to_async propage au thread de l'ORM : une vue async est mesurée
+    comme une vue synchrone.
+    """
+    collector = current.get()
+    if collector is None:
+        return execute(sql, params, many, context)
+    return collector.execute_wrapper(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def instrument(sender, connection, **kwargs):
+    """
+    Installe `execute_wrapper` sur chaque connexion, de tout thread. En tête
+    de liste : `connection.execute_wrapper()` retire le dernier élément en
+    sortie de bloc.
+    """
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, execute_wrapper)
+
+
+def _timed_render(render):
+    def wrapper(self, *args, **kwargs):
+        collector = current.get()
+        if collector is None:
+            return render(self, *args, **kwargs)
+        began = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            collector.template_duration += time.perf_counter() - began
+    wrapper.timed = True
+    return wrapper
+
+
+def install_template_timer():
+    """
+    Chronomètre les rendus de gabarits. Seul le Template du backend est
+    enveloppé : il n'est appelé que pour les rendus de premier niveau
+    (render, render_to_string), les {% include %} ne sont pas comptés deux fois.
+    """
+    from django.template.backends.django import Template
+    if not getattr(Template.render, 'timed', False):
+        Template.render = _timed_render(Template.render)
+
+
+def query_budget(view_name):
+    return getattr(settings, 'QUERY_BUDGETS', {}).get(view_name)
+
+
+def check_budget(view_name, queries):
+    """Retourne True si la vue dépasse son budget (journalisé, ou exception en mode strict)."""
+    budget = query_budget(view_name)
+    if budget is None or queries <= budget:
+        return False
+    message = f'{view_name} : {queries} requêtes SQL pour un budget de {budget}'
+    if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+    return True
+
+
+def record(sample):
+    _buffer.append(sample)
+
+
+def samples():
+    """Copie de la fenêtre courante (deque.copy ne rend pas la main pendant la copie)."""
+    return list(_buffer.copy())
+
+
+def reset():
+    _buffer.clear()
+
+
+def _quantile(values, q):
+    """Quantile par rang le plus proche sur une liste triée."""
+    return values[min(len(values) - 1, max(0, round(q * len(values)) - 1))]
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(window=None):
+    """Agrège la fenêtre par nom d'URL, au format texte de Prometheus."""
+    window = samples() if window is None else window
+    by_view = {}
+    for sample in window:
+        by_view.setdefault(sample.view, []).append(sample)
+
+    lines = [
+        f'# HELP {PREFIX}_metrics_window_requests Requêtes dans la fenêtre de mesure.',
+        f'# TYPE {PREFIX}_metrics_window_requests gauge',
+        f'{PREFIX}_metrics_window_requests {len(window)}',
+    ]
+    for name, field, description in SUMMARIES:
+        metric = f'{PREFIX}_{name}'
+        lines += [f'# HELP {metric} {description}', f'# TYPE {metric} summary']
+        for view, view_samples in sorted(by_view.items()):
+            values = sorted(getattr(sample, field) for sample in view_samples)
+            label = f'view="{_label(view)}"'
+            for q in QUANTILES:
+                lines.append(f'{metric}{{{label},quantile="{q}"}} {_number(_quantile(values, q))}')
+            lines.append(f'{metric}_sum{{{label}}} {_number(sum(values))}')
+            lines.append(f'{metric}_count{{{label}}} {len(values)}')
+
+    metric = f'{PREFIX}_query_budget_exceeded'
+    lines += [
+        f'# HELP {metric} Requêtes de la fenêtre ayant dépassé le budget SQL de leur vue.',
+        f'# TYPE {metric} gauge',
+    ]
+    for view, view_samples in sorted(by_view.items()):
+        if query_budget(view) is not None:
+            lines.append(f'{metric}{{view="{_label(view)}"}} {sum(sample.over_budget for sample in view_samples)}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,101 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import db, metrics
+
+UNRESOLVED = '<unresolved>'
+
+
+class InstrumentationMiddleware:
+    """
+    Mesure chaque requête (durée, requêtes SQL, rendu des gabarits, taille)
+    et l'enregistre dans le tampon de core/metrics.py sous le nom de l'URL
+    (`app:nom` le cas échéant). Vérifie aussi le budget de requêtes SQL de
+    la vue.
+
+    À placer en tête de MIDDLEWARE pour inclure le coût des autres
+    middlewares (session, authentification...). Synchrone ou async selon la
+    chaîne : sous ASGI, les vues async ne passent pas par un thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        metrics.install_template_timer()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        collector = metrics.Collector()
+        token = metrics.current.set(collector)
+        began = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        return self._record(request, response, collector, began)
+
+    async def __acall__(self, request):
+        collector = metrics.Collector()
+        token = metrics.current.set(collector)
+        began = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        return self._record(request, response, collector, began)
+
+    def _record(self, request, response, collector, began):
+        duration = time.perf_counter() - began
+        match = request.resolver_match
+        view = (match.view_name if match else '') or UNRESOLVED
+        metrics.record(metrics.RequestSample(
+            view=view,
+            method=request.method,
+            status=response.status_code,
+            duration=duration,
+            queries=collector.queries,
+            db_duration=collector.db_duration,
+            template_duration=collector.template_duration,
+            size=0 if response.streaming else len(response.content),
+            over_budget=metrics.check_budget(view, collector.queries),
+        ))
+        return response
+
+
+class ReplicaPinMiddleware:
+    """
+    Routage des lectures vers la réplique (voir core/db.py) : suit les
+    écritures de chaque requête, et épingle au primaire, par cookie, la
+    session qui vient d'écrire.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        with db.routing(pinned=db.is_pinned(request)) as state:
+            response = self.get_response(request)
+        return self._pin(response, state)
+
+    async def __acall__(self, request):
+        with db.routing(pinned=db.is_pinned(request)) as state:
+            response = await self.get_response(request)
+        return self._pin(response, state)
+
+    def _pin(self, response, state):
+        if state.wrote and db.replica_alias() is not None:
+            db.pin(response)
+        return response
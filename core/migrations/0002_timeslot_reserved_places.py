@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:29
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_reserved_places(apps, schema_editor):
+    TimeSlot = apps.get_model('core', 'TimeSlot')
+    Booking = apps.get_model('core', 'Booking')
+    confirmed = Booking.objects.filter(
+        time_slot=OuterRef('pk'), status='CONFIRMED'
+    ).order_by().values('time_slot').annotate(total=Sum('number_of_places')).values('total')
+    TimeSlot.objects.using(schema_editor.connection.alias).update(reserved_places=Coalesce(Subquery(confirmed), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timeslot',
+            name='reserved_places',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Places réservées'),
+        ),
+        migrations.RunPython(fill_reserved_places, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:31
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_timeslot_reserved_places'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='timeslot',
+            options={'ordering': ['date', 'start_time', 'id'], 'verbose_name': 'Créneau', 'verbose_name_plural': 'Créneaux'},
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_timeslot_ordering_id'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('status', 'CONFIRMED')), fields=['time_slot', 'status'], name='booking_confirmed_slot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['user', '-created_at'], name='booking_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='establishment',
+            index=models.Index(fields=['city'], name='establishment_city_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='establishment',
+            index=models.Index(fields=['establishment_type', 'city'], name='establishment_type_city_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='establishment',
+            index=models.Index(condition=models.Q(('wifi_available', True)), fields=['city'], name='establishment_wifi_city_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timeslot',
+            index=models.Index(fields=['date', 'start_time', 'id'], name='timeslot_date_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timeslot',
+            index=models.Index(fields=['establishment', 'date', 'start_time'], name='timeslot_estab_date_idx'),
+        ),
+    ]
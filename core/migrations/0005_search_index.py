@@ -0,0 +1,64 @@
+from django.db import migrations
+
+INITIAL_FILL = {
+    'sqlite': (
+        'INSERT INTO core_timeslot_fts '
+        '(rowid, title, description, establishment_name, city, establishment_description) '
+        "SELECT t.id, t.title, COALESCE(t.description, ''), e.name, e.city, COALESCE(e.description, '') "
+        'FROM core_timeslot t JOIN core_establishment e ON e.id = t.establishment_id'
+    ),
+    'postgresql': (
+        'INSERT INTO core_timeslot_search (timeslot_id, document) '
+        "SELECT t.id, setweight(to_tsvector('french', unaccent(t.title)), 'A') || "
+        "setweight(to_tsvector('french', unaccent(e.name)), 'A') || "
+        "setweight(to_tsvector('french', unaccent(e.city)), 'B') || "
+        "setweight(to_tsvector('french', unaccent(COALESCE(t.description, '') || ' ' || "
+        "COALESCE(e.description, ''))), 'C') "
+        'FROM core_timeslot t JOIN core_establishment e ON e.id = t.establishment_id '
+        'ON CONFLICT (timeslot_id) DO UPDATE SET document = EXCLUDED.document'
+    ),
+}
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS core_timeslot_fts USING fts5('
+            'title, description, establishment_name, city, establishment_description, '
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS unaccent')
+        schema_editor.execute(
+            'CREATE TABLE IF NOT EXISTS core_timeslot_search ('
+            'timeslot_id bigint PRIMARY KEY REFERENCES core_timeslot (id) ON DELETE CASCADE, '
+            'document tsvector NOT NULL)'
+        )
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS core_timeslot_search_gin '
+            'ON core_timeslot_search USING GIN (document)'
+        )
+    else:
+        return
+    # Remplissage initial, SQL figé ici (indépendant de core/search.py)
+    schema_editor.execute(INITIAL_FILL[vendor])
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS core_timeslot_fts')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP TABLE IF EXISTS core_timeslot_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
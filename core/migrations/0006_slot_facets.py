@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:36
+
+import unicodedata
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+
+AMENITIES = ('wifi_available', 'power_outlets', 'quiet_zone', 'free_coffee')
+
+
+def normalize(text):
+    """Copie figée de core.search.normalize : minuscules sans accents."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+
+def fill_facets(apps, schema_editor):
+    TimeSlot = apps.get_model('core', 'TimeSlot')
+    SlotFacet = apps.get_model('core', 'SlotFacet')
+    alias = schema_editor.connection.alias
+    totals = defaultdict(lambda: [None, 0, 0])
+    rows = TimeSlot.objects.using(alias).order_by().values(
+        'date', 'establishment__city', 'establishment__establishment_type',
+        *(f'establishment__{name}' for name in AMENITIES),
+    ).annotate(slots=Count('pk'), free=Sum(F('total_capacity') - F('reserved_places')))
+    for row in rows:
+        key = (
+            row['date'], normalize(row['establishment__city']).strip(),
+            row['establishment__establishment_type'],
+            *(row[f'establishment__{name}'] for name in AMENITIES),
+        )
+        totals[key][0] = row['establishment__city']
+        totals[key][1] += row['slots']
+        totals[key][2] += row['free'] or 0
+    fields = ('date', 'city_key', 'establishment_type') + AMENITIES
+    SlotFacet.objects.using(alias).bulk_create(
+        SlotFacet(city=city, slot_count=slots, free_places=free, **dict(zip(fields, key)))
+        for key, (city, slots, free) in totals.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('city_key', models.CharField(max_length=100, verbose_name='Ville normalisée')),
+                ('city', models.CharField(max_length=100, verbose_name='Ville')),
+                ('establishment_type', models.CharField(choices=[('BAR', 'Bar'), ('RESTAURANT', 'Restaurant'), ('PUB', 'Pub'), ('NIGHTCLUB', 'Nightclub'), ('CAFE', 'Café'), ('COWORKING', 'Espace Coworking')], max_length=20, verbose_name="Type d'établissement")),
+                ('wifi_available', models.BooleanField(default=False, verbose_name='WiFi disponible')),
+                ('power_outlets', models.BooleanField(default=False, verbose_name='Prises électriques')),
+                ('quiet_zone', models.BooleanField(default=False, verbose_name='Zone silencieuse')),
+                ('free_coffee', models.BooleanField(default=False, verbose_name='Café offert')),
+                ('slot_count', models.IntegerField(default=0, verbose_name='Créneaux')),
+                ('free_places', models.IntegerField(default=0, verbose_name='Places libres')),
+            ],
+            options={
+                'verbose_name': 'Facette',
+                'verbose_name_plural': 'Facettes',
+                'constraints': [models.UniqueConstraint(fields=('date', 'city_key', 'establishment_type', 'wifi_available', 'power_outlets', 'quiet_zone', 'free_coffee'), name='slotfacet_unique_key')],
+            },
+        ),
+        migrations.RunPython(fill_facets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:39
+
+import csv
+import re
+import unicodedata
+from pathlib import Path
+
+from django.db import migrations, models
+
+# Copies figées de core/geo.py (géocodage hors ligne et geohash) à la date
+# de la migration : les évolutions de ce module ne la modifient pas.
+GAZETTEER_PATH = Path(__file__).resolve().parent.parent / 'data' / 'gazetteer.csv'
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+POSTCODE_RE = re.compile(r'\b(\d{5})\b')
+
+
+def _normalize(text):
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+
+def _city_key(city):
+    key = ' '.join(re.findall(r'\w+', _normalize(city)))
+    return re.sub(r'^st ', 'saint ', key)
+
+
+def _gazetteer():
+    by_postcode, by_city = {}, {}
+    with open(GAZETTEER_PATH, encoding='utf-8') as handle:
+        for row in csv.DictReader(handle):
+            point = (float(row['latitude']), float(row['longitude']))
+            if row['postcode']:
+                by_postcode[row['postcode']] = point
+            else:
+                by_city[_city_key(row['name'])] = point
+    return by_postcode, by_city
+
+
+def _encode_geohash(latitude, longitude, precision=9):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def geocode_establishments(apps, schema_editor):
+    Establishment = apps.get_model('core', 'Establishment')
+    alias = schema_editor.connection.alias
+    by_postcode, by_city = _gazetteer()
+    establishments = list(Establishment.objects.using(alias).all())
+    for establishment in establishments:
+        point = next(
+            (by_postcode[code] for code in POSTCODE_RE.findall(f'{establishment.address} {establishment.city}')
+             if code in by_postcode),
+            by_city.get(_city_key(establishment.city)),
+        )
+        establishment.latitude, establishment.longitude = point if point else (None, None)
+        establishment.geohash = _encode_geohash(*point) if point else ''
+    Establishment.objects.using(alias).bulk_update(
+        establishments, ['latitude', 'longitude', 'geohash'], batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_slot_facets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='establishment',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=12, verbose_name='Geohash'),
+        ),
+        migrations.AddField(
+            model_name='establishment',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True, verbose_name='Latitude'),
+        ),
+        migrations.AddField(
+            model_name='establishment',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True, verbose_name='Longitude'),
+        ),
+        migrations.RunPython(geocode_establishments, migrations.RunPython.noop),
+    ]
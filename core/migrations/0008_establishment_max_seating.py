@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_establishment_location'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='establishment',
+            name='max_seating',
+            field=models.PositiveIntegerField(blank=True, help_text='Nombre maximum de personnes accueillies en même temps, tous créneaux confondus.', null=True, verbose_name='Places assises'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_establishment_max_seating'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='Mois')),
+                ('bookings', models.PositiveIntegerField(default=0, verbose_name='Réservations')),
+                ('places', models.PositiveIntegerField(default=0, verbose_name='Places (hors annulations)')),
+                ('cancelled', models.PositiveIntegerField(default=0, verbose_name='Réservations annulées')),
+                ('establishment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='customer_occupancy', to='core.establishment', verbose_name='Établissement')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to=settings.AUTH_USER_MODEL, verbose_name='Client')),
+            ],
+            options={
+                'verbose_name': 'Occupation client',
+                'verbose_name_plural': 'Occupations clients',
+                'constraints': [models.UniqueConstraint(fields=('establishment', 'month', 'user'), name='customeroccupancy_unique_key')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('hour', models.PositiveSmallIntegerField(verbose_name='Heure')),
+                ('capacity', models.PositiveIntegerField(default=0, verbose_name='Places offertes')),
+                ('reserved', models.PositiveIntegerField(default=0, verbose_name='Places confirmées')),
+                ('cancelled', models.PositiveIntegerField(default=0, verbose_name='Places annulées')),
+                ('completed', models.PositiveIntegerField(default=0, verbose_name='Places terminées')),
+                ('establishment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_occupancy', to='core.establishment', verbose_name='Établissement')),
+            ],
+            options={
+                'verbose_name': 'Occupation horaire',
+                'verbose_name_plural': 'Occupations horaires',
+                'constraints': [models.UniqueConstraint(fields=('establishment', 'date', 'hour'), name='dailyoccupancy_unique_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def count_completed_places(apps, schema_editor):
+    # Le compteur inclut désormais les réservations terminées
+    TimeSlot = apps.get_model('core', 'TimeSlot')
+    Booking = apps.get_model('core', 'Booking')
+    occupied = Booking.objects.filter(
+        time_slot=OuterRef('pk'), status__in=['CONFIRMED', 'COMPLETED']
+    ).order_by().values('time_slot').annotate(total=Sum('number_of_places')).values('total')
+    TimeSlot.objects.using(schema_editor.connection.alias).update(reserved_places=Coalesce(Subquery(occupied), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_occupancy_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTimeSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200, verbose_name='Titre')),
+                ('description', models.TextField(blank=True, null=True, verbose_name='Description')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('start_time', models.TimeField(verbose_name='Heure de début')),
+                ('end_time', models.TimeField(verbose_name='Heure de fin')),
+                ('total_capacity', models.IntegerField(verbose_name='Capacité totale')),
+                ('price_info', models.CharField(max_length=100, verbose_name='Information tarifaire')),
+                ('is_group_only', models.BooleanField(default=False, verbose_name='Réservation de groupe uniquement')),
+                ('reserved_places', models.PositiveIntegerField(default=0, verbose_name='Places réservées')),
+                ('created_at', models.DateTimeField(verbose_name='Date de création')),
+                ('updated_at', models.DateTimeField(verbose_name='Dernière modification')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name="Date d'archivage")),
+                ('establishment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_time_slots', to='core.establishment', verbose_name='Établissement')),
+            ],
+            options={
+                'verbose_name': 'Créneau archivé',
+                'verbose_name_plural': 'Créneaux archivés',
+                'ordering': ['date', 'start_time', 'id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedBooking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number_of_places', models.IntegerField(verbose_name='Nombre de places')),
+                ('status', models.CharField(choices=[('CONFIRMED', 'Confirmé'), ('CANCELLED', 'Annulé'), ('COMPLETED', 'Terminé')], max_length=20, verbose_name='Statut')),
+                ('notes', models.TextField(blank=True, null=True, verbose_name='Notes')),
+                ('created_at', models.DateTimeField(verbose_name='Date de réservation')),
+                ('updated_at', models.DateTimeField(verbose_name='Dernière modification')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_bookings', to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+                ('time_slot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='core.archivedtimeslot', verbose_name='Créneau')),
+            ],
+            options={
+                'verbose_name': 'Réservation archivée',
+                'verbose_name_plural': 'Réservations archivées',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedtimeslot',
+            index=models.Index(fields=['establishment', 'date'], name='archivedslot_estab_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedbooking',
+            index=models.Index(fields=['user', '-created_at'], name='archivedbooking_user_idx'),
+        ),
+        migrations.RunPython(count_completed_places, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:56
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_booking_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message', models.CharField(max_length=255, verbose_name='Message')),
+                ('url', models.CharField(blank=True, max_length=200, verbose_name='Lien')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Date')),
+                ('read_at', models.DateTimeField(blank=True, null=True, verbose_name='Lue le')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+            ],
+            options={
+                'verbose_name': 'Notification',
+                'verbose_name_plural': 'Notifications',
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['user', 'read_at'], name='notification_user_read_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='Waitlist',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number_of_places', models.IntegerField(validators=[django.core.validators.MinValueValidator(1)], verbose_name='Nombre de places')),
+                ('notes', models.TextField(blank=True, null=True, verbose_name='Notes')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name="Date d'inscription")),
+                ('time_slot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist', to='core.timeslot', verbose_name='Créneau')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist', to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+            ],
+            options={
+                'verbose_name': "Liste d'attente",
+                'verbose_name_plural': "Listes d'attente",
+                'ordering': ['time_slot', 'created_at', 'id'],
+                'indexes': [models.Index(fields=['time_slot', 'created_at', 'id'], name='waitlist_fifo_idx')],
+                'constraints': [models.UniqueConstraint(fields=('time_slot', 'user'), name='waitlist_unique_user')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_waitlist_notifications'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='avatar_digest',
+            field=models.CharField(blank=True, default='', editable=False, max_length=16, verbose_name="Empreinte de l'avatar"),
+        ),
+        migrations.AddField(
+            model_name='establishment',
+            name='logo_digest',
+            field=models.CharField(blank=True, default='', editable=False, max_length=16, verbose_name='Empreinte du logo'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_image_digests'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyoccupancy',
+            name='no_show',
+            field=models.PositiveIntegerField(default=0, verbose_name='Places absentes'),
+        ),
+        migrations.AlterField(
+            model_name='archivedbooking',
+            name='status',
+            field=models.CharField(choices=[('CONFIRMED', 'Confirmé'), ('CANCELLED', 'Annulé'), ('COMPLETED', 'Terminé'), ('NO_SHOW', 'Absent')], max_length=20, verbose_name='Statut'),
+        ),
+        migrations.AlterField(
+            model_name='booking',
+            name='status',
+            field=models.CharField(choices=[('CONFIRMED', 'Confirmé'), ('CANCELLED', 'Annulé'), ('COMPLETED', 'Terminé'), ('NO_SHOW', 'Absent')], default='CONFIRMED', max_length=20, verbose_name='Statut'),
+        ),
+    ]
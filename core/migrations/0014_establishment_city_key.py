@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:02
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+# Copie figée de facets.city_key à la date de la migration
+def _city_key(city):
+    decomposed = unicodedata.normalize('NFKD', city or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).lower().strip()
+
+
+def fill_city_key(apps, schema_editor):
+    Establishment = apps.get_model('core', 'Establishment')
+    alias = schema_editor.connection.alias
+    establishments = list(Establishment.objects.using(alias).only('pk', 'city'))
+    for establishment in establishments:
+        establishment.city_key = _city_key(establishment.city)
+    Establishment.objects.using(alias).bulk_update(establishments, ['city_key'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_booking_no_show'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='establishment',
+            name='city_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100, verbose_name='Ville normalisée'),
+        ),
+        migrations.RunPython(fill_city_key, migrations.RunPython.noop),
+    ]
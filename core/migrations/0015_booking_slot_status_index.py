@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_establishment_city_key'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='booking',
+            name='booking_confirmed_slot_idx',
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['time_slot', 'status'], name='booking_slot_status_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:20
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+# Copie figée de Booking.OCCUPYING_STATUSES à la date de la migration
+OCCUPYING_STATUSES = ['CONFIRMED', 'COMPLETED', 'NO_SHOW']
+
+
+def count_occupying_places(apps, schema_editor):
+    # Le compteur inclut désormais les absences (0013)
+    TimeSlot = apps.get_model('core', 'TimeSlot')
+    Booking = apps.get_model('core', 'Booking')
+    alias = schema_editor.connection.alias
+    occupied = Booking.objects.using(alias).filter(
+        time_slot=OuterRef('pk'), status__in=OCCUPYING_STATUSES
+    ).order_by().values('time_slot').annotate(total=Sum('number_of_places')).values('total')
+    TimeSlot.objects.using(alias).update(reserved_places=Coalesce(Subquery(occupied), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_booking_slot_status_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(count_occupying_places, migrations.RunPython.noop),
+    ]
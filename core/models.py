@@ -1,7 +1,15 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models import F
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
+from . import db
+
+
+class SlotCapacityExceeded(ValidationError):
+    """
+    Levée quand une réservation dépasserait la capacité totale du créneau.
+    """
 
 
 class CustomUser(AbstractUser):
@@ -23,6 +31,8 @@ class CustomUser(AbstractUser):
     phone = models.CharField(max_length=20, blank=True, null=True, verbose_name='Téléphone')
     company_name = models.CharField(max_length=200, blank=True, null=True, verbose_name='Nom de l\'entreprise')
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True, verbose_name='Avatar')
+    # Empreinte du fichier d'origine : nomme les miniatures (voir core/images.py)
+    avatar_digest = models.CharField(max_length=16, blank=True, default='', editable=False, verbose_name='Empreinte de l\'avatar')
     
     class Meta:
         verbose_name = 'Utilisateur'
@@ -59,8 +69,11 @@ class Establishment(models.Model):
     )
     address = models.CharField(max_length=300, verbose_name='Adresse')
     city = models.CharField(max_length=100, verbose_name='Ville')
+    # Ville sans accents ni majuscules (facets.city_key) : clé des facettes et du filtre ville
+    city_key = models.CharField(max_length=100, blank=True, default='', editable=False, verbose_name='Ville normalisée')
     description = models.TextField(blank=True, null=True, verbose_name='Description')
     logo = models.ImageField(upload_to='establishments/', blank=True, null=True, verbose_name='Logo')
+    logo_digest = models.CharField(max_length=16, blank=True, default='', editable=False, verbose_name='Empreinte du logo')
     
     # Équipements
     wifi_available = models.BooleanField(default=False, verbose_name='WiFi disponible')
@@ -68,6 +81,20 @@ class Establishment(models.Model):
     quiet_zone = models.BooleanField(default=False, verbose_name='Zone silencieuse')
     free_coffee = models.BooleanField(default=False, verbose_name='Café offert')
     
+    # Places assises : personnes présentes à un instant donné, tous créneaux
+    # confondus (voir core/capacity.py). Vide = pas de limite.
+    max_seating = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        verbose_name='Places assises',
+        help_text='Nombre maximum de personnes accueillies en même temps, tous créneaux confondus.'
+    )
+    
+    # Position, géocodée hors ligne depuis l'adresse (voir core/geo.py)
+    latitude = models.FloatField(blank=True, null=True, verbose_name='Latitude')
+    longitude = models.FloatField(blank=True, null=True, verbose_name='Longitude')
+    geohash = models.CharField(max_length=12, blank=True, default='', db_index=True, verbose_name='Geohash')
+    
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Date de création')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Dernière modification')
     
@@ -75,6 +102,16 @@ class Establishment(models.Model):
         verbose_name = 'Établissement'
         verbose_name_plural = 'Établissements'
         ordering = ['-created_at']
+        indexes = [
+            # Liste des villes (DISTINCT) et filtre par ville
+            models.Index(fields=['city'], name='establishment_city_idx'),
+            models.Index(fields=['establishment_type', 'city'], name='establishment_type_city_idx'),
+            models.Index(
+                fields=['city'],
+                name='establishment_wifi_city_idx',
+                condition=models.Q(wifi_available=True),
+            ),
+        ]
     
     def __str__(self):
         return f"{self.name} - {self.city}"
@@ -115,32 +152,75 @@ class TimeSlot(models.Model):
         verbose_name='Réservation de groupe uniquement'
     )
     
+    # Compteur dénormalisé : somme des places des réservations confirmées,
+    # terminées ou absentes (places occupées, voir Booking.OCCUPYING_STATUSES).
+    # Maintenu par Booking.save() / suppression, reconstruit par
+    # `python manage.py rebuild_reserved_places`.
+    reserved_places = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Places réservées'
+    )
+    
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Date de création')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Dernière modification')
     
     class Meta:
         verbose_name = 'Créneau'
         verbose_name_plural = 'Créneaux'
-        ordering = ['date', 'start_time']
+        ordering = ['date', 'start_time', 'id']
+        indexes = [
+            # Liste publique : date >= aujourd'hui, triée comme le curseur de pagination
+            models.Index(fields=['date', 'start_time', 'id'], name='timeslot_date_start_idx'),
+            # Dashboard : créneaux d'un établissement pour une date
+            models.Index(fields=['establishment', 'date', 'start_time'], name='timeslot_estab_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.date} ({self.start_time}-{self.end_time})"
     
     def available_capacity(self):
-        """Calcule le nombre de places disponibles."""
-        confirmed_bookings = self.bookings.filter(status='CONFIRMED')
-        reserved_places = sum(booking.number_of_places for booking in confirmed_bookings)
-        return self.total_capacity - reserved_places
+        """Calcule le nombre de places disponibles (sans requête SQL)."""
+        return self.total_capacity - self.reserved_places
     
     def is_available(self, number_of_places=1):
         """Vérifie si le nombre de places demandées est disponible."""
         return self.available_capacity() >= number_of_places
     
+    def save(self, *args, **kwargs):
+        """
+        Une mise à jour n'écrit jamais reserved_places : la valeur en mémoire
+        peut être périmée (instance chargée avant une réservation), et seul
+        Booking.save la modifie, par UPDATE relatif. Le compteur en mémoire
+        est relu après l'écriture.
+        """
+        if self._state.adding or self.pk is None:
+            return super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            update_fields = [field.name for field in self._meta.concrete_fields if not field.primary_key]
+        kwargs['update_fields'] = [name for name in update_fields if name != 'reserved_places']
+        super().save(*args, **kwargs)
+        self.refresh_from_db(fields=['reserved_places'])
+    
     def clean(self):
         """Validation personnalisée."""
         if self.start_time and self.end_time:
             if self.start_time >= self.end_time:
                 raise ValidationError('L\'heure de fin doit être après l\'heure de début.')
+        
+        # La capacité ne peut pas descendre sous les places déjà réservées (lues en base)
+        if self.pk and self.total_capacity:
+            reserved = TimeSlot.objects.filter(pk=self.pk).values_list('reserved_places', flat=True).first() or 0
+            if self.total_capacity < reserved:
+                raise ValidationError(
+                    f'{reserved} place(s) déjà réservée(s) : la capacité ne peut pas être inférieure.'
+                )
+        
+        # Les créneaux qui se chevauchent ne doivent pas dépasser les places assises
+        if self.establishment_id and self.date and self.start_time and self.end_time and self.total_capacity:
+            from .capacity import check_time_slot
+            check_time_slot(self)
 
 
 class Booking(models.Model):
@@ -151,7 +231,14 @@ class Booking(models.Model):
         ('CONFIRMED', 'Confirmé'),
         ('CANCELLED', 'Annulé'),
         ('COMPLETED', 'Terminé'),
+        ('NO_SHOW', 'Absent'),
     ]
+    # Statuts dont les places restent comptées dans TimeSlot.reserved_places :
+    # pointer la présence (CONFIRMED vers COMPLETED ou NO_SHOW) ne change pas
+    # le compteur, les places d'un absent ont été tenues.
+    OCCUPYING_STATUSES = ('CONFIRMED', 'COMPLETED', 'NO_SHOW')
+    # Statuts fixés par le pointage des présences (voir services.record_attendance)
+    ATTENDANCE_STATUSES = ('COMPLETED', 'NO_SHOW')
     
     user = models.ForeignKey(
         CustomUser,
@@ -185,6 +272,18 @@ class Booking(models.Model):
         verbose_name = 'Réservation'
         verbose_name_plural = 'Réservations'
         ordering = ['-created_at']
+        indexes = [
+            # Réservations d'un créneau par statut (compteur, dashboard, rollups) ;
+            # sans condition : les requêtes filtrent sur OCCUPYING_STATUSES
+            models.Index(fields=['time_slot', 'status'], name='booking_slot_status_idx'),
+            # Mes réservations, les plus récentes d'abord
+            models.Index(fields=['user', '-created_at'], name='booking_user_created_idx'),
+        ]
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Places déjà comptées dans TimeSlot.reserved_places pour cette réservation
+        self._counted = self._counted_places() if self.pk else (None, 0)
     
     def __str__(self):
         if self.time_slot:
@@ -206,3 +305,336 @@ class Booking(models.Model):
             except Booking.time_slot.RelatedObjectDoesNotExist:
                 # time_slot n'est pas encore assigné, passer la validation
                 pass
+    
+    COUNTED_FIELDS = ('time_slot_id', 'status', 'number_of_places')
+    
+    @staticmethod
+    def _count(values):
+        """(créneau, places) comptés dans le compteur pour un état donné."""
+        places = values['number_of_places'] if values['status'] in Booking.OCCUPYING_STATUSES else 0
+        return values['time_slot_id'], places or 0
+    
+    def _counted_places(self, stored=None):
+        """
+        Retourne (créneau, places) comptés pour l'état en mémoire.
+        
+        `stored` (état en base) complète les champs différés ; sans lui,
+        retourne None si un champ nécessaire n'est pas chargé.
+        """
+        values = dict(stored or {})
+        values.update({name: self.__dict__[name] for name in self.COUNTED_FIELDS if name in self.__dict__})
+        if any(name not in values for name in self.COUNTED_FIELDS):
+            return None
+        return self._count(values)
+    
+    def _stored_values(self):
+        """Lit (et verrouille) l'état en base d'une réservation chargée partiellement."""
+        return Booking.objects.select_for_update().filter(pk=self.pk).values(*self.COUNTED_FIELDS).first()
+    
+    def _sync_reserved_places(self, old, new):
+        """
+        Reporte l'écart entre deux états comptés sur les créneaux concernés.
+        
+        Lève SlotCapacityExceeded si une hausse dépasse la capacité du créneau.
+        """
+        deltas = {}
+        for time_slot_id, places in ((old[0], -old[1]), (new[0], new[1])):
+            if time_slot_id is not None and places:
+                deltas[time_slot_id] = deltas.get(time_slot_id, 0) + places
+        deltas = {pk: delta for pk, delta in deltas.items() if delta}
+        # Libérer avant de réserver (changement de créneau)
+        for time_slot_id, delta in sorted(deltas.items(), key=lambda item: item[1]):
+            slots = TimeSlot.objects.filter(pk=time_slot_id)
+            if delta > 0:
+                # UPDATE conditionnel : la vérification et l'incrément sont
+                # atomiques, deux réservations concurrentes ne peuvent pas survendre.
+                slots = slots.filter(reserved_places__lte=F('total_capacity') - delta)
+            updated = slots.update(reserved_places=F('reserved_places') + delta)
+            if delta > 0 and not updated:
+                raise SlotCapacityExceeded('Plus assez de places disponibles sur ce créneau.')
+        # Écarts appliqués, lus par les signaux (facettes de places libres)
+        self._reserved_deltas = deltas
+        # Garder l'instance en mémoire cohérente pour l'affichage qui suit
+        cached_slot = self._state.fields_cache.get('time_slot')
+        if cached_slot is not None and cached_slot.pk in deltas:
+            cached_slot.reserved_places += deltas[cached_slot.pk]
+    
+    def save(self, *args, **kwargs):
+        """
+        Sauvegarde la réservation et met à jour le compteur du créneau.
+        
+        Le compteur est mis à jour avant l'écriture de la réservation, dans la
+        même transaction : une réservation qui dépasserait la capacité n'est
+        jamais insérée, et les signaux post_save voient les écarts appliqués.
+        """
+        self._reserved_deltas = {}
+        with db.write_transaction():
+            stored = None
+            if self._counted is None or self._counted_places() is None:
+                stored = self._stored_values() or {}
+                if self._counted is None:
+                    self._counted = self._count(stored) if stored else (None, 0)
+            new = self._counted_places(stored)
+            self._sync_reserved_places(self._counted, new)
+            super().save(*args, **kwargs)
+        self._counted = new
+    
+    def release_reserved_places(self):
+        """Libère les places comptées (appelé lors de la suppression)."""
+        self._sync_reserved_places(self._counted or (None, 0), (None, 0))
+        self._counted = (None, 0)
+
+
+class SlotFacet(models.Model):
+    """
+    Table de facettes matérialisée pour les filtres de la page d'accueil.
+    
+    Une ligne par (date, ville normalisée, type, équipements) : nombre de
+    créneaux et de places libres. Tenue à jour incrémentalement par les
+    signaux (voir core/facets.py), reconstruite par `rebuild_facets`.
+    """
+    date = models.DateField(verbose_name='Date')
+    city_key = models.CharField(max_length=100, verbose_name='Ville normalisée')
+    city = models.CharField(max_length=100, verbose_name='Ville')
+    establishment_type = models.CharField(
+        max_length=20,
+        choices=Establishment.ESTABLISHMENT_TYPE_CHOICES,
+        verbose_name='Type d\'établissement'
+    )
+    wifi_available = models.BooleanField(default=False, verbose_name='WiFi disponible')
+    power_outlets = models.BooleanField(default=False, verbose_name='Prises électriques')
+    quiet_zone = models.BooleanField(default=False, verbose_name='Zone silencieuse')
+    free_coffee = models.BooleanField(default=False, verbose_name='Café offert')
+    
+    slot_count = models.IntegerField(default=0, verbose_name='Créneaux')
+    free_places = models.IntegerField(default=0, verbose_name='Places libres')
+    
+    class Meta:
+        verbose_name = 'Facette'
+        verbose_name_plural = 'Facettes'
+        constraints = [
+            # Index unique commençant par la date : la lecture « date >= aujourd'hui » est un parcours d'index
+            models.UniqueConstraint(
+                fields=['date', 'city_key', 'establishment_type', 'wifi_available',
+                        'power_outlets', 'quiet_zone', 'free_coffee'],
+                name='slotfacet_unique_key',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.city} / {self.get_establishment_type_display()} - {self.date} ({self.slot_count})"
+
+
+
+class DailyOccupancy(models.Model):
+    """
+    Rollup d'occupation par établissement, jour et heure.
+    
+    Un créneau de 9h à 12h compte dans les heures 9, 10 et 11. Les colonnes
+    sont des places : offertes (capacity), confirmées (reserved), annulées
+    (cancelled), terminées (completed) et absentes (no_show). Recalculé par jour à chaque
+    changement de réservation ou de créneau (voir core/occupancy.py) et par
+    `python manage.py rebuild_occupancy`.
+    """
+    establishment = models.ForeignKey(
+        Establishment,
+        on_delete=models.CASCADE,
+        related_name='daily_occupancy',
+        verbose_name='Établissement'
+    )
+    date = models.DateField(verbose_name='Date')
+    hour = models.PositiveSmallIntegerField(verbose_name='Heure')
+    capacity = models.PositiveIntegerField(default=0, verbose_name='Places offertes')
+    reserved = models.PositiveIntegerField(default=0, verbose_name='Places confirmées')
+    cancelled = models.PositiveIntegerField(default=0, verbose_name='Places annulées')
+    completed = models.PositiveIntegerField(default=0, verbose_name='Places terminées')
+    no_show = models.PositiveIntegerField(default=0, verbose_name='Places absentes')
+    
+    class Meta:
+        verbose_name = 'Occupation horaire'
+        verbose_name_plural = 'Occupations horaires'
+        constraints = [
+            models.UniqueConstraint(fields=['establishment', 'date', 'hour'], name='dailyoccupancy_unique_key'),
+        ]
+    
+    def __str__(self):
+        return f"{self.establishment_id} - {self.date} {self.hour}h ({self.reserved}/{self.capacity})"
+
+
+class CustomerOccupancy(models.Model):
+    """
+    Rollup des réservations d'un client dans un établissement, par mois
+    (premier jour du mois). Alimente le classement des meilleurs clients.
+    """
+    establishment = models.ForeignKey(
+        Establishment,
+        on_delete=models.CASCADE,
+        related_name='customer_occupancy',
+        verbose_name='Établissement'
+    )
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='occupancy',
+        verbose_name='Client'
+    )
+    month = models.DateField(verbose_name='Mois')
+    bookings = models.PositiveIntegerField(default=0, verbose_name='Réservations')
+    places = models.PositiveIntegerField(default=0, verbose_name='Places (hors annulations)')
+    cancelled = models.PositiveIntegerField(default=0, verbose_name='Réservations annulées')
+    
+    class Meta:
+        verbose_name = 'Occupation client'
+        verbose_name_plural = 'Occupations clients'
+        constraints = [
+            models.UniqueConstraint(fields=['establishment', 'month', 'user'], name='customeroccupancy_unique_key'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} @ {self.establishment_id} - {self.month:%Y-%m} ({self.bookings})"
+
+
+class ArchivedTimeSlot(models.Model):
+    """
+    Table froide des créneaux passés au-delà de la durée de rétention.
+    
+    Déplacés depuis TimeSlot par `python manage.py complete_past_bookings`
+    (voir core/archive.py), en conservant leur id. Les statistiques restent
+    lisibles dans les rollups d'occupation, qui ne sont pas recalculés pour
+    les mois archivés.
+    """
+    establishment = models.ForeignKey(
+        Establishment,
+        on_delete=models.CASCADE,
+        related_name='archived_time_slots',
+        verbose_name='Établissement'
+    )
+    title = models.CharField(max_length=200, verbose_name='Titre')
+    description = models.TextField(blank=True, null=True, verbose_name='Description')
+    date = models.DateField(verbose_name='Date')
+    start_time = models.TimeField(verbose_name='Heure de début')
+    end_time = models.TimeField(verbose_name='Heure de fin')
+    total_capacity = models.IntegerField(verbose_name='Capacité totale')
+    price_info = models.CharField(max_length=100, verbose_name='Information tarifaire')
+    is_group_only = models.BooleanField(default=False, verbose_name='Réservation de groupe uniquement')
+    reserved_places = models.PositiveIntegerField(default=0, verbose_name='Places réservées')
+    created_at = models.DateTimeField(verbose_name='Date de création')
+    updated_at = models.DateTimeField(verbose_name='Dernière modification')
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name='Date d\'archivage')
+    
+    class Meta:
+        verbose_name = 'Créneau archivé'
+        verbose_name_plural = 'Créneaux archivés'
+        ordering = ['date', 'start_time', 'id']
+        indexes = [
+            models.Index(fields=['establishment', 'date'], name='archivedslot_estab_date_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.title} - {self.date} ({self.start_time}-{self.end_time})"
+
+
+class ArchivedBooking(models.Model):
+    """
+    Table froide des réservations des créneaux archivés (id conservé).
+    """
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='archived_bookings',
+        verbose_name='Utilisateur'
+    )
+    time_slot = models.ForeignKey(
+        ArchivedTimeSlot,
+        on_delete=models.CASCADE,
+        related_name='bookings',
+        verbose_name='Créneau'
+    )
+    number_of_places = models.IntegerField(verbose_name='Nombre de places')
+    status = models.CharField(max_length=20, choices=Booking.STATUS_CHOICES, verbose_name='Statut')
+    notes = models.TextField(blank=True, null=True, verbose_name='Notes')
+    created_at = models.DateTimeField(verbose_name='Date de réservation')
+    updated_at = models.DateTimeField(verbose_name='Dernière modification')
+    
+    class Meta:
+        verbose_name = 'Réservation archivée'
+        verbose_name_plural = 'Réservations archivées'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='archivedbooking_user_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.time_slot_id} ({self.number_of_places} place(s))"
+
+
+class Waitlist(models.Model):
+    """
+    Inscription d'un utilisateur sur la liste d'attente d'un créneau complet.
+    
+    File FIFO par créneau (ordre d'inscription) : quand une annulation libère
+    des places, les premiers inscrits sont promus automatiquement en
+    réservations confirmées (voir services.promote_waitlist).
+    """
+    time_slot = models.ForeignKey(
+        TimeSlot,
+        on_delete=models.CASCADE,
+        related_name='waitlist',
+        verbose_name='Créneau'
+    )
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='waitlist',
+        verbose_name='Utilisateur'
+    )
+    number_of_places = models.IntegerField(
+        validators=[MinValueValidator(1)],
+        verbose_name='Nombre de places'
+    )
+    notes = models.TextField(blank=True, null=True, verbose_name='Notes')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Date d\'inscription')
+    
+    class Meta:
+        verbose_name = 'Liste d\'attente'
+        verbose_name_plural = 'Listes d\'attente'
+        ordering = ['time_slot', 'created_at', 'id']
+        constraints = [
+            # Une inscription par utilisateur et par créneau ; l'index sert aussi la file FIFO
+            models.UniqueConstraint(fields=['time_slot', 'user'], name='waitlist_unique_user'),
+        ]
+        indexes = [
+            models.Index(fields=['time_slot', 'created_at', 'id'], name='waitlist_fifo_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} en attente sur {self.time_slot_id} ({self.number_of_places} place(s))"
+
+
+class Notification(models.Model):
+    """
+    Notification in-app d'un utilisateur (file lue depuis la page
+    Notifications ; non lue tant que `read_at` est vide).
+    """
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='notifications',
+        verbose_name='Utilisateur'
+    )
+    message = models.CharField(max_length=255, verbose_name='Message')
+    url = models.CharField(max_length=200, blank=True, verbose_name='Lien')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Date')
+    read_at = models.DateTimeField(null=True, blank=True, verbose_name='Lue le')
+    
+    class Meta:
+        verbose_name = 'Notification'
+        verbose_name_plural = 'Notifications'
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # Notifications non lues d'un utilisateur (badge du menu)
+            models.Index(fields=['user', 'read_at'], name='notification_user_read_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.message}"
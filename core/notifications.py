@@ -0,0 +1,22 @@
+"""
+File de notifications in-app.
+
+`notify` écrit la notification dans la transaction en cours : si la
+transaction est annulée, la notification l'est aussi (pas de « vous avez
+une place » pour une promotion qui n'a pas eu lieu).
+"""
+from django.utils import timezone
+
+from .models import Notification
+
+
+def notify(user, message, url=''):
+    return Notification.objects.create(user=user, message=message[:255], url=url)
+
+
+def unread_count(user):
+    return Notification.objects.filter(user=user, read_at__isnull=True).count()
+
+
+def mark_all_read(user):
+    return Notification.objects.filter(user=user, read_at__isnull=True).update(read_at=timezone.now())
@@ -0,0 +1,312 @@
+"""
+Rollups d'occupation pour les statistiques des établissements.
+
+- DailyOccupancy : places offertes / confirmées / annulées / terminées /
+  absentes par établissement, jour et heure ;
+- CustomerOccupancy : réservations par client, établissement et mois.
+
+Tenue à jour : chaque changement de réservation ou de créneau planifie,
+après le commit, le recalcul des seuls jours (et mois client) touchés, à
+partir des données sources d'un établissement pour ces jours. Recalculer
+un jour entier plutôt qu'appliquer des écarts rend la table auto-correctrice.
+Lecture des sources et écriture se font sous le verrou de l'établissement :
+deux recalculs concurrents des mêmes jours se suivent, et le second relit
+les données du premier.
+`python manage.py rebuild_occupancy` recalcule une période en masse et
+compacte la table (lignes vides).
+
+Les lectures (`summary`, `weekday_hour_grid`, `daily_series`,
+`top_customers`) ne touchent que les rollups, jamais Booking.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Sum
+from django.db.models.functions import Coalesce, ExtractIsoWeekDay, TruncMonth
+
+from . import db
+from .models import ArchivedTimeSlot, Booking, CustomerOccupancy, DailyOccupancy, Establishment, TimeSlot
+
+STATUS_COLUMNS = {'CONFIRMED': 'reserved', 'CANCELLED': 'cancelled', 'COMPLETED': 'completed', 'NO_SHOW': 'no_show'}
+# Places occupées : réservées, qu'elles soient pointées ou non
+USED = F('reserved') + F('completed') + F('no_show')
+BACKFILL_CHUNK_DAYS = 31
+
+
+def month_of(day):
+    return day.replace(day=1)
+
+
+def _next_month(month):
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def hours_covered(start, end):
+    """Heures (0-23) touchées par [start, end)."""
+    last = end.hour if (end.minute or end.second) else end.hour - 1
+    return range(start.hour, max(last, start.hour) + 1)
+
+
+# Calcul depuis les données sources
+
+def _rollup_rows(time_slots):
+    """Lignes DailyOccupancy (non sauvegardées) pour un queryset de créneaux."""
+    slots = list(time_slots.order_by().values_list(
+        'pk', 'establishment_id', 'date', 'start_time', 'end_time', 'total_capacity'
+    ))
+    if not slots:
+        return []
+    places = {
+        (row['time_slot_id'], row['status']): row['places']
+        for row in Booking.objects.filter(time_slot__in=time_slots).order_by().values(
+            'time_slot_id', 'status'
+        ).annotate(places=Sum('number_of_places'))
+    }
+    totals = defaultdict(lambda: defaultdict(int))
+    for pk, establishment_id, day, start, end, capacity in slots:
+        for hour in hours_covered(start, end):
+            row = totals[(establishment_id, day, hour)]
+            row['capacity'] += capacity
+            for status, column in STATUS_COLUMNS.items():
+                row[column] += places.get((pk, status), 0)
+    return [
+        DailyOccupancy(establishment_id=establishment_id, date=day, hour=hour, **values)
+        for (establishment_id, day, hour), values in totals.items()
+    ]
+
+
+def _lock_establishment(establishment_id):
+    """Verrouille l'établissement jusqu'à la fin de la transaction (SQLite : BEGIN IMMEDIATE suffit)."""
+    list(Establishment.objects.select_for_update().filter(pk=establishment_id).values_list('pk', flat=True))
+
+
+@db.write_transaction()
+def refresh_days(establishment_id, days):
+    """Recalcule les rollups horaires d'un établissement pour ces jours."""
+    days = sorted(set(days))
+    if not days:
+        return
+    _lock_establishment(establishment_id)
+    rows = _rollup_rows(TimeSlot.objects.filter(establishment_id=establishment_id, date__in=days))
+    DailyOccupancy.objects.filter(establishment_id=establishment_id, date__in=days).delete()
+    DailyOccupancy.objects.bulk_create(rows)
+
+
+@db.write_transaction()
+def refresh_customers(establishment_id, customers):
+    """Recalcule les rollups client pour des couples (user_id, mois)."""
+    customers = set(customers)
+    if customers:
+        _lock_establishment(establishment_id)
+    for user_id, month in customers:
+        totals = Booking.objects.filter(
+            user_id=user_id,
+            time_slot__establishment_id=establishment_id,
+            time_slot__date__gte=month,
+            time_slot__date__lt=_next_month(month),
+        ).aggregate(
+            bookings=Count('pk', filter=~Q(status='CANCELLED')),
+            places=Coalesce(Sum('number_of_places', filter=~Q(status='CANCELLED')), 0),
+            cancelled=Count('pk', filter=Q(status='CANCELLED')),
+        )
+        rollups = CustomerOccupancy.objects.filter(establishment_id=establishment_id, user_id=user_id, month=month)
+        if not any(totals.values()):
+            rollups.delete()
+        elif not rollups.update(**totals):
+            CustomerOccupancy.objects.create(
+                establishment_id=establishment_id, user_id=user_id, month=month, **totals
+            )
+
+
+# Planification depuis les signaux
+
+def booking_scope(booking_id):
+    """(établissement, jour, client) d'une réservation en base, ou None."""
+    return Booking.objects.filter(pk=booking_id).values_list(
+        'time_slot__establishment_id', 'time_slot__date', 'user_id'
+    ).first()
+
+
+def time_slot_scope(time_slot_id):
+    """(établissement, jour) d'un créneau en base, ou None."""
+    return TimeSlot.objects.filter(pk=time_slot_id).values_list('establishment_id', 'date').first()
+
+
+def time_slot_customers(time_slot_id):
+    """Clients ayant réservé un créneau."""
+    return set(Booking.objects.filter(time_slot_id=time_slot_id).values_list('user_id', flat=True))
+
+
+def schedule(scopes):
+    """
+    Planifie après le commit le recalcul des rollups pour des portées
+    (établissement, jour, client ou None). Les doublons sont regroupés.
+    """
+    days = defaultdict(set)
+    customers = defaultdict(set)
+    for scope in scopes:
+        if scope is None:
+            continue
+        establishment_id, day, user_id = scope
+        days[establishment_id].add(day)
+        if user_id is not None:
+            customers[establishment_id].add((user_id, month_of(day)))
+    if not days:
+        return
+
+    def refresh():
+        for establishment_id, establishment_days in days.items():
+            refresh_days(establishment_id, establishment_days)
+            refresh_customers(establishment_id, customers.get(establishment_id, ()))
+
+    transaction.on_commit(refresh)
+
+
+# Reconstruction
+
+def rebuild(since=None, until=None, establishment_id=None):
+    """
+    Recalcule les rollups sur une période (tout l'historique par défaut),
+    par tranches de BACKFILL_CHUNK_DAYS jours. Retourne le nombre de lignes
+    horaires écrites.
+
+    Les jours archivés (voir core/archive.py) ne sont jamais recalculés :
+    leurs données sources ont quitté les tables chaudes.
+    """
+    time_slots = TimeSlot.objects.all()
+    archived = ArchivedTimeSlot.objects.all()
+    if establishment_id is not None:
+        time_slots = time_slots.filter(establishment_id=establishment_id)
+        archived = archived.filter(establishment_id=establishment_id)
+    first_day = since or time_slots.order_by('date').values_list('date', flat=True).first()
+    last_day = until or time_slots.order_by('-date').values_list('date', flat=True).first()
+    last_archived = archived.aggregate(last=Max('date'))['last']
+    if first_day is not None and last_archived is not None:
+        first_day = max(first_day, _next_month(last_archived))
+    if first_day is None or last_day is None or first_day > last_day:
+        return 0
+
+    written = 0
+    chunk_start = first_day
+    while chunk_start <= last_day:
+        chunk_end = min(chunk_start + timedelta(days=BACKFILL_CHUNK_DAYS - 1), last_day)
+        chunk = time_slots.filter(date__gte=chunk_start, date__lte=chunk_end)
+        rows = _rollup_rows(chunk)
+        with transaction.atomic():
+            stale = DailyOccupancy.objects.filter(date__gte=chunk_start, date__lte=chunk_end)
+            if establishment_id is not None:
+                stale = stale.filter(establishment_id=establishment_id)
+            stale.delete()
+            DailyOccupancy.objects.bulk_create(rows, batch_size=1000)
+        written += len(rows)
+        chunk_start = chunk_end + timedelta(days=1)
+
+    _rebuild_customers(month_of(first_day), _next_month(last_day), establishment_id)
+    return written
+
+
+def _rebuild_customers(since, before, establishment_id=None):
+    """Recalcule les rollups client des mois [since, before) en une agrégation."""
+    bookings = Booking.objects.filter(time_slot__date__gte=since, time_slot__date__lt=before)
+    stale = CustomerOccupancy.objects.filter(month__gte=since, month__lt=before)
+    if establishment_id is not None:
+        bookings = bookings.filter(time_slot__establishment_id=establishment_id)
+        stale = stale.filter(establishment_id=establishment_id)
+    totals = defaultdict(lambda: {'bookings': 0, 'places': 0, 'cancelled': 0})
+    for row in bookings.order_by().annotate(month=TruncMonth('time_slot__date')).values(
+        'time_slot__establishment_id', 'user_id', 'month', 'status',
+    ).annotate(count=Count('pk'), places=Sum('number_of_places')):
+        key = (row['time_slot__establishment_id'], row['user_id'], row['month'])
+        if row['status'] == 'CANCELLED':
+            totals[key]['cancelled'] += row['count']
+        else:
+            totals[key]['bookings'] += row['count']
+            totals[key]['places'] += row['places']
+    with transaction.atomic():
+        stale.delete()
+        CustomerOccupancy.objects.bulk_create([
+            CustomerOccupancy(establishment_id=establishment_id_, user_id=user_id, month=month, **values)
+            for (establishment_id_, user_id, month), values in totals.items()
+        ], batch_size=1000)
+
+
+def compact():
+    """Supprime les lignes horaires vides (créneaux supprimés entre-temps)."""
+    deleted, _ = DailyOccupancy.objects.filter(capacity=0, reserved=0, cancelled=0, completed=0, no_show=0).delete()
+    return deleted
+
+
+# Lectures (rollups uniquement)
+
+def _rollups(establishment_ids, since, until):
+    return DailyOccupancy.objects.filter(
+        establishment_id__in=establishment_ids, date__gte=since, date__lte=until,
+    ).order_by()
+
+
+def _rate(part, whole):
+    return round(100 * part / whole) if whole else 0
+
+
+def summary(establishment_ids, since, until):
+    """
+    Totaux de la période, en places-heures : remplissage, annulations et
+    absences. Le taux d'absence ne porte que sur les places pointées
+    (terminées ou absentes) : une réservation passée encore confirmée n'a
+    pas de présence connue et n'y compte pas.
+    """
+    columns = ('capacity', 'reserved', 'cancelled', 'completed', 'no_show')
+    sums = _rollups(establishment_ids, since, until).aggregate(
+        **{name: Coalesce(Sum(name), 0) for name in columns}
+    )
+    used = sums['reserved'] + sums['completed'] + sums['no_show']
+    return {
+        **sums,
+        'used': used,
+        'fill_rate': _rate(used, sums['capacity']),
+        'cancellation_rate': _rate(sums['cancelled'], used + sums['cancelled']),
+        'no_show_rate': _rate(sums['no_show'], sums['completed'] + sums['no_show']),
+    }
+
+
+def weekday_hour_grid(establishment_ids, since, until):
+    """
+    Taux de remplissage par jour de semaine (1 = lundi) et heure :
+    {'hours': [...], 'rows': [(jour, [(heure, taux, places offertes)...])]}.
+    """
+    cells = {}
+    for row in _rollups(establishment_ids, since, until).annotate(
+        weekday=ExtractIsoWeekDay('date'),
+    ).values('weekday', 'hour').annotate(
+        capacity=Sum('capacity'), used=Sum(USED),
+    ):
+        cells[(row['weekday'], row['hour'])] = (row['capacity'], row['used'])
+    hours = sorted({hour for _, hour in cells})
+    rows = []
+    for weekday in range(1, 8):
+        row = []
+        for hour in hours:
+            capacity, used = cells.get((weekday, hour), (0, 0))
+            row.append((hour, _rate(used, capacity), capacity))
+        rows.append((weekday, row))
+    return {'hours': hours, 'rows': rows}
+
+
+def daily_series(establishment_ids, since, until):
+    """Places-heures offertes et occupées par jour : [(jour, offertes, occupées, taux)]."""
+    return [
+        (row['date'], row['capacity'], row['used'], _rate(row['used'], row['capacity']))
+        for row in _rollups(establishment_ids, since, until).values('date').annotate(
+            capacity=Sum('capacity'), used=Sum(USED),
+        ).order_by('date')
+    ]
+
+
+def top_customers(establishment_ids, since, until, limit=10):
+    """Meilleurs clients de la période (mois entamés compris), par places réservées."""
+    return list(CustomerOccupancy.objects.filter(
+        establishment_id__in=establishment_ids, month__gte=month_of(since), month__lte=until,
+    ).values('user_id', 'user__username').annotate(
+        total_bookings=Sum('bookings'), total_places=Sum('places'), total_cancelled=Sum('cancelled'),
+    ).order_by('-total_places', '-total_bookings', 'user_id')[:limit])
@@ -0,0 +1,104 @@
+"""
+Pagination par curseur (keyset) pour les listes de créneaux.
+
+Plutôt qu'un OFFSET dont le coût croît avec le numéro de page, on repart de
+la dernière ligne affichée : WHERE (date, start_time, id) > (d, t, i). Le
+curseur suit exactement l'ordre de TimeSlot.Meta.ordering, ce qui permet à la
+base d'utiliser un index sur ces colonnes.
+"""
+import base64
+from datetime import date, time
+
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 24
+
+
+def encode_position(slot_date, start_time, pk):
+    """Curseur opaque pour une position (date, heure de début, id)."""
+    raw = f'{slot_date.isoformat()}|{start_time.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def encode_cursor(time_slot):
+    """Encode la position d'un créneau en un curseur opaque pour l'URL."""
+    return encode_position(time_slot.date, time_slot.start_time, time_slot.pk)
+
+
+def decode_cursor(cursor):
+    """Décode un curseur ; retourne None s'il est absent ou invalide."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        slot_date, start_time, pk = base64.urlsafe_b64decode(padded).decode().split('|')
+        return date.fromisoformat(slot_date), time.fromisoformat(start_time), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def after_cursor(queryset, cursor):
+    """Créneaux situés après la position du curseur (tous si le curseur est absent ou invalide)."""
+    position = decode_cursor(cursor)
+    if position is None:
+        return queryset
+    slot_date, start_time, pk = position
+    return queryset.filter(
+        Q(date__gt=slot_date)
+        | Q(date=slot_date, start_time__gt=start_time)
+        | Q(date=slot_date, start_time=start_time, pk__gt=pk)
+    )
+
+
+def paginate_time_slots(queryset, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Retourne (créneaux de la page, curseur suivant ou None).
+
+    Une seule requête : on lit page_size + 1 lignes pour savoir s'il reste
+    une page, sans COUNT.
+    """
+    rows = list(after_cursor(queryset, cursor).order_by('date', 'start_time', 'pk')[:page_size + 1])
+    if len(rows) > page_size:
+        return rows[:page_size], encode_cursor(rows[page_size - 1])
+    return rows, None
+
+
+def paginate_booking_history(queryset, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Historique des réservations, du créneau le plus récent au plus ancien.
+
+    Même curseur (date, heure de début, id) que pour les créneaux, mais en
+    ordre décroissant et sur le créneau de la réservation : la page suivante
+    repart de la dernière réservation affichée.
+    """
+    position = decode_cursor(cursor)
+    if position is not None:
+        slot_date, start_time, pk = position
+        queryset = queryset.filter(
+            Q(time_slot__date__lt=slot_date)
+            | Q(time_slot__date=slot_date, time_slot__start_time__lt=start_time)
+            | Q(time_slot__date=slot_date, time_slot__start_time=start_time, pk__lt=pk)
+        )
+    rows = list(queryset.order_by('-time_slot__date', '-time_slot__start_time', '-pk')[:page_size + 1])
+    if len(rows) > page_size:
+        last = rows[page_size - 1]
+        return rows[:page_size], encode_position(last.time_slot.date, last.time_slot.start_time, last.pk)
+    return rows, None
+
+
+def paginate_ranked(queryset, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Pagination des résultats de recherche, triés par pertinence (`search_rank`).
+
+    Le rang n'est pas une clé stable : le curseur est ici un simple décalage,
+    acceptable car l'ensemble des résultats est déjà restreint par l'index
+    plein texte.
+    """
+    try:
+        offset = max(int(cursor or 0), 0)
+    except ValueError:
+        offset = 0
+    rows = list(queryset.order_by('search_rank', 'date', 'start_time', 'pk')[offset:offset + page_size + 1])
+    if len(rows) > page_size:
+        return rows[:page_size], str(offset + page_size)
+    return rows, None
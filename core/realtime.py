@@ -0,0 +1,179 @@
+"""
+Diffusion en temps réel des places disponibles (Server-Sent Events).
+
+Les réservations, annulations et promotions de liste d'attente publient,
+après le commit, la disponibilité des créneaux touchés sur le canal
+`slot:<id>`. La vue `availability_stream` s'abonne aux canaux des créneaux
+affichés par l'onglet et relaie les messages en SSE : une connexion par
+onglet remplace les rechargements de page.
+
+Le broker est interchangeable (`settings.REALTIME_BROKER`) : il suffit
+d'implémenter `publish` et `subscribe` de `Broker`. `InMemoryBroker`, le
+défaut, relie les abonnés d'un même processus ; en production avec
+plusieurs processus, un broker partagé (Redis pub/sub, PostgreSQL
+LISTEN/NOTIFY...) prend le relais avec la même interface.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .models import TimeSlot
+
+DEFAULT_BROKER = 'core.realtime.InMemoryBroker'
+SUBSCRIPTION_BUFFER = 100
+
+
+def channel_for(time_slot_id):
+    return f'slot:{time_slot_id}'
+
+
+class Subscription:
+    """
+    Abonnement d'un client : file asyncio alimentée par le broker, à lire
+    depuis la boucle qui l'a créée.
+    """
+
+    def __init__(self, broker, channels):
+        self.broker = broker
+        self.channels = tuple(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIPTION_BUFFER)
+
+    def deliver(self, message):
+        """Appelé dans la boucle de l'abonné ; un client trop lent perd les plus anciens messages."""
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout):
+        """Prochain message, ou None après `timeout` secondes sans message."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    """Interface d'un broker pub/sub."""
+
+    def publish(self, channel, message):
+        """Publie un message (chaîne) ; appelable depuis du code synchrone."""
+        raise NotImplementedError
+
+    def subscribe(self, channels):
+        """Retourne une Subscription ; à appeler depuis une coroutine."""
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+    def has_subscribers(self, channel):
+        """Faux seulement si personne n'écoute à coup sûr (évite de lire la base pour rien)."""
+        return True
+
+
+class InMemoryBroker(Broker):
+    """
+    Broker local au processus. `publish` peut venir d'un thread (vues
+    synchrones servies par ASGI) : la livraison est confiée à la boucle de
+    chaque abonné.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, message)
+            except RuntimeError:
+                # Boucle fermée : l'abonné a disparu sans se désabonner
+                self.unsubscribe(subscription)
+        return len(subscribers)
+
+    def subscribe(self, channels):
+        subscription = Subscription(self, channels)
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+    def has_subscribers(self, channel):
+        with self._lock:
+            return bool(self._subscribers.get(channel))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(getattr(settings, 'REALTIME_BROKER', DEFAULT_BROKER))()
+    return _broker
+
+
+def availability(time_slot_ids):
+    """Messages de disponibilité (dict) des créneaux, en une requête."""
+    return [
+        {'time_slot': pk, 'available': total - reserved, 'reserved': reserved, 'total': total}
+        for pk, total, reserved in TimeSlot.objects.filter(pk__in=time_slot_ids).order_by().values_list(
+            'pk', 'total_capacity', 'reserved_places'
+        )
+    ]
+
+
+async def aavailability(time_slot_ids):
+    """Variante async de `availability` (ORM async)."""
+    # `async for` sur le queryset, pas aiterator() : avec values_list, ce
+    # dernier exécute la requête dans la boucle d'événements (Django 5.2)
+    return [
+        {'time_slot': pk, 'available': total - reserved, 'reserved': reserved, 'total': total}
+        async for pk, total, reserved in TimeSlot.objects.filter(pk__in=time_slot_ids).order_by().values_list(
+            'pk', 'total_capacity', 'reserved_places'
+        )
+    ]
+
+
+def publish_availability(deltas):
+    """
+    Publie après le commit la disponibilité des créneaux dont le compteur a
+    changé ({id: écart de places réservées}). Chaque message porte l'écart et
+    les valeurs absolues, pour qu'un client qui a manqué un message se
+    recale au suivant.
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    def publish():
+        broker = get_broker()
+        watched = [pk for pk in deltas if broker.has_subscribers(channel_for(pk))]
+        for message in availability(watched) if watched else ():
+            message['delta'] = -deltas[message['time_slot']]
+            broker.publish(channel_for(message['time_slot']), json.dumps(message))
+
+    transaction.on_commit(publish)
@@ -0,0 +1,168 @@
+"""
+Génération de créneaux récurrents.
+
+Une règle (`RecurrenceRule`, inspirée de RRULE FREQ=WEEKLY;BYDAY=...) décrit
+des jours de la semaine, des plages horaires, une période et des dates
+exclues. `plan` la développe en créneaux non sauvegardés et écarte en mémoire
+ceux qui chevauchent un créneau existant (une seule requête sur la période) ;
+`create` insère le reste en un seul `bulk_create`, dans une transaction.
+
+bulk_create ne déclenche pas les signaux : `create` met à jour lui-même
+l'index de recherche, les facettes, le cache de listing et les rollups
+d'occupation.
+"""
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, time, timedelta
+
+
+from . import capacity, db, facets, listing_cache, occupancy, search
+from .models import Establishment, TimeSlot
+
+MAX_OCCURRENCES = 2000
+BATCH_SIZE = 500
+
+# Codes RRULE (BYDAY) et abréviations françaises
+WEEKDAY_CODES = {
+    'mo': 0, 'tu': 1, 'we': 2, 'th': 3, 'fr': 4, 'sa': 5, 'su': 6,
+    'lun': 0, 'mar': 1, 'mer': 2, 'jeu': 3, 'ven': 4, 'sam': 5, 'dim': 6,
+}
+WEEKDAY_LABELS = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
+TIME_RANGE_RE = re.compile(r'^(\d{1,2}:\d{2})\s*-\s*(\d{1,2}:\d{2})$')
+
+
+@dataclass(frozen=True)
+class RecurrenceRule:
+    """Jours (0 = lundi), plages (début, fin), période incluse et dates exclues."""
+    weekdays: frozenset
+    time_ranges: tuple
+    start_date: date
+    end_date: date
+    exceptions: frozenset = frozenset()
+
+    def occurrences(self):
+        """Liste des (date, début, fin), dans l'ordre chronologique."""
+        current = self.start_date
+        occurrences = []
+        while current <= self.end_date:
+            if current.weekday() in self.weekdays and current not in self.exceptions:
+                occurrences.extend((current, start, end) for start, end in self.time_ranges)
+            current += timedelta(days=1)
+        return occurrences
+
+
+@dataclass
+class RecurrencePlan:
+    """
+    Créneaux à créer, occurrences écartées car déjà occupées, et créneaux
+    écartés car ils dépasseraient les places assises de l'établissement.
+    """
+    establishment: Establishment
+    to_create: list = field(default_factory=list)
+    conflicts: list = field(default_factory=list)
+    over_capacity: list = field(default_factory=list)
+
+
+def parse_weekdays(text):
+    """« MO,TU,FR » ou « lun mar ven » -> {0, 1, 4}."""
+    weekdays = set()
+    for code in re.findall(r'\w+', text.lower()):
+        if code not in WEEKDAY_CODES:
+            raise ValueError(f'Jour inconnu : {code}')
+        weekdays.add(WEEKDAY_CODES[code])
+    return frozenset(weekdays)
+
+
+def parse_time_ranges(text):
+    """« 09:00-12:00, 14:00-18:00 » -> ((9:00, 12:00), (14:00, 18:00))."""
+    ranges = []
+    for chunk in re.split(r'[,;\n]+', text):
+        chunk = chunk.strip()
+        if not chunk:
+            continue
+        match = TIME_RANGE_RE.match(chunk)
+        if not match:
+            raise ValueError(f'Plage horaire invalide : {chunk} (format attendu 09:00-12:00)')
+        start, end = (time.fromisoformat(value.zfill(5)) for value in match.groups())
+        if start >= end:
+            raise ValueError(f'Plage horaire invalide : {chunk} (la fin doit suivre le début)')
+        ranges.append((start, end))
+    ranges.sort()
+    for (_, previous_end), (start, _) in zip(ranges, ranges[1:]):
+        if start < previous_end:
+            raise ValueError('Les plages horaires se chevauchent.')
+    return tuple(ranges)
+
+
+def parse_dates(text):
+    """Dates ISO séparées par des virgules, espaces ou retours à la ligne."""
+    return frozenset(date.fromisoformat(value) for value in re.split(r'[\s,;]+', text.strip()) if value)
+
+
+def _overlaps(start, end, other_start, other_end):
+    return start < other_end and other_start < end
+
+
+def plan(establishment, rule, **slot_fields):
+    """
+    Développe `rule` en créneaux de `establishment` (non sauvegardés).
+
+    `slot_fields` : title, description, total_capacity, price_info,
+    is_group_only. Les occurrences qui chevauchent un créneau existant sont
+    placées dans `conflicts` avec le créneau en cause, celles qui
+    dépasseraient les places assises dans `over_capacity`.
+    """
+    occurrences = rule.occurrences()
+    if len(occurrences) > MAX_OCCURRENCES:
+        raise ValueError(f'Trop de créneaux ({len(occurrences)}) : {MAX_OCCURRENCES} maximum par génération.')
+
+    existing = defaultdict(list)
+    if occurrences:
+        for time_slot in TimeSlot.objects.filter(
+            establishment=establishment, date__gte=rule.start_date, date__lte=rule.end_date,
+        ).only('pk', 'title', 'date', 'start_time', 'end_time'):
+            existing[time_slot.date].append(time_slot)
+
+    result = RecurrencePlan(establishment=establishment)
+    for slot_date, start, end in occurrences:
+        clash = next(
+            (slot for slot in existing[slot_date] if _overlaps(start, end, slot.start_time, slot.end_time)),
+            None,
+        )
+        if clash is not None:
+            result.conflicts.append(((slot_date, start, end), clash))
+            continue
+        result.to_create.append(TimeSlot(
+            establishment=establishment, date=slot_date, start_time=start, end_time=end, **slot_fields
+        ))
+
+    result.over_capacity = capacity.over_capacity(establishment, result.to_create)
+    if result.over_capacity:
+        rejected = {id(time_slot) for time_slot in result.over_capacity}
+        result.to_create = [time_slot for time_slot in result.to_create if id(time_slot) not in rejected]
+    return result
+
+
+def create(establishment, rule, **slot_fields):
+    """
+    Crée les créneaux de la règle en une transaction et retourne le plan
+    exécuté.
+
+    L'établissement est verrouillé pendant la génération, et le contrôle de
+    chevauchement est refait à l'intérieur de la transaction : un aperçu
+    périmé ne peut pas produire de doublon.
+    """
+    with db.write_transaction():
+        establishment = Establishment.objects.select_for_update().get(pk=establishment.pk)
+        result = plan(establishment, rule, **slot_fields)
+        created = TimeSlot.objects.bulk_create(result.to_create, batch_size=BATCH_SIZE)
+        result.to_create = created
+
+        if created:
+            search.get_backend().index_time_slots(slot.pk for slot in created)
+            facets.add_slots(created)
+            for slot_date in sorted({slot.date for slot in created}):
+                listing_cache.invalidate_slot(establishment.city, slot_date)
+            occupancy.schedule((establishment.pk, slot.date, None) for slot in created)
+    return result
@@ -0,0 +1,224 @@
+"""
+Recherche plein texte des créneaux et établissements.
+
+Un index de recherche par créneau couvre TimeSlot.title/description et
+Establishment.name/city/description. Deux implémentations partagent la même
+interface :
+
+- SQLite : table virtuelle FTS5 (tokenizer unicode61, accents ignorés),
+  classement bm25 ;
+- PostgreSQL : table de documents `tsvector` (configuration french +
+  unaccent) indexée en GIN, classement ts_rank.
+
+Pour les autres bases, on retombe sur des `icontains`. L'index est tenu à
+jour par les signaux (core/signals.py) ; `python manage.py
+rebuild_search_index` le reconstruit après des imports en masse.
+"""
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize(text):
+    """Minuscules sans accents : « Café » -> « cafe »."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+
+def tokenize(query):
+    """Découpe la saisie utilisateur en mots normalisés (sans opérateurs)."""
+    return WORD_RE.findall(normalize(query))
+
+
+class FallbackSearchBackend:
+    """
+    Recherche par `icontains`, sans index : utilisée si la base ne propose
+    pas de recherche plein texte.
+    """
+
+    def empty(self, queryset):
+        """Aucun résultat, mais avec la même annotation que `filter`."""
+        return queryset.none().annotate(search_rank=RawSQL('0', []))
+
+    def filter(self, queryset, query):
+        condition = Q()
+        for word in tokenize(query) or [query]:
+            condition &= (
+                Q(title__icontains=word) |
+                Q(establishment__name__icontains=word) |
+                Q(establishment__city__icontains=word)
+            )
+        return queryset.filter(condition).annotate(search_rank=RawSQL('0', []))
+
+    batch_size = 500
+
+    def _reindex(self, where, params):
+        pass
+
+    def index_time_slot(self, time_slot_id):
+        pass
+
+    def index_time_slots(self, time_slot_ids):
+        """Indexe un lot de créneaux (après un bulk_create), par paquets."""
+        time_slot_ids = list(time_slot_ids)
+        for start in range(0, len(time_slot_ids), self.batch_size):
+            batch = time_slot_ids[start:start + self.batch_size]
+            self._reindex(f"t.id IN ({', '.join(['%s'] * len(batch))})", batch)
+
+    def index_establishment(self, establishment_id):
+        pass
+
+    def remove_time_slot(self, time_slot_id):
+        pass
+
+    def remove_time_slots(self, time_slot_ids):
+        for time_slot_id in time_slot_ids:
+            self.remove_time_slot(time_slot_id)
+
+    def rebuild(self):
+        return 0
+
+
+class SQLiteSearchBackend(FallbackSearchBackend):
+    """
+    Index FTS5 `core_timeslot_fts` dont le rowid est l'id du créneau.
+    """
+    table = 'core_timeslot_fts'
+    # Poids bm25 par colonne : title, description, establishment_name, city, establishment_description
+    weights = '10.0, 1.0, 8.0, 5.0, 1.0'
+
+    def _match_expression(self, query):
+        # Chaque mot est cité (pas d'injection de syntaxe FTS5) et préfixé
+        return ' '.join(f'"{word}"*' for word in tokenize(query))
+
+    def filter(self, queryset, query):
+        match = self._match_expression(query)
+        if not match:
+            return self.empty(queryset)
+        return queryset.filter(
+            pk__in=RawSQL(f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', [match])
+        ).annotate(search_rank=RawSQL(
+            f'SELECT bm25({self.table}, {self.weights}) FROM {self.table} '
+            f'WHERE {self.table} MATCH %s AND rowid = core_timeslot.id',
+            [match],
+        ))
+
+    def _reindex(self, where, params):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.table} WHERE rowid IN (SELECT t.id FROM core_timeslot t WHERE {where})',
+                params,
+            )
+            cursor.execute(
+                f'INSERT INTO {self.table} '
+                '(rowid, title, description, establishment_name, city, establishment_description) '
+                "SELECT t.id, t.title, COALESCE(t.description, ''), e.name, e.city, COALESCE(e.description, '') "
+                'FROM core_timeslot t JOIN core_establishment e ON e.id = t.establishment_id '
+                f'WHERE {where}',
+                params,
+            )
+
+    def index_time_slot(self, time_slot_id):
+        self._reindex('t.id = %s', [time_slot_id])
+
+    def index_establishment(self, establishment_id):
+        self._reindex('t.establishment_id = %s', [establishment_id])
+
+    def remove_time_slot(self, time_slot_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [time_slot_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+        self._reindex('1 = 1', [])
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {self.table}')
+            return cursor.fetchone()[0]
+
+
+class PostgresSearchBackend(FallbackSearchBackend):
+    """
+    Documents `tsvector` pondérés dans `core_timeslot_search`, index GIN.
+    """
+    table = 'core_timeslot_search'
+    document_sql = (
+        "setweight(to_tsvector('french', unaccent(t.title)), 'A') || "
+        "setweight(to_tsvector('french', unaccent(e.name)), 'A') || "
+        "setweight(to_tsvector('french', unaccent(e.city)), 'B') || "
+        "setweight(to_tsvector('french', unaccent(COALESCE(t.description, '') || ' ' || "
+        "COALESCE(e.description, ''))), 'C')"
+    )
+
+    def _tsquery(self, query):
+        return ' & '.join(f'{word}:*' for word in tokenize(query))
+
+    def filter(self, queryset, query):
+        tsquery = self._tsquery(query)
+        if not tsquery:
+            return self.empty(queryset)
+        return queryset.filter(
+            pk__in=RawSQL(
+                f"SELECT timeslot_id FROM {self.table} "
+                f"WHERE document @@ to_tsquery('french', unaccent(%s))",
+                [tsquery],
+            )
+        ).annotate(search_rank=RawSQL(
+            # Négatif : un rang plus petit est un meilleur résultat, comme bm25
+            f"SELECT -ts_rank(document, to_tsquery('french', unaccent(%s))) "
+            f"FROM {self.table} WHERE timeslot_id = core_timeslot.id",
+            [tsquery],
+        ))
+
+    def _reindex(self, where, params):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {self.table} (timeslot_id, document) '
+                f'SELECT t.id, {self.document_sql} '
+                'FROM core_timeslot t JOIN core_establishment e ON e.id = t.establishment_id '
+                f'WHERE {where} '
+                'ON CONFLICT (timeslot_id) DO UPDATE SET document = EXCLUDED.document',
+                params,
+            )
+
+    def index_time_slot(self, time_slot_id):
+        self._reindex('t.id = %s', [time_slot_id])
+
+    def index_establishment(self, establishment_id):
+        self._reindex('t.establishment_id = %s', [establishment_id])
+
+    def remove_time_slot(self, time_slot_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE timeslot_id = %s', [time_slot_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {self.table}')
+        self._reindex('TRUE', [])
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {self.table}')
+            return cursor.fetchone()[0]
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_backend():
+    """Retourne le backend de recherche adapté à la base par défaut."""
+    return BACKENDS.get(connection.vendor, FallbackSearchBackend)()
+
+
+def search_time_slots(queryset, query):
+    """
+    Filtre `queryset` sur `query` et l'annote de `search_rank` (plus petit =
+    plus pertinent).
+    """
+    return get_backend().filter(queryset, query)
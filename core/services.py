@@ -0,0 +1,293 @@
+"""
+Couche de services pour la réservation des créneaux.
+
+Les vues passent par ces fonctions plutôt que de manipuler directement
+Booking.save() : la réservation des places se fait en une seule opération
+atomique (UPDATE conditionnel sur TimeSlot.reserved_places), ce qui rend
+impossible la survente d'un créneau même sous forte concurrence.
+"""
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional
+
+from django.db import transaction
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+
+from . import capacity, db, notifications
+from .models import Booking, SlotCapacityExceeded, TimeSlot, Waitlist
+
+
+@dataclass(frozen=True)
+class BookingResult:
+    """
+    Résultat d'une tentative de réservation.
+
+    - CONFIRMED : toutes les places demandées sont réservées ;
+    - PARTIAL : il reste moins de places que demandé (`available`) ; la
+      réservation n'est créée que si `allow_partial` a été demandé ;
+    - SOLD_OUT : le créneau est complet, rien n'a été réservé.
+    """
+    CONFIRMED = 'CONFIRMED'
+    PARTIAL = 'PARTIAL'
+    SOLD_OUT = 'SOLD_OUT'
+
+    status: str
+    requested: int
+    available: int
+    booking: Optional[Booking] = None
+
+    @property
+    def confirmed(self):
+        return self.booking is not None
+
+    @property
+    def reserved(self):
+        return self.booking.number_of_places if self.booking else 0
+
+
+class CancellationRefused(ValueError):
+    """Réservation qui ne peut pas (ou plus) être annulée ; le message dit pourquoi."""
+
+
+def _started(time_slot):
+    """Le créneau a-t-il commencé (heure locale, comme les champs date/heure) ?"""
+    now = timezone.localtime()
+    return (time_slot.date, time_slot.start_time) <= (now.date(), now.time())
+
+
+def check_cancellable(booking):
+    """
+    Lève CancellationRefused sauf pour une réservation confirmée d'un
+    créneau qui n'a pas commencé : une réservation pointée (terminée ou
+    absente) ou déjà annulée ne change plus, et les places d'un créneau
+    passé ne se libèrent pas.
+    """
+    if booking.status == 'CANCELLED':
+        raise CancellationRefused('Réservation déjà annulée.')
+    if booking.status != 'CONFIRMED':
+        raise CancellationRefused('Présence déjà pointée : la réservation ne peut plus être annulée.')
+    if _started(booking.time_slot):
+        raise CancellationRefused('Le créneau a commencé : la réservation ne peut plus être annulée.')
+
+
+def _refresh_reserved_places(time_slot):
+    """
+    Recharge le compteur du créneau (une requête, sans verrou) et retourne les
+    places disponibles, bornées par les places assises de l'établissement.
+    """
+    time_slot.reserved_places = TimeSlot.objects.filter(pk=time_slot.pk).values_list(
+        'reserved_places', flat=True
+    ).get()
+    seats = capacity.seats_available(time_slot)
+    if seats is None:
+        return time_slot.available_capacity()
+    return min(time_slot.available_capacity(), seats)
+
+
+def _book(user, time_slot, number_of_places, notes):
+    """
+    Crée la réservation ; lève SlotCapacityExceeded si le créneau, ou les
+    places assises de l'établissement, ne suffisent pas.
+    """
+    booking = Booking(user=user, time_slot=time_slot, number_of_places=number_of_places, notes=notes)
+    with db.write_transaction():
+        capacity.reserve_seats(time_slot, number_of_places)
+        booking.save()
+    return booking
+
+
+def reserve_places(user, time_slot, number_of_places, notes=None, allow_partial=False):
+    """
+    Réserve `number_of_places` places sur `time_slot` pour `user`.
+
+    La vérification de capacité et l'incrément du compteur se font dans le même
+    UPDATE conditionnel (voir Booking._sync_reserved_places), donc sans
+    fenêtre de concurrence entre le contrôle et l'écriture. Si l'établissement
+    limite ses places assises, sa ligne est verrouillée le temps du contrôle
+    (voir core/capacity.py).
+    """
+    try:
+        booking = _book(user, time_slot, number_of_places, notes)
+    except SlotCapacityExceeded:
+        pass
+    else:
+        return BookingResult(BookingResult.CONFIRMED, number_of_places, time_slot.available_capacity(), booking)
+
+    available = max(_refresh_reserved_places(time_slot), 0)
+    if available <= 0:
+        return BookingResult(BookingResult.SOLD_OUT, number_of_places, 0)
+
+    if allow_partial:
+        try:
+            booking = _book(user, time_slot, available, notes)
+        except SlotCapacityExceeded:
+            # Les places restantes viennent d'être prises par quelqu'un d'autre
+            available = max(_refresh_reserved_places(time_slot), 0)
+            status = BookingResult.PARTIAL if available else BookingResult.SOLD_OUT
+            return BookingResult(status, number_of_places, available)
+        return BookingResult(BookingResult.PARTIAL, number_of_places, time_slot.available_capacity(), booking)
+
+    return BookingResult(BookingResult.PARTIAL, number_of_places, available)
+
+
+@dataclass(frozen=True)
+class GroupBookingResult:
+    """
+    Résultat d'une réservation de groupe (tout ou rien).
+
+    `bookings` : réservations créées, une par créneau, si tout est passé ;
+    `failures` : (créneau, places disponibles) des créneaux insuffisants.
+    Si `failures` n'est pas vide, rien n'a été réservé.
+    """
+    requested: int
+    bookings: tuple = ()
+    failures: tuple = ()
+
+    @property
+    def confirmed(self):
+        return bool(self.bookings) and not self.failures
+
+    @property
+    def total_places(self):
+        return sum(booking.number_of_places for booking in self.bookings)
+
+
+def reserve_group(user, time_slots, number_of_places, notes=None):
+    """
+    Réserve `number_of_places` places sur chacun des `time_slots`, en une
+    seule transaction : soit toutes les réservations sont créées, soit aucune.
+
+    Un seul contrôle de capacité par créneau : l'UPDATE conditionnel du
+    compteur (Booking.save), dans un point de sauvegarde pour continuer et
+    rapporter tous les créneaux insuffisants d'un coup. Les places assises
+    sont contrôlées pour tout le lot en deux requêtes
+    (capacity.reserve_group_seats). Les créneaux sont traités par id
+    croissant, dans le même ordre pour toutes les transactions.
+    """
+    time_slots = sorted({time_slot.pk: time_slot for time_slot in time_slots}.values(), key=lambda slot: slot.pk)
+    with db.write_transaction():
+        failures = capacity.reserve_group_seats(time_slots, number_of_places)
+        refused = {time_slot.pk for time_slot, _ in failures}
+        bookings = []
+        for time_slot in time_slots:
+            if time_slot.pk in refused:
+                continue
+            booking = Booking(user=user, time_slot=time_slot, number_of_places=number_of_places, notes=notes)
+            try:
+                with transaction.atomic():
+                    booking.save()
+            except SlotCapacityExceeded:
+                failures.append((time_slot, max(_refresh_reserved_places(time_slot), 0)))
+            else:
+                bookings.append(booking)
+
+        if failures:
+            transaction.set_rollback(True)
+            # Compteurs en mémoire incrémentés par Booking.save : annulés avec la transaction
+            for booking in bookings:
+                booking.time_slot.reserved_places -= number_of_places
+            failures.sort(key=lambda failure: failure[0].pk)
+            return GroupBookingResult(number_of_places, failures=tuple(failures))
+    return GroupBookingResult(number_of_places, bookings=tuple(bookings))
+
+
+@db.write_transaction()
+def cancel_booking(booking):
+    """
+    Annule une réservation, libère ses places et promeut la liste d'attente
+    du créneau dans la même transaction.
+
+    La réservation est relue verrouillée (select_for_update) : l'instance
+    reçue peut être périmée, et deux annulations concurrentes (double envoi
+    du formulaire) ne doivent libérer ses places qu'une fois. Lève
+    CancellationRefused si elle n'est pas annulable (voir check_cancellable).
+    """
+    locked = Booking.objects.select_for_update().select_related('time_slot').get(pk=booking.pk)
+    check_cancellable(locked)
+    locked.status = 'CANCELLED'
+    locked.save()
+    promote_waitlist(locked.time_slot)
+    # L'instance de l'appelant reflète l'état en base
+    booking.status = locked.status
+    booking._counted = locked._counted
+    return locked
+
+
+@db.write_transaction()
+def record_attendance(booking, attended):
+    """
+    Pointe la présence d'une réservation dont le créneau a commencé :
+    COMPLETED si le client est venu, NO_SHOW sinon. Un pointage peut être
+    corrigé ; une réservation annulée ne se pointe pas. Lève ValueError
+    sinon. Les places restent comptées (voir Booking.OCCUPYING_STATUSES).
+    """
+    locked = Booking.objects.select_for_update().select_related('time_slot').get(pk=booking.pk)
+    if not _started(locked.time_slot):
+        raise ValueError('Le créneau n\'a pas encore commencé.')
+    if locked.status == 'CANCELLED':
+        raise ValueError('Réservation annulée.')
+    status = 'COMPLETED' if attended else 'NO_SHOW'
+    if locked.status != status:
+        locked.status = status
+        locked.save()
+    booking.status = locked.status
+    booking._counted = locked._counted
+    return locked
+
+
+def join_waitlist(user, time_slot, number_of_places, notes=None):
+    """
+    Inscrit (ou met à jour) `user` sur la liste d'attente du créneau. Une
+    mise à jour garde le rang d'inscription.
+    """
+    entry, created = Waitlist.objects.get_or_create(
+        user=user, time_slot=time_slot,
+        defaults={'number_of_places': number_of_places, 'notes': notes},
+    )
+    if not created and (entry.number_of_places, entry.notes) != (number_of_places, notes):
+        entry.number_of_places, entry.notes = number_of_places, notes
+        entry.save(update_fields=['number_of_places', 'notes'])
+    return entry
+
+
+def waitlist_position(entry):
+    """Rang (1 = premier) d'une inscription dans la file de son créneau."""
+    return Waitlist.objects.filter(time_slot_id=entry.time_slot_id).filter(
+        Q(created_at__lt=entry.created_at) | Q(created_at=entry.created_at, pk__lt=entry.pk)
+    ).count() + 1
+
+
+def promote_waitlist(time_slot):
+    """
+    Transforme en réservations les premières inscriptions de la file tant
+    que les places libérées suffisent, et notifie les utilisateurs promus.
+
+    File strictement FIFO : si la tête de file demande plus de places qu'il
+    n'en reste, personne ne la double. Les inscriptions sont verrouillées le
+    temps de la promotion ; chaque réservation passe par le même UPDATE
+    conditionnel que les autres, donc sans survente possible. Retourne les
+    réservations créées.
+    """
+    if time_slot.date < date.today():
+        return []
+    promoted = []
+    with db.write_transaction():
+        if _refresh_reserved_places(time_slot) <= 0:
+            return []
+        entries = Waitlist.objects.select_for_update().filter(time_slot=time_slot).select_related('user')
+        for entry in entries.order_by('created_at', 'pk'):
+            try:
+                booking = _book(entry.user, time_slot, entry.number_of_places, entry.notes)
+            except SlotCapacityExceeded:
+                break
+            entry.delete()
+            notifications.notify(
+                entry.user,
+                f'Une place s\'est libérée : votre réservation pour « {time_slot.title} » '
+                f'le {time_slot.date:%d/%m/%Y} est confirmée ({entry.number_of_places} place(s)).',
+                url=reverse('my_bookings'),
+            )
+            promoted.append(booking)
+    return promoted
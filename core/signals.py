@@ -0,0 +1,183 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from .models import Booking, CustomUser, Establishment, TimeSlot
+from . import facets, geo, images, listing_cache, occupancy, realtime, search
+
+
+def _booking_changed(booking):
+    """
+    Reporte la variation de places libres sur les facettes et invalide le
+    listing des créneaux concernés, et publie leur disponibilité en temps réel.
+    """
+    deltas = getattr(booking, '_reserved_deltas', {})
+    realtime.publish_availability(deltas)
+    for time_slot_id, delta in deltas.items():
+        contribution = facets.slot_contribution(time_slot_id)
+        if contribution is None:
+            continue
+        facets.add_free_places(contribution, -delta)
+        key, city, _ = contribution
+        listing_cache.invalidate_slot(city, key['date'])
+
+
+@receiver(pre_save, sender=Booking)
+def booking_pre_save(sender, instance, raw=False, **kwargs):
+    """Mémorise la portée (établissement, jour, client) avant modification."""
+    instance._occupancy_before = None
+    if not raw and instance.pk:
+        instance._occupancy_before = occupancy.booking_scope(instance.pk)
+
+
+@receiver(post_save, sender=Booking)
+def booking_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _booking_changed(instance)
+        occupancy.schedule([
+            getattr(instance, '_occupancy_before', None),
+            occupancy.booking_scope(instance.pk),
+        ])
+
+
+@receiver(pre_delete, sender=Booking)
+def booking_pre_delete(sender, instance, **kwargs):
+    instance._occupancy_before = occupancy.booking_scope(instance.pk)
+
+
+@receiver(post_delete, sender=Booking)
+def booking_deleted(sender, instance, **kwargs):
+    """
+    Libère les places d'une réservation supprimée (y compris en cascade).
+    """
+    instance.release_reserved_places()
+    _booking_changed(instance)
+    occupancy.schedule([getattr(instance, '_occupancy_before', None)])
+
+
+@receiver(pre_save, sender=TimeSlot)
+def time_slot_pre_save(sender, instance, raw=False, **kwargs):
+    """
+    Mémorise la facette d'avant modification (date, ville, places libres).
+    """
+    instance._facet_before = None
+    instance._occupancy_before = None
+    if not raw and instance.pk:
+        instance._facet_before = facets.slot_contribution(instance.pk)
+        instance._occupancy_before = occupancy.time_slot_scope(instance.pk)
+
+
+@receiver(post_save, sender=TimeSlot)
+def time_slot_saved(sender, instance, raw=False, **kwargs):
+    """
+    Met à jour l'index de recherche, les facettes et le listing du créneau.
+    """
+    if raw:
+        return
+    search.get_backend().index_time_slot(instance.pk)
+    before = getattr(instance, '_facet_before', None)
+    after = facets.slot_contribution(instance.pk)
+    facets.apply_slot_change(before, after)
+    for contribution in (before, after):
+        if contribution is not None:
+            key, city, _ = contribution
+            listing_cache.invalidate_slot(city, key['date'])
+    _time_slot_occupancy_changed(instance, getattr(instance, '_occupancy_before', None))
+
+
+def _time_slot_occupancy_changed(instance, before):
+    """
+    Planifie le recalcul des rollups du créneau ; s'il change de jour ou
+    d'établissement, les mois de ses clients sont aussi recalculés.
+    """
+    after = (instance.establishment_id, instance.date)
+    scopes = [(*after, None)]
+    if before is not None and tuple(before) != after:
+        scopes.append((*before, None))
+        for user_id in occupancy.time_slot_customers(instance.pk):
+            scopes += [(*before, user_id), (*after, user_id)]
+    occupancy.schedule(scopes)
+
+
+@receiver(pre_delete, sender=TimeSlot)
+def time_slot_pre_delete(sender, instance, **kwargs):
+    instance._facet_before = facets.slot_contribution(instance.pk)
+    instance._occupancy_before = occupancy.time_slot_scope(instance.pk)
+
+
+@receiver(post_delete, sender=TimeSlot)
+def time_slot_deleted(sender, instance, **kwargs):
+    search.get_backend().remove_time_slot(instance.pk)
+    before = getattr(instance, '_facet_before', None)
+    if before is not None:
+        facets.apply_slot_change(before, None)
+        key, city, _ = before
+        listing_cache.invalidate_slot(city, key['date'])
+    scope = getattr(instance, '_occupancy_before', None)
+    if scope is not None:
+        occupancy.schedule([(*scope, None)])
+
+
+@receiver(pre_save, sender=Establishment)
+def establishment_pre_save(sender, instance, raw=False, **kwargs):
+    """
+    Mémorise la ville et les facettes des créneaux avant modification,
+    normalise la ville, géocode l'établissement si son adresse a changé et
+    repère un nouveau logo.
+    """
+    instance._city_before = None
+    instance._facets_before = []
+    instance._logo_changed = False
+    if raw:
+        return
+    instance.city_key = facets.city_key(instance.city)
+    before = None
+    if instance.pk:
+        before = Establishment.objects.filter(pk=instance.pk).values('city', 'address', 'logo').first()
+        instance._facets_before = facets.establishment_contributions(instance.pk)
+    if before is not None:
+        instance._city_before = before['city']
+    instance._logo_changed = images.image_changed(instance, 'logo', before and before['logo'])
+    # Géocoder hors ligne à la création ou quand l'adresse change
+    moved = before is None or (before['address'], before['city']) != (instance.address, instance.city)
+    geo.locate(instance, force=moved)
+
+
+@receiver(post_save, sender=Establishment)
+def establishment_saved(sender, instance, created=False, raw=False, **kwargs):
+    """
+    Réindexe les créneaux de l'établissement (nom, ville, description),
+    déplace leurs facettes si la ville, le type ou les équipements changent,
+    invalide le listing de sa ville (et de l'ancienne) et planifie les
+    miniatures d'un nouveau logo.
+    """
+    if raw:
+        return
+    if getattr(instance, '_logo_changed', False) and instance.logo:
+        images.schedule('logo', instance.pk)
+    if not created:
+        search.get_backend().index_establishment(instance.pk)
+        before = getattr(instance, '_facets_before', [])
+        after = facets.establishment_contributions(instance.pk)
+        if before != after:
+            facets.move_establishment(before, after)
+    listing_cache.invalidate_city(instance.city, getattr(instance, '_city_before', None))
+
+
+@receiver(post_delete, sender=Establishment)
+def establishment_deleted(sender, instance, **kwargs):
+    listing_cache.invalidate_city(instance.city)
+
+
+@receiver(pre_save, sender=CustomUser)
+def user_pre_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Repère un nouvel avatar (sans requête pour les mises à jour partielles, ex. last_login)."""
+    instance._avatar_changed = False
+    if raw or (update_fields is not None and 'avatar' not in update_fields):
+        return
+    before = CustomUser.objects.filter(pk=instance.pk).values_list('avatar', flat=True).first() if instance.pk else None
+    instance._avatar_changed = images.image_changed(instance, 'avatar', before)
+
+
+@receiver(post_save, sender=CustomUser)
+def user_saved(sender, instance, raw=False, **kwargs):
+    if not raw and getattr(instance, '_avatar_changed', False) and instance.avatar:
+        images.schedule('avatar', instance.pk)
@@ -0,0 +1,50 @@
+"""
+Balise <img> responsive pour les logos et avatars (voir core/images.py).
+
+    {% load responsive_images %}
+    {% responsive_image establishment "logo" sizes="(min-width: 768px) 33vw, 100vw" class="w-full h-full object-cover" %}
+
+Produit un <picture> (WebP, repli JPEG) dont le `srcset` liste toutes les
+largeurs des miniatures, chargé en différé (`loading="lazy"`). Passer
+`loading="eager"` pour une image visible dès l'ouverture de la page. Sans
+miniatures (pas encore traitées), l'image d'origine est servie telle quelle.
+"""
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html
+
+from core.images import RENDITIONS, TARGETS, rendition_name
+
+register = template.Library()
+
+
+def _srcset(kind, digest, extension):
+    return ', '.join(
+        f'{default_storage.url(rendition_name(kind, digest, width, extension))} {width}w'
+        for width in RENDITIONS[kind]
+    )
+
+
+@register.simple_tag
+def responsive_image(obj, kind, sizes='100vw', alt='', loading='lazy', **attrs):
+    _, field, digest_field = TARGETS[kind]
+    image = getattr(obj, field)
+    if not image:
+        return ''
+    css_class = attrs.get('class', '')
+    digest = getattr(obj, digest_field)
+    if not digest:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="{}" decoding="async">', image.url, alt, css_class, loading,
+        )
+    widths = RENDITIONS[kind]
+    fallback = default_storage.url(rendition_name(kind, digest, widths[len(widths) // 2], 'jpg'))
+    # display: contents : le <picture> n'intervient pas dans la mise en page de l'<img>
+    return format_html(
+        '<picture style="display: contents">'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="{}" decoding="async">'
+        '</picture>',
+        _srcset(kind, digest, 'webp'), sizes,
+        fallback, _srcset(kind, digest, 'jpg'), sizes, alt, css_class, loading,
+    )
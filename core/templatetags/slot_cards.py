@@ -0,0 +1,80 @@
+"""
+Cache des cartes de créneaux rendues (fragments HTML).
+
+Une carte ne change que si le créneau, son établissement ou sa
+disponibilité change : sa clé porte `updated_at` des deux objets et le
+compteur de places réservées (qui évolue sans toucher `updated_at`). Une
+modification produit donc une nouvelle clé, sans invalidation explicite ;
+les anciennes entrées expirent d'elles-mêmes.
+
+    {% load slot_cards %}
+    {% prefetch_slot_cards time_slots "index" %}
+    {% for slot in time_slots %}
+        {% slotcard slot "index" %}...{% endslotcard %}
+    {% endfor %}
+
+`prefetch_slot_cards` lit toutes les cartes de la liste en un seul
+`get_many` (un aller-retour vers le cache au lieu d'un par carte) ;
+`slotcard` fonctionne aussi sans lui.
+"""
+import hashlib
+
+from django import template
+from django.core.cache import cache
+from django.utils.translation import get_language
+
+register = template.Library()
+
+PREFIX = 'core:slotcard'
+CARD_TIMEOUT = 24 * 60 * 60
+PREFETCHED = '_prefetched_slot_cards'
+# Valeurs calculées par les vues (annotations) affichées dans certaines cartes
+VARYING_ATTRIBUTES = ('distance_km', 'confirmed_bookings')
+
+
+def slot_card_key(slot, variant):
+    """Clé du fragment `variant` d'un créneau (établissement chargé avec select_related)."""
+    establishment = slot.establishment
+    raw = repr((
+        variant, get_language(), slot.pk, slot.updated_at.isoformat(),
+        establishment.updated_at.isoformat(), slot.reserved_places,
+        tuple(getattr(slot, name, None) for name in VARYING_ATTRIBUTES),
+    ))
+    return f'{PREFIX}:{hashlib.sha1(raw.encode()).hexdigest()}'
+
+
+@register.simple_tag(takes_context=True)
+def prefetch_slot_cards(context, time_slots, variant):
+    """Charge en une fois les cartes déjà en cache de `time_slots`."""
+    keys = [slot_card_key(slot, variant) for slot in time_slots]
+    prefetched = context.get(PREFETCHED) or {}
+    prefetched.update(cache.get_many(keys))
+    context[PREFETCHED] = prefetched
+    return ''
+
+
+class SlotCardNode(template.Node):
+    def __init__(self, nodelist, slot, variant):
+        self.nodelist = nodelist
+        self.slot = slot
+        self.variant = variant
+
+    def render(self, context):
+        key = slot_card_key(self.slot.resolve(context), self.variant.resolve(context))
+        prefetched = context.get(PREFETCHED)
+        html = prefetched.get(key) if prefetched is not None else cache.get(key)
+        if html is None:
+            html = self.nodelist.render(context)
+            cache.set(key, html, CARD_TIMEOUT)
+        return html
+
+
+@register.tag
+def slotcard(parser, token):
+    """{% slotcard slot "variante" %}...{% endslotcard %}"""
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' attend un créneau et une variante.")
+    nodelist = parser.parse(('endslotcard',))
+    parser.delete_first_token()
+    return SlotCardNode(nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2]))
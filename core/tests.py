@@ -1,3 +1,1298 @@
-from django.test import TestCase
+import json
+import re
+import shutil
+import tempfile
+import time as timer
+from datetime import date, time, timedelta
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from PIL import Image
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.db.models import Count
+from django.http import Http404
+from django.template import Context, Template
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.template.loader import render_to_string
+from django.urls import reverse
+
+from .models import (
+    CustomUser, Establishment, TimeSlot, Booking, SlotFacet, DailyOccupancy, CustomerOccupancy,
+    ArchivedTimeSlot, ArchivedBooking, Waitlist,
+)
+from . import api, archive, capacity, db, facets, geo, images, listing_cache, metrics, occupancy, realtime, recurrence, search, services, views
+from .pagination import paginate_time_slots
+
+
+def create_time_slot(owner=None, capacity=10, **kwargs):
+    """Crée un établissement et un créneau de test."""
+    if owner is None:
+        owner = CustomUser.objects.create(username='owner', user_type='ETABLISSEMENT')
+    establishment = Establishment.objects.create(
+        owner=owner, name='Le Comptoir', establishment_type='BAR',
+        address='1 rue de la Paix', city='Paris',
+    )
+    defaults = {
+        'title': 'Matinée Coworking',
+        'date': date.today() + timedelta(days=1),
+        'start_time': time(9, 0),
+        'end_time': time(12, 0),
+        'total_capacity': capacity,
+    }
+    defaults.update(kwargs)
+    return TimeSlot.objects.create(establishment=establishment, **defaults)
+
+
+class ReservedPlacesCounterTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='marie')
+        self.time_slot = create_time_slot(capacity=5)
+
+    def reserved(self):
+        self.time_slot.refresh_from_db()
+        return self.time_slot.reserved_places
+
+    def test_follows_booking_lifecycle(self):
+        booking = Booking.objects.create(user=self.user, time_slot=self.time_slot, number_of_places=2)
+        self.assertEqual(self.reserved(), 2)
+
+        booking.number_of_places = 3
+        booking.save()
+        self.assertEqual(self.reserved(), 3)
+
+        # Terminée : les places restent comptées
+        booking.status = 'COMPLETED'
+        booking.save()
+        self.assertEqual(self.reserved(), 3)
+
+        booking.status = 'CANCELLED'
+        booking.save()
+        self.assertEqual(self.reserved(), 0)
+
+        booking.status = 'CONFIRMED'
+        booking.save()
+        booking.delete()
+        self.assertEqual(self.reserved(), 0)
+
+    def test_stale_slot_save_keeps_counter(self):
+        stale = TimeSlot.objects.get(pk=self.time_slot.pk)
+        Booking.objects.create(user=self.user, time_slot=self.time_slot, number_of_places=4)
+        stale.title = 'Matinée calme'
+        stale.save()
+        self.assertEqual(stale.reserved_places, 4)
+        self.assertEqual(self.reserved(), 4)
+
+        # Édition par le propriétaire avec une capacité sous les places réservées
+        owner = self.time_slot.establishment.owner
+        self.client.force_login(owner)
+        response = self.client.post(reverse('edit_timeslot', args=[stale.pk]), {
+            'title': 'Matinée', 'date': stale.date.isoformat(), 'start_time': '09:00', 'end_time': '12:00',
+            'total_capacity': 3, 'price_info': 'Gratuit',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('déjà réservée', str(response.context['form'].errors))
+        self.time_slot.refresh_from_db()
+        self.assertEqual((self.time_slot.total_capacity, self.time_slot.reserved_places), (5, 4))
+
+    def test_cascade_delete_releases_places(self):
+        Booking.objects.create(user=self.user, time_slot=self.time_slot, number_of_places=4)
+        self.user.delete()
+        self.assertEqual(self.reserved(), 0)
+
+    def test_rebuild_command_repairs_drift(self):
+        Booking.objects.create(user=self.user, time_slot=self.time_slot, number_of_places=2)
+        # Les mises à jour en masse contournent le compteur
+        Booking.objects.update(status='CANCELLED')
+        with self.assertRaises(CommandError):
+            call_command('rebuild_reserved_places', check=True, stdout=StringIO())
+
+        call_command('rebuild_reserved_places', stdout=StringIO())
+        self.assertEqual(self.reserved(), 0)
+        call_command('rebuild_reserved_places', check=True, stdout=StringIO())
+
+
+class ReservePlacesTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='marie')
+        self.time_slot = create_time_slot(capacity=5)
+
+    def test_confirmed_then_sold_out(self):
+        result = services.reserve_places(self.user, self.time_slot, 5)
+        self.assertEqual(result.status, services.BookingResult.CONFIRMED)
+        self.assertEqual(self.time_slot.available_capacity(), 0)
+
+        result = services.reserve_places(self.user, self.time_slot, 1)
+        self.assertEqual(result.status, services.BookingResult.SOLD_OUT)
+        self.assertFalse(result.confirmed)
+
+    def test_partial(self):
+        services.reserve_places(self.user, self.time_slot, 3)
+
+        result = services.reserve_places(self.user, self.time_slot, 4)
+        self.assertEqual(result.status, services.BookingResult.PARTIAL)
+        self.assertEqual(result.available, 2)
+        self.assertIsNone(result.booking)
+
+        result = services.reserve_places(self.user, self.time_slot, 4, allow_partial=True)
+        self.assertEqual(result.status, services.BookingResult.PARTIAL)
+        self.assertEqual(result.reserved, 2)
+
+    def test_cancel_releases_places(self):
+        booking = services.reserve_places(self.user, self.time_slot, 4).booking
+        services.cancel_booking(booking)
+        self.time_slot.refresh_from_db()
+        self.assertEqual(self.time_slot.reserved_places, 0)
+
+    def test_double_cancel_releases_places_once(self):
+        services.reserve_places(CustomUser.objects.create(username='paul'), self.time_slot, 1)
+        booking = services.reserve_places(self.user, self.time_slot, 3).booking
+        # Deux requêtes concurrentes chargent chacune la réservation confirmée
+        first, second = Booking.objects.get(pk=booking.pk), Booking.objects.get(pk=booking.pk)
+        services.cancel_booking(first)
+        with self.assertRaisesMessage(services.CancellationRefused, 'déjà annulée'):
+            services.cancel_booking(second)
+        self.time_slot.refresh_from_db()
+        self.assertEqual(self.time_slot.reserved_places, 1)
+
+    def test_cancellation_refused_once_slot_started_or_attended(self):
+        past = TimeSlot.objects.create(
+            establishment=self.time_slot.establishment, title='Hier', date=date.today() - timedelta(days=1),
+            start_time=time(9, 0), end_time=time(12, 0), total_capacity=5,
+        )
+        confirmed = services.reserve_places(self.user, past, 1).booking
+        absent = services.reserve_places(self.user, past, 2).booking
+        services.record_attendance(absent, attended=False)
+        services.join_waitlist(CustomUser.objects.create(username='paul'), past, 1)
+
+        for booking, message in ((confirmed, 'a commencé'), (absent, 'pointée')):
+            with self.assertRaisesMessage(services.CancellationRefused, message):
+                services.cancel_booking(booking)
+        self.assertEqual(
+            dict(Booking.objects.values_list('pk', 'status')), {confirmed.pk: 'CONFIRMED', absent.pk: 'NO_SHOW'},
+        )
+        past.refresh_from_db()
+        self.assertEqual(past.reserved_places, 3)
+        self.assertEqual(Waitlist.objects.count(), 1)
+
+    def test_cancel_view_refuses_attended_booking(self):
+        past = TimeSlot.objects.create(
+            establishment=self.time_slot.establishment, title='Hier', date=date.today() - timedelta(days=1),
+            start_time=time(9, 0), end_time=time(12, 0), total_capacity=5,
+        )
+        attended = services.reserve_places(self.user, past, 1).booking
+        services.record_attendance(attended, attended=True)
+        upcoming = services.reserve_places(self.user, self.time_slot, 1).booking
+        self.client.force_login(self.user)
+
+        for method in (self.client.get, self.client.post):
+            response = method(reverse('cancel_booking', args=[attended.pk]), follow=True)
+            self.assertRedirects(response, reverse('my_bookings'))
+            self.assertIn('ne peut plus être annulée', [str(m) for m in response.context['messages']][0])
+        attended.refresh_from_db()
+        self.assertEqual(attended.status, 'COMPLETED')
+
+        self.client.post(reverse('cancel_booking', args=[upcoming.pk]))
+        upcoming.refresh_from_db()
+        self.assertEqual(upcoming.status, 'CANCELLED')
+
+
+class BookingContentionTests(TransactionTestCase):
+    def test_no_oversell(self):
+        out = StringIO()
+        call_command('bench_booking_contention', threads=4, capacity=30, stdout=out)
+        self.assertIn('Aucune survente', out.getvalue())
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Profil SQLite')
+class SQLiteProfileTests(TransactionTestCase):
+    def test_pragmas_applied_to_new_connections(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        wrapper = DatabaseWrapper({**connection.settings_dict, 'NAME': f'{directory}/profile.sqlite3'}, 'profile')
+        try:
+            wrapper.ensure_connection()
+            pragmas = db.sqlite_pragmas(wrapper)
+        finally:
+            wrapper.close()
+        self.assertEqual(pragmas['journal_mode'], 'wal')
+        self.assertEqual(pragmas['synchronous'], 1)
+        self.assertEqual(pragmas['busy_timeout'], 20000)
+
+    def test_only_write_paths_begin_immediate(self):
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                TimeSlot.objects.count()
+            with db.write_transaction():
+                with db.write_transaction():
+                    TimeSlot.objects.count()
+        begins = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('BEGIN')]
+        self.assertEqual(begins, ['BEGIN', 'BEGIN IMMEDIATE'])
+
+    def test_rollup_refresh_reads_sources_under_the_write_lock(self):
+        time_slot = create_time_slot()
+        with CaptureQueriesContext(connection) as queries:
+            occupancy.refresh_days(time_slot.establishment_id, [time_slot.date])
+        statements = [query['sql'].split()[0] for query in queries.captured_queries]
+        # Verrou, sources et réécriture des rollups dans une seule transaction
+        self.assertEqual(queries.captured_queries[0]['sql'], 'BEGIN IMMEDIATE')
+        self.assertEqual(statements[1:], ['SELECT', 'SELECT', 'SELECT', 'DELETE', 'INSERT', 'COMMIT'])
+        self.assertEqual(DailyOccupancy.objects.filter(date=time_slot.date).count(), 3)
+
+    def test_concurrent_bookings_without_lock_errors(self):
+        out = StringIO()
+        call_command('bench_sqlite_profiles', threads=4, capacity=40, stdout=out)
+        self.assertIn('default :', out.getvalue())
+        self.assertIn('tuned :', out.getvalue())
+        self.assertRegex(out.getvalue(), r'tuned : [\d.]+ réservations/s, 0 erreur')
+
+
+class IndexPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        owner = CustomUser.objects.create(username='owner', user_type='ETABLISSEMENT')
+        first = create_time_slot(owner=owner)
+        for hour in range(9, 18):
+            TimeSlot.objects.create(
+                establishment=first.establishment, title=f'Créneau {hour}h',
+                date=first.date, start_time=time(hour, 0), end_time=time(hour, 30),
+                total_capacity=5,
+            )
+
+    def test_cursor_walks_every_slot_once(self):
+        seen = []
+        page, cursor = paginate_time_slots(TimeSlot.objects.all(), page_size=4)
+        seen += page
+        while cursor:
+            page, cursor = paginate_time_slots(TimeSlot.objects.all(), cursor=cursor, page_size=4)
+            seen += page
+        self.assertEqual([slot.pk for slot in seen], list(TimeSlot.objects.values_list('pk', flat=True)))
+
+    def test_load_more_fragment(self):
+        response = self.client.get(reverse('index_more'), {'cursor': 'invalide'})
+        data = response.json()
+        self.assertEqual(data['count'], 10)
+        self.assertIsNone(data['next_cursor'])
+        self.assertIn('Matinée Coworking', data['html'])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Plans d\'exécution vérifiés sur SQLite')
+class QueryPlanTests(TestCase):
+    """
+    Exécute EXPLAIN QUERY PLAN sur chaque SELECT émis par les vues critiques
+    et échoue si l'une d'elles parcourt une table entière sans index.
+    """
+    FULL_SCAN = re.compile(r'^SCAN (\S+)$')
+
+    def setUp(self):
+        cache.clear()
+        self.time_slot = create_time_slot()
+        self.user = CustomUser.objects.create(username='marie')
+        Booking.objects.create(user=self.user, time_slot=self.time_slot, number_of_places=2)
+
+    def assertNoFullScan(self, path, params=None, user=None):
+        if user is not None:
+            self.client.force_login(user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(path, params or {})
+        self.assertEqual(response.status_code, 200)
+        for query in context.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = [row[-1] for row in cursor.fetchall()]
+            scans = [step for step in plan if self.FULL_SCAN.match(step)]
+            self.assertFalse(scans, f'Parcours complet pour {path} {params or ""}:\n{sql}\n{plan}')
+
+    def test_index(self):
+        self.assertNoFullScan(reverse('index'))
+        self.assertNoFullScan(reverse('index'), {'type': 'BAR', 'wifi': '1'})
+        self.assertNoFullScan(reverse('index'), {'date': self.time_slot.date.isoformat(), 'city': 'Paris'})
+        self.assertNoFullScan(reverse('index'), {'search': 'comptoir paris'})
+        self.assertNoFullScan(reverse('index'), {'lat': '48.857', 'lng': '2.352', 'power': '1', 'now': '1'})
+
+    def test_index_more(self):
+        self.assertNoFullScan(reverse('index_more'), {'type': 'BAR'})
+
+    def test_timeslot_detail(self):
+        self.assertNoFullScan(reverse('timeslot_detail', args=[self.time_slot.pk]))
+
+    def test_my_bookings(self):
+        self.assertNoFullScan(reverse('my_bookings'), user=self.user)
+
+    def test_establishment_dashboard(self):
+        self.assertNoFullScan(reverse('establishment_dashboard'), user=self.time_slot.establishment.owner)
+
+    def test_occupying_bookings_use_slot_status_index(self):
+        queryset = Booking.objects.filter(time_slot=self.time_slot, status__in=Booking.OCCUPYING_STATUSES)
+        sql, params = queryset.values('number_of_places').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('booking_slot_status_idx', plan)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.time_slot = create_time_slot(title='Afterwork networking')
+        establishment = self.time_slot.establishment
+        establishment.name = 'Café des Arts'
+        establishment.city = 'Lyon'
+        establishment.save()
+        self.other = TimeSlot.objects.create(
+            establishment=create_time_slot(owner=establishment.owner).establishment,
+            title='Matinée calme', description='Un café offert à l\'arrivée.', date=self.time_slot.date,
+            start_time=time(8, 0), end_time=time(10, 0), total_capacity=4,
+        )
+
+    def search(self, query):
+        return list(search.search_time_slots(TimeSlot.objects.all(), query).order_by('search_rank'))
+
+    def test_accent_insensitive_and_ranked(self):
+        # « cafe » trouve « Café » ; le nom d'établissement pèse plus que la description
+        self.assertEqual(self.search('cafe'), [self.time_slot, self.other])
+        self.assertEqual(self.search('LYON'), [self.time_slot])
+
+    def test_index_follows_changes(self):
+        establishment = self.time_slot.establishment
+        establishment.city = 'Bordeaux'
+        establishment.save()
+        self.assertEqual(self.search('lyon'), [])
+        self.assertEqual(self.search('bordeaux'), [self.time_slot])
+
+        self.time_slot.delete()
+        self.assertEqual(self.search('bordeaux'), [])
+
+    def test_operators_are_not_interpreted(self):
+        self.assertEqual(self.search('cafe" *'), [self.time_slot, self.other])
+        self.assertEqual(self.search('!!!'), [])
+
+
+class ListingCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.paris = create_time_slot()
+        self.lyon = create_time_slot(owner=self.paris.establishment.owner)
+        self.lyon.establishment.city = 'Lyon'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lyon.establishment.save()
+        self.user = CustomUser.objects.create(username='marie')
+
+    def get(self, **params):
+        return self.client.get(reverse('index'), params)
+
+    def test_hit_after_miss(self):
+        self.get(city='Paris')
+        with self.assertNumQueries(1):  # Relecture des créneaux de la page par clé primaire
+            response = self.get(city='Paris')
+        self.assertEqual(list(response.context['time_slots']), [self.paris])
+        self.assertEqual(listing_cache.stats()['hits'], 1)
+        self.assertEqual(listing_cache.stats()['misses'], 1)
+
+    def test_booking_invalidates_only_its_city(self):
+        self.get(city='Paris')
+        self.get(city='Lyon')
+        with self.captureOnCommitCallbacks(execute=True):
+            services.reserve_places(self.user, self.paris, 2)
+
+        listing_cache.reset_stats()
+        response = self.get(city='paris')
+        self.assertEqual(response.context['time_slots'][0].available_capacity(), 8)
+        self.get(city='Lyon')
+        self.assertEqual(listing_cache.stats(), {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+
+    def test_change_in_city_matching_filter_invalidates_it(self):
+        suburb = create_time_slot(owner=self.paris.establishment.owner)
+        with self.captureOnCommitCallbacks(execute=True):
+            suburb.establishment.city = 'Cormeilles-en-Parisis'
+            suburb.establishment.save()
+        # Le filtre ville est un icontains : « Paris » trouve aussi cette ville
+        self.assertEqual(len(self.get(city='Paris').context['time_slots']), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            evening = TimeSlot.objects.create(
+                establishment=suburb.establishment, title='Soirée', date=suburb.date,
+                start_time=time(18, 0), end_time=time(21, 0), total_capacity=4,
+            )
+        response = self.get(city='Paris')
+        self.assertIn(evening, response.context['time_slots'])
+        self.assertEqual(response.context['total_count'], 3)
+
+
+class FacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.time_slot = create_time_slot(capacity=6)
+        self.establishment = self.time_slot.establishment
+        self.user = CustomUser.objects.create(username='marie')
+
+    def assertFacetsMatchRebuild(self):
+        incremental = sorted(SlotFacet.objects.values_list(
+            'date', 'city_key', 'establishment_type', 'wifi_available', 'slot_count', 'free_places'
+        ).exclude(slot_count=0, free_places=0))
+        facets.rebuild()
+        rebuilt = sorted(SlotFacet.objects.values_list(
+            'date', 'city_key', 'establishment_type', 'wifi_available', 'slot_count', 'free_places'
+        ))
+        self.assertEqual(incremental, rebuilt)
+
+    def test_incremental_updates_match_rebuild(self):
+        booking = services.reserve_places(self.user, self.time_slot, 2).booking
+        self.establishment.city = 'Orléans'
+        self.establishment.wifi_available = True
+        self.establishment.save()
+        self.time_slot.date += timedelta(days=1)
+        self.time_slot.save()
+        services.cancel_booking(booking)
+        TimeSlot.objects.create(
+            establishment=self.establishment, title='Soirée', date=self.time_slot.date,
+            start_time=time(18, 0), end_time=time(20, 0), total_capacity=3,
+        )
+        self.assertFacetsMatchRebuild()
+
+        self.establishment.delete()
+        self.assertFalse(SlotFacet.objects.exclude(slot_count=0, free_places=0).exists())
+
+    def test_cities_merge_case_and_accents(self):
+        other = create_time_slot(owner=self.establishment.owner)
+        other.establishment.city = 'paris'
+        other.establishment.save()
+
+        counts = facets.read({})
+        self.assertEqual([(city['key'], city['slots']) for city in counts['cities']], [('paris', 2)])
+        self.assertEqual(counts['types'], {'BAR': 2})
+
+    def test_city_filter_matches_facet_count(self):
+        other = create_time_slot(owner=self.establishment.owner)
+        self.establishment.city = 'Orléans'
+        self.establishment.save()
+        other.establishment.city = 'Orleans'
+        other.establishment.save()
+
+        self.assertEqual([(city['key'], city['slots']) for city in facets.read({})['cities']], [('orleans', 2)])
+        for spelling in ('Orléans', 'orleans', 'ORLEANS'):
+            response = self.client.get(reverse('index'), {'city': spelling})
+            self.assertEqual(len(response.context['time_slots']), 2, spelling)
+
+    def test_index_reads_facets_in_one_query(self):
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('index'))
+        facet_queries = [q['sql'] for q in context.captured_queries if 'core_slotfacet' in q['sql']]
+        self.assertEqual(len(facet_queries), 1)
+        self.assertFalse([q for q in context.captured_queries if 'DISTINCT' in q['sql']])
+
+
+class GeoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.time_slot = create_time_slot()
+        self.owner = self.time_slot.establishment.owner
+
+    def create_establishment(self, name, city, address='', **kwargs):
+        return Establishment.objects.create(
+            owner=self.owner, name=name, establishment_type='CAFE', address=address, city=city, **kwargs
+        )
+
+    def test_geocode_offline(self):
+        self.assertEqual(geo.geocode('', 'SAINT ETIENNE'), geo.geocode('', 'Saint-Étienne'))
+        self.assertEqual(geo.geocode('12 rue Oberkampf 75011', 'Paris'), (48.8591, 2.38))
+        self.assertIsNone(geo.geocode('', 'Atlantis'))
+
+    def test_establishment_located_on_save(self):
+        establishment = self.time_slot.establishment
+        self.assertTrue(establishment.geohash.startswith('u09t'))
+
+        establishment.city = 'Lyon'
+        establishment.save()
+        self.assertAlmostEqual(establishment.latitude, 45.764)
+        self.assertTrue(establishment.geohash.startswith(geo.encode_geohash(45.764, 4.8357, 5)))
+
+    def test_within_radius_and_nearest(self):
+        near = self.create_establishment('Belleville', 'Paris', '75020')
+        self.create_establishment('Boulogne', 'Boulogne-Billancourt')
+        self.create_establishment('Lyon', 'Lyon')
+        origin = (48.8566, 2.3522)
+
+        self.assertEqual(set(geo.within_radius(*origin, 2)), {self.time_slot.establishment.pk})
+        self.assertEqual(len(geo.within_radius(*origin, 10)), 3)
+        self.assertEqual([pk for pk, _ in geo.nearest(*origin, limit=2)], [self.time_slot.establishment.pk, near.pk])
+
+    def test_index_radius_and_power_filters(self):
+        far = self.create_establishment('Bouchon', 'Lyon', power_outlets=True)
+        TimeSlot.objects.create(
+            establishment=far, title='Lyon', date=self.time_slot.date,
+            start_time=time(9, 0), end_time=time(12, 0), total_capacity=4,
+        )
+
+        response = self.client.get(reverse('index'), {'lat': '48.857', 'lng': '2.352'})
+        self.assertEqual([slot.pk for slot in response.context['time_slots']], [self.time_slot.pk])
+        self.assertLess(response.context['time_slots'][0].distance_km, 1)
+
+        response = self.client.get(reverse('index'), {'near': 'Lyon', 'power': '1'})
+        self.assertEqual([slot.establishment for slot in response.context['time_slots']], [far])
+
+        response = self.client.get(reverse('nearby_establishments'), {'lat': '45.76', 'lng': '4.83', 'limit': 1})
+        self.assertEqual(response.json()['results'][0]['name'], 'Bouchon')
+
+
+class RecurrenceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.time_slot = create_time_slot()
+        self.establishment = self.time_slot.establishment
+        monday = self.time_slot.date + timedelta(days=7 - self.time_slot.date.weekday())
+        self.rule = recurrence.RecurrenceRule(
+            weekdays=recurrence.parse_weekdays('MO,WE,FR'),
+            time_ranges=recurrence.parse_time_ranges('09:00-12:00, 14:00-18:00'),
+            start_date=monday,
+            end_date=monday + timedelta(days=13),
+            exceptions=recurrence.parse_dates((monday + timedelta(days=2)).isoformat()),
+        )
+        self.slot_fields = {'title': 'Coworking', 'total_capacity': 4, 'price_info': 'Gratuit'}
+
+    def test_parse_errors(self):
+        with self.assertRaises(ValueError):
+            recurrence.parse_weekdays('MO,XX')
+        with self.assertRaises(ValueError):
+            recurrence.parse_time_ranges('09:00-12:00, 11:00-13:00')
+
+    def test_plan_skips_overlaps(self):
+        TimeSlot.objects.create(
+            establishment=self.establishment, title='Atelier', date=self.rule.start_date,
+            start_time=time(11, 0), end_time=time(15, 0), total_capacity=2,
+        )
+        result = recurrence.plan(self.establishment, self.rule, **self.slot_fields)
+        # 6 jours - 1 exception = 5 jours x 2 plages, dont 2 occupées par l'atelier
+        self.assertEqual(len(result.to_create), 8)
+        self.assertEqual(len(result.conflicts), 2)
+
+    def test_create_in_one_insert_keeps_indexes_in_sync(self):
+        with CaptureQueriesContext(connection) as context, self.captureOnCommitCallbacks(execute=True):
+            result = recurrence.create(self.establishment, self.rule, **self.slot_fields)
+        inserts = [q for q in context.captured_queries if q['sql'].startswith('INSERT INTO "core_timeslot"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(len(result.to_create), 10)
+
+        self.assertEqual(search.search_time_slots(TimeSlot.objects.all(), 'coworking').count(), 11)
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['total_count'], 11)
+
+        incremental = sorted(SlotFacet.objects.values_list('date', 'slot_count', 'free_places'))
+        facets.rebuild()
+        self.assertEqual(incremental, sorted(SlotFacet.objects.values_list('date', 'slot_count', 'free_places')))
+
+        # Relancer la génération ne crée pas de doublons
+        self.assertEqual(len(recurrence.create(self.establishment, self.rule, **self.slot_fields).to_create), 0)
+
+    def test_dashboard_preview_then_confirm(self):
+        self.client.force_login(self.establishment.owner)
+        data = {
+            'establishment': self.establishment.pk, 'title': 'Coworking', 'total_capacity': 4,
+            'price_info': 'Gratuit', 'start_date': self.rule.start_date, 'end_date': self.rule.end_date,
+            'weekdays': [0, 2, 4], 'time_ranges': '09:00-12:00', 'exceptions': '',
+        }
+        response = self.client.post(reverse('create_recurring_timeslots'), {**data, 'action': 'preview'})
+        self.assertEqual(len(response.context['preview'].to_create), 6)
+        self.assertEqual(TimeSlot.objects.count(), 1)
+
+        response = self.client.post(reverse('create_recurring_timeslots'), {**data, 'action': 'confirm'})
+        self.assertRedirects(response, reverse('establishment_dashboard'))
+        self.assertEqual(TimeSlot.objects.count(), 7)
+
+
+class SeatingCapacityTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.morning = create_time_slot(capacity=6)
+        self.establishment = self.morning.establishment
+        self.establishment.max_seating = 10
+        self.establishment.save()
+        self.user = CustomUser.objects.create(username='marie')
+
+    def overlapping_slot(self, capacity, start=time(11, 0), end=time(14, 0)):
+        return TimeSlot(
+            establishment=self.establishment, title='Midi', date=self.morning.date,
+            start_time=start, end_time=end, total_capacity=capacity, price_info='Gratuit',
+        )
+
+    def test_day_load_peak(self):
+        load = capacity.day_load([(time(9), time(12), 5), (time(11), time(14), 3)])
+        self.assertEqual(load.peak(time(8), time(9)), 0)
+        self.assertEqual(load.peak(time(10), time(12)), 8)
+        self.assertEqual(load.peak(time(12), time(18)), 3)
+
+    def test_overlapping_slots_limited_by_seating(self):
+        with self.assertRaisesMessage(ValidationError, 'Capacité de l\'établissement dépassée'):
+            self.overlapping_slot(5).full_clean()
+        self.overlapping_slot(4).full_clean()
+        # Créneau adjacent (12h-14h) : pas de chevauchement
+        self.overlapping_slot(10, start=time(12, 0)).full_clean()
+
+    def test_bookings_limited_by_seating(self):
+        noon = self.overlapping_slot(4)
+        noon.save()
+        self.establishment.max_seating = 7
+        self.establishment.save()
+
+        services.reserve_places(self.user, self.morning, 5)
+        result = services.reserve_places(self.user, noon, 4)
+        self.assertEqual(result.status, services.BookingResult.PARTIAL)
+        self.assertEqual(result.available, 2)
+
+    def test_bulk_validation_is_fast(self):
+        start = self.morning.date
+        time_slots = [
+            TimeSlot(
+                establishment=self.establishment, date=start + timedelta(days=day),
+                start_time=time(hour, 0), end_time=time(hour + 3, 0), total_capacity=4,
+            )
+            for day in range(500) for hour in range(8, 20, 2)
+        ]
+        began = timer.perf_counter()
+        rejected = capacity.over_capacity(self.establishment, time_slots)
+        self.assertLess(timer.perf_counter() - began, 1.0)
+        # Les créneaux se chevauchent deux à deux (4 + 4 <= 10), sauf le premier
+        # jour où la matinée existante (6 places) fait refuser 10h-13h
+        self.assertEqual(len(time_slots), 3000)
+        self.assertEqual(len(rejected), 1)
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        self.owner = CustomUser.objects.create(username='owner', user_type='ETABLISSEMENT')
+        self.client.force_login(self.owner)
+        self.customers = [CustomUser.objects.create(username=f'client{i}') for i in range(3)]
+
+    def add_venue(self, slots=3):
+        time_slot = create_time_slot(owner=self.owner, capacity=4)
+        for day in range(1, slots):
+            other = TimeSlot.objects.create(
+                establishment=time_slot.establishment, title='Après-midi',
+                date=time_slot.date + timedelta(days=day), start_time=time(14, 0), end_time=time(18, 0),
+                total_capacity=4,
+            )
+            for customer in self.customers:
+                services.reserve_places(customer, other, 1)
+        return time_slot.establishment
+
+    def dashboard_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('establishment_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return response, len(context.captured_queries)
+
+    def test_query_count_is_constant(self):
+        self.add_venue()
+        _, baseline = self.dashboard_queries()
+        for _ in range(4):
+            self.add_venue(slots=6)
+        response, queries = self.dashboard_queries()
+        self.assertEqual(queries, baseline)
+        self.assertEqual(len(response.context['establishments']), 5)
+
+    def test_venue_tiles(self):
+        establishment = self.add_venue()
+        response, _ = self.dashboard_queries()
+        tile = response.context['establishments'][0]
+        self.assertEqual(tile.pk, establishment.pk)
+        self.assertEqual((tile.window_slots, tile.window_bookings), (3, 6))
+        self.assertEqual((tile.window_reserved, tile.window_offered, tile.fill_rate), (6, 12, 50))
+
+        # Période sans créneau
+        later = date.today() + timedelta(days=60)
+        response = self.client.get(reverse('establishment_dashboard'), {'from': later.isoformat()})
+        self.assertEqual(response.context['establishments'][0].window_slots, 0)
+        self.assertEqual(response.context['time_slots'], [])
+
+
+class OccupancyTests(TestCase):
+    def setUp(self):
+        self.time_slot = create_time_slot(capacity=4)
+        self.establishment = self.time_slot.establishment
+        self.users = [CustomUser.objects.create(username=name) for name in ('marie', 'paul')]
+
+    def snapshot(self):
+        return (
+            sorted(DailyOccupancy.objects.values_list(
+                'date', 'hour', 'capacity', 'reserved', 'cancelled', 'completed', 'no_show',
+            )),
+            sorted(CustomerOccupancy.objects.values_list('user_id', 'month', 'bookings', 'places', 'cancelled')),
+        )
+
+    def test_incremental_rollups_match_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = services.reserve_places(self.users[0], self.time_slot, 3).booking
+        with self.captureOnCommitCallbacks(execute=True):
+            services.reserve_places(self.users[1], self.time_slot, 1)
+            services.cancel_booking(booking)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.time_slot.date += timedelta(days=40)
+            self.time_slot.save()
+
+        hours, customers = self.snapshot()
+        # 9h-12h : trois lignes horaires
+        self.assertEqual([row[1] for row in hours], [9, 10, 11])
+        self.assertEqual(hours[0][2:], (4, 1, 3, 0, 0))
+        self.assertEqual(len(customers), 2)
+
+        incremental = self.snapshot()
+        occupancy.rebuild()
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_analytics_reads_only_rollups(self):
+        services.reserve_places(self.users[0], self.time_slot, 2)
+        occupancy.rebuild()
+        self.client.force_login(self.establishment.owner)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('establishment_analytics'), {'to': self.time_slot.date.isoformat()})
+        self.assertFalse([q for q in context.captured_queries if 'core_booking' in q['sql']])
+        self.assertEqual(response.context['summary']['fill_rate'], 50)
+        self.assertEqual(response.context['top_customers'][0]['user__username'], 'marie')
+
+    def test_no_show_rate_counts_recorded_attendance(self):
+        past = TimeSlot.objects.create(
+            establishment=self.establishment, title='Hier', date=date.today() - timedelta(days=1),
+            start_time=time(9, 0), end_time=time(12, 0), total_capacity=4,
+        )
+        third = CustomUser.objects.create(username='lea')
+        bookings = [services.reserve_places(user, past, 1).booking for user in (*self.users, third)]
+        self.client.force_login(self.establishment.owner)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('record_attendance', args=[bookings[0].pk]), {'attended': '1'})
+            self.client.post(reverse('record_attendance', args=[bookings[1].pk]), {'attended': '0'})
+        # Reste à pointer sur le dashboard
+        response = self.client.get(reverse('establishment_dashboard'))
+        self.assertEqual(list(response.context['pending_attendance']), [bookings[2]])
+        # Le créneau de demain n'a pas commencé : pas de pointage
+        upcoming = services.reserve_places(third, self.time_slot, 1).booking
+        self.client.post(reverse('record_attendance', args=[upcoming.pk]), {'attended': '0'})
+
+        self.assertEqual(
+            sorted(Booking.objects.values_list('status', flat=True)),
+            ['COMPLETED', 'CONFIRMED', 'CONFIRMED', 'NO_SHOW'],
+        )
+        past.refresh_from_db()
+        self.assertEqual(past.reserved_places, 3)
+        # Une présence inconnue (encore confirmée) ne compte pas comme une absence
+        summary = occupancy.summary([self.establishment.pk], past.date, past.date)
+        self.assertEqual((summary['completed'], summary['no_show'], summary['no_show_rate']), (3, 3, 50))
+        self.assertEqual(summary['used'], 9)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='marie')
+        self.past = create_time_slot(date=date.today() - timedelta(days=1), capacity=4)
+        self.future = TimeSlot.objects.create(
+            establishment=self.past.establishment, title='Après-midi', date=date.today() + timedelta(days=1),
+            start_time=time(14, 0), end_time=time(18, 0), total_capacity=4,
+        )
+
+    def test_complete_past_bookings_in_chunks(self):
+        for _ in range(3):
+            services.reserve_places(self.user, self.past, 1)
+        services.reserve_places(self.user, self.future, 2)
+        # Hier : encore dans le délai de pointage des présences
+        self.assertEqual(archive.complete_past_bookings(), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(archive.complete_past_bookings(chunk_size=2, attendance_days=0), 3)
+        self.assertEqual(archive.complete_past_bookings(attendance_days=0), 0)
+
+        self.assertEqual(
+            sorted(Booking.objects.order_by().values_list('time_slot_id', 'status').distinct()),
+            sorted([(self.past.pk, 'COMPLETED'), (self.future.pk, 'CONFIRMED')]),
+        )
+        # Les places terminées restent comptées ; les rollups les voient terminées
+        self.past.refresh_from_db()
+        self.assertEqual(self.past.reserved_places, 3)
+        self.assertEqual(
+            set(DailyOccupancy.objects.filter(date=self.past.date).values_list('reserved', 'completed')),
+            {(0, 3)},
+        )
+
+    def test_archive_moves_old_slots_to_cold_tables(self):
+        cache.clear()
+        old = TimeSlot.objects.create(
+            establishment=self.past.establishment, title='Vieux créneau', date=date(2020, 3, 12),
+            start_time=time(9, 0), end_time=time(12, 0), total_capacity=4,
+        )
+        booking = services.reserve_places(self.user, old, 2).booking
+        occupancy.rebuild()
+
+        call_command('complete_past_bookings', '--retention-days', '30', stdout=StringIO())
+
+        self.assertFalse(TimeSlot.objects.filter(pk=old.pk).exists())
+        self.assertEqual(ArchivedTimeSlot.objects.get().pk, old.pk)
+        self.assertEqual(ArchivedBooking.objects.get().pk, booking.pk)
+        self.assertEqual(ArchivedBooking.objects.get().status, 'COMPLETED')
+        self.assertEqual(list(search.search_time_slots(TimeSlot.objects.all(), 'vieux')), [])
+        # L'historique des rollups survit à l'archivage et aux reconstructions
+        occupancy.rebuild()
+        self.assertEqual(DailyOccupancy.objects.filter(date=old.date).count(), 3)
+        self.assertTrue(TimeSlot.objects.filter(pk=self.past.pk).exists())
+
+    def test_recorded_no_show_is_kept(self):
+        absent, unknown = (services.reserve_places(self.user, self.past, 1).booking for _ in range(2))
+        services.record_attendance(absent, attended=False)
+        self.assertEqual(archive.complete_past_bookings(attendance_days=0), 1)
+        self.assertEqual(
+            dict(Booking.objects.values_list('pk', 'status')), {absent.pk: 'NO_SHOW', unknown.pk: 'COMPLETED'},
+        )
+
+    def test_waitlisted_past_slots(self):
+        old = TimeSlot.objects.create(
+            establishment=self.past.establishment, title='Vieux créneau', date=date(2020, 3, 12),
+            start_time=time(9, 0), end_time=time(12, 0), total_capacity=1,
+        )
+        waiting = CustomUser.objects.create(username='paul')
+        for time_slot in (old, self.past, self.future):
+            Waitlist.objects.create(time_slot=time_slot, user=waiting, number_of_places=1)
+        # Un créneau à archiver garde une inscription : pas de violation de clé étrangère
+        self.assertEqual(archive.archive_time_slots(date(2020, 4, 1)), (1, 0))
+        self.assertFalse(TimeSlot.objects.filter(pk=old.pk).exists())
+
+        self.assertEqual(archive.purge_past_waitlists(), 1)
+        self.assertEqual(list(Waitlist.objects.values_list('time_slot_id', flat=True)), [self.future.pk])
+
+
+class MyBookingsTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='marie')
+        self.upcoming = create_time_slot(title='Demain')
+        establishment = self.upcoming.establishment
+        self.past = [
+            TimeSlot.objects.create(
+                establishment=establishment, title=f'Passé {day}', date=date.today() - timedelta(days=day),
+                start_time=time(9, 0), end_time=time(12, 0), total_capacity=4,
+            )
+            for day in range(1, 6)
+        ]
+        services.reserve_places(self.user, self.upcoming, 1)
+        for time_slot in self.past:
+            services.reserve_places(self.user, time_slot, 1)
+        self.client.force_login(self.user)
+
+    def test_upcoming_and_paginated_history(self):
+        response = self.client.get(reverse('my_bookings'))
+        self.assertEqual([booking.time_slot for booking in response.context['bookings']], [self.upcoming])
+
+        seen, cursor = [], ''
+        with mock.patch('core.views.BOOKING_HISTORY_PAGE_SIZE', 2):
+            while True:
+                data = self.client.get(reverse('my_bookings_history'), {'cursor': cursor}).json()
+                seen += re.findall(r'Passé \d', data['html'])
+                cursor = data['next_cursor']
+                if not cursor:
+                    break
+        # Du plus récent au plus ancien, sans doublon ni trou
+        self.assertEqual(seen, [f'Passé {day}' for day in range(1, 6)])
+
+    def test_ics_export_is_streamed(self):
+        response = self.client.get(reverse('my_bookings_ics'))
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode()
+        self.assertTrue(content.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertEqual(content.count('BEGIN:VEVENT'), 6)
+        self.assertIn('SUMMARY:Demain', content)
+        self.assertTrue(all(len(line.encode()) <= 75 for line in content.split('\r\n')))
+
+
+class GroupBookingTests(TestCase):
+    def setUp(self):
+        self.company = CustomUser.objects.create(username='acme', user_type='ENTREPRISE')
+        self.establishment = create_time_slot().establishment
+        self.establishment.time_slots.all().delete()
+        # Quatre mardis consécutifs, à partir du prochain
+        tuesday = date.today() + timedelta(days=(1 - date.today().weekday()) % 7 or 7)
+        self.tuesdays = [
+            TimeSlot.objects.create(
+                establishment=self.establishment, title='Mardi', date=tuesday + timedelta(weeks=week),
+                start_time=time(9, 0), end_time=time(12, 0), total_capacity=8,
+            )
+            for week in range(4)
+        ]
+        self.client.force_login(self.company)
+
+    def post(self, payload):
+        return self.client.post(reverse('group_booking'), json.dumps(payload), content_type='application/json')
+
+    def test_books_every_selected_slot(self):
+        response = self.post({
+            'establishment': self.establishment.pk, 'weekdays': 'TU', 'number_of_places': 6,
+            'from': self.tuesdays[0].date.isoformat(), 'to': self.tuesdays[-1].date.isoformat(),
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['total_places'], 24)
+        self.assertEqual(
+            list(TimeSlot.objects.order_by('date').values_list('reserved_places', flat=True)), [6, 6, 6, 6]
+        )
+
+    def test_all_or_nothing(self):
+        services.reserve_places(CustomUser.objects.create(username='solo'), self.tuesdays[2], 5)
+        response = self.post({'time_slots': [slot.pk for slot in self.tuesdays], 'number_of_places': 6})
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['failures'], [
+            {'time_slot': self.tuesdays[2].pk, 'date': self.tuesdays[2].date.isoformat(), 'available': 3},
+        ])
+        self.assertFalse(Booking.objects.filter(user=self.company).exists())
+        self.assertEqual(
+            list(TimeSlot.objects.order_by('date').values_list('reserved_places', flat=True)), [0, 0, 5, 0]
+        )
+
+    def test_reserved_to_company_accounts(self):
+        self.client.force_login(CustomUser.objects.create(username='freelance', user_type='PARTICULIER'))
+        response = self.post({'time_slots': [self.tuesdays[0].pk], 'number_of_places': 2})
+        self.assertEqual(response.status_code, 403)
+
+
+class WaitlistTests(TestCase):
+    def setUp(self):
+        self.time_slot = create_time_slot(capacity=3)
+        self.holder, self.first, self.second = (
+            CustomUser.objects.create(username=name) for name in ('holder', 'first', 'second')
+        )
+        self.booking = services.reserve_places(self.holder, self.time_slot, 3).booking
+
+    def test_cancellation_promotes_in_fifo_order(self):
+        services.join_waitlist(self.first, self.time_slot, 1)
+        services.join_waitlist(self.second, self.time_slot, 2)
+
+        services.cancel_booking(self.booking)
+
+        self.time_slot.refresh_from_db()
+        self.assertEqual(self.time_slot.reserved_places, 3)
+        self.assertEqual(
+            sorted(Booking.objects.filter(status='CONFIRMED').values_list('user__username', 'number_of_places')),
+            [('first', 1), ('second', 2)],
+        )
+        self.assertFalse(Waitlist.objects.exists())
+        self.assertEqual(self.first.notifications.count(), 1)
+
+    def test_head_of_queue_is_not_overtaken(self):
+        services.cancel_booking(self.booking)
+        large = services.reserve_places(self.holder, self.time_slot, 2).booking
+        small = services.reserve_places(self.holder, self.time_slot, 1).booking
+        services.join_waitlist(self.first, self.time_slot, 2)
+        services.join_waitlist(self.second, self.time_slot, 1)
+
+        # Une place libre : la tête de file en veut deux, personne ne la double
+        services.cancel_booking(small)
+        self.assertEqual(Waitlist.objects.count(), 2)
+
+        services.cancel_booking(large)
+        self.assertFalse(Waitlist.objects.exists())
+        self.assertEqual(Booking.objects.get(user=self.first, status='CONFIRMED').number_of_places, 2)
+
+    def test_join_from_detail_page(self):
+        self.client.force_login(self.first)
+        self.client.post(reverse('join_waitlist', args=[self.time_slot.pk]), {'number_of_places': 2})
+        response = self.client.get(reverse('timeslot_detail', args=[self.time_slot.pk]))
+        self.assertEqual(response.context['waitlist_position'], 1)
+        self.assertContains(response, 'Quitter la liste d')
+
+
+class RealtimeTests(TestCase):
+    def setUp(self):
+        self.time_slot = create_time_slot(capacity=5)
+        self.user = CustomUser.objects.create(username='marie')
+
+    def book(self, places):
+        with self.captureOnCommitCallbacks(execute=True):
+            services.reserve_places(self.user, self.time_slot, places)
+
+    @mock.patch('core.views.SSE_MAX_SECONDS', 0.5)
+    async def test_stream_pushes_availability_changes(self):
+        response = await self.async_client.get(reverse('availability_stream'), {'slots': str(self.time_slot.pk)})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = aiter(response.streaming_content)
+        self.assertEqual(await anext(events), b'retry: 3000\n\n')
+        self.assertIn(b'"available": 5', await anext(events))
+
+        await sync_to_async(self.book)(2)
+        change = (await anext(events)).decode()
+        self.assertTrue(change.startswith('event: availability\n'))
+        self.assertIn('"available": 3', change)
+        self.assertIn('"delta": -2', change)
+
+        # Fin du flux (durée maximale), sans autre événement : l'abonnement est libéré
+        self.assertFalse([part async for part in events if not part.startswith(b':')])
+        self.assertFalse(realtime.get_broker().has_subscribers(realtime.channel_for(self.time_slot.pk)))
+
+    def test_stream_requires_asgi(self):
+        response = self.client.get(reverse('availability_stream'), {'slots': str(self.time_slot.pk)})
+        self.assertEqual(response.status_code, 204)
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        self.time_slot = create_time_slot(capacity=5)
+        self.later = TimeSlot.objects.create(
+            establishment=self.time_slot.establishment, title='Après-midi', date=self.time_slot.date,
+            start_time=time(14, 0), end_time=time(18, 0), total_capacity=8,
+        )
+
+    def test_field_selection_and_cursor_pagination(self):
+        response = self.client.get(reverse('api_time_slot_list'), {'fields': 'id,available', 'limit': 1})
+        data = response.json()
+        self.assertEqual(data['results'], [{'id': self.time_slot.pk, 'available': 5}])
+        self.assertIsNotNone(data['next_cursor'])
+
+        data = self.client.get(
+            reverse('api_time_slot_list'), {'fields': 'title', 'limit': 1, 'cursor': data['next_cursor']}
+        ).json()
+        self.assertEqual(data['results'], [{'title': 'Après-midi'}])
+        self.assertIsNone(data['next_cursor'])
+
+        response = self.client.get(reverse('api_time_slot_list'), {'fields': 'title,password'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_conditional_get(self):
+        url = reverse('api_time_slot_detail', args=[self.time_slot.pk])
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Une réservation ne touche que le compteur : l'ETag doit changer quand même
+        services.reserve_places(CustomUser.objects.create(username='marie'), self.time_slot, 2)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['result']['available'], 3)
+
+    def test_establishment_and_availability(self):
+        establishment = self.time_slot.establishment
+        data = self.client.get(reverse('api_establishment_list'), {'city': 'paris', 'fields': 'name'}).json()
+        self.assertEqual(data['results'], [{'name': establishment.name}])
+        response = self.client.get(reverse('api_availability'), {'ids': f'{self.later.pk},{self.time_slot.pk}'})
+        self.assertEqual([row['available'] for row in response.json()['results']], [5, 8])
+        self.assertEqual(self.client.get(reverse('api_availability'), {'ids': 'x'}).status_code, 400)
+
+
+class SlotCardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.time_slot = create_time_slot(capacity=5)
+
+    def render(self):
+        time_slots = list(TimeSlot.objects.select_related('establishment'))
+        return render_to_string('core/partials/timeslot_cards.html', {'time_slots': time_slots})
+
+    def test_card_is_served_from_cache_until_it_changes(self):
+        self.assertIn('Matinée', self.render())
+        # update() ne touche pas updated_at : la carte en cache est resservie
+        TimeSlot.objects.filter(pk=self.time_slot.pk).update(title='Renommé')
+        self.assertIn('Matinée', self.render())
+
+        self.time_slot.refresh_from_db()
+        self.time_slot.save()
+        self.assertIn('Renommé', self.render())
+
+        services.reserve_places(CustomUser.objects.create(username='marie'), self.time_slot, 2)
+        self.assertIn(f'data-available-for="{self.time_slot.pk}">3<', self.render())
+
+    def test_establishment_change_refreshes_card(self):
+        self.render()
+        establishment = self.time_slot.establishment
+        establishment.name = 'Le Nouveau Comptoir'
+        establishment.save()
+        self.assertIn('Le Nouveau Comptoir', self.render())
+
+
+@override_settings(IMAGE_PIPELINE_ASYNC=False)
+class ImagePipelineTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        storage_settings = override_settings(MEDIA_ROOT=media_root)
+        storage_settings.enable()
+        self.addCleanup(storage_settings.disable)
+        self.establishment = create_time_slot().establishment
+
+    def upload(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation : rotation de 90°
+        exif[0x010F] = 'PhoneMaker'
+        buffer = BytesIO()
+        Image.new('RGB', (1200, 600), 'red').save(buffer, 'JPEG', exif=exif)
+        return SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def test_upload_produces_stripped_thumbnails(self):
+        self.establishment.logo = self.upload()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.establishment.save()
+        self.establishment.refresh_from_db()
+        digest = self.establishment.logo_digest
+        self.assertEqual(len(digest), images.DIGEST_LENGTH)
+
+        with default_storage.open(images.rendition_name('logo', digest, 400, 'jpg')) as file, Image.open(file) as thumb:
+            # Rotation appliquée (portrait), métadonnées supprimées
+            self.assertEqual(thumb.size, (400, 800))
+            self.assertFalse(thumb.getexif())
+        self.assertTrue(default_storage.exists(images.rendition_name('logo', digest, 800, 'webp')))
+
+        html = Template('{% load responsive_images %}{% responsive_image e "logo" alt=e.name %}').render(
+            Context({'e': self.establishment})
+        )
+        self.assertIn('loading="lazy"', html)
+        self.assertIn(f'{digest}-160.webp 160w', html)
+
+    def test_saving_without_new_image_does_not_reprocess(self):
+        self.establishment.logo = self.upload()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.establishment.save()
+        self.establishment.refresh_from_db()
+        self.establishment.name = 'Le Comptoir du Marais'
+        with mock.patch.object(images, 'schedule') as schedule:
+            self.establishment.save()
+        schedule.assert_not_called()
+        self.assertTrue(Establishment.objects.get(pk=self.establishment.pk).logo_digest)
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class QueryBudgetTests(TestCase):
+    """Les vues critiques restent dans leur budget SQL quel que soit le volume."""
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.time_slot = create_time_slot()
+        self.owner = self.time_slot.establishment.owner
+        self.user = CustomUser.objects.create(username='marie', is_staff=True)
+        for index in range(30):
+            establishment = Establishment.objects.create(
+                owner=self.owner, name=f'Café {index}', establishment_type='CAFE',
+                address=f'{index} rue de Rivoli', city='Paris',
+            )
+            time_slot = TimeSlot.objects.create(
+                establishment=establishment, title=f'Créneau {index}', date=self.time_slot.date,
+                start_time=time(9, 0), end_time=time(12, 0), total_capacity=10,
+            )
+            Booking.objects.create(user=self.user, time_slot=time_slot, number_of_places=1)
+
+    def test_views_stay_within_budget(self):
+        self.client.get(reverse('index'))
+        self.client.get(reverse('timeslot_detail', args=[self.time_slot.pk]))
+        self.client.get(reverse('api_time_slot_list'))
+        self.client.force_login(self.user)
+        self.client.get(reverse('my_bookings'))
+        self.client.force_login(self.owner)
+        self.client.get(reverse('establishment_dashboard'))
+        self.assertEqual(len(metrics.samples()), 5)
+
+    @override_settings(QUERY_BUDGETS={'index': 1})
+    def test_exceeded_budget_fails(self):
+        with self.assertRaises(metrics.QueryBudgetExceeded):
+            self.client.get(reverse('index'))
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('index'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 302)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        body = response.content.decode()
+        self.assertIn('workandvibe_db_queries{view="index",quantile="0.95"}', body)
+        self.assertIn('workandvibe_request_duration_seconds_count{view="index"} 1', body)
+        self.assertIn('workandvibe_query_budget_exceeded{view="index"} 0', body)
+
+
+class GenerateDatasetTests(TestCase):
+    def test_generates_consistent_skewed_dataset(self):
+        call_command(
+            'generate_dataset', establishments=40, slots=400, bookings=1200, customers=60, chunk_size=150,
+            stdout=StringIO(),
+        )
+        self.assertEqual(Establishment.objects.count(), 40)
+        self.assertEqual(TimeSlot.objects.count(), 400)
+        self.assertGreater(Booking.objects.count(), 600)
+        # Compteurs calculés à la génération : aucun écart avec les réservations
+        call_command('rebuild_reserved_places', check=True, stdout=StringIO())
+        cities = Establishment.objects.values('city').annotate(total=Count('pk')).order_by('-total')
+        self.assertEqual(cities[0]['city'], 'Paris')
+        self.assertTrue(SlotFacet.objects.exists())
+
+
+@mock.patch.object(db, 'replica_alias', return_value='replica')
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        self.router = db.ReplicaRouter()
+
+    def test_reads_go_to_replica_until_the_request_writes(self, replica_alias):
+        self.assertIsNone(self.router.db_for_read(TimeSlot))
+        # Hors de la transaction du TestCase, qui garde sinon tout sur le primaire
+        with mock.patch.object(connection, 'in_atomic_block', False):
+            with db.read_replica():
+                self.assertEqual(self.router.db_for_read(TimeSlot), 'replica')
+                self.assertIsNone(self.router.db_for_read(Session))
+                self.assertEqual(self.router.db_for_write(Booking), 'default')
+                self.assertEqual(self.router.db_for_read(TimeSlot), 'default')
+            with db.routing(pinned=True), db.read_replica():
+                self.assertEqual(self.router.db_for_read(TimeSlot), 'default')
+        with db.read_replica():
+            self.assertEqual(self.router.db_for_read(TimeSlot), 'default')
+
+    def test_booking_pins_session_to_primary(self, replica_alias):
+        time_slot = create_time_slot()
+        self.client.force_login(CustomUser.objects.create(username='alice', user_type='PARTICULIER'))
+
+        response = self.client.get(reverse('index'))
+        self.assertNotIn(db.PIN_COOKIE, response.cookies)
+        response = self.client.post(reverse('book_timeslot', args=[time_slot.pk]), {'number_of_places': 1})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(db.PIN_COOKIE, response.cookies)
+
+        request = RequestFactory().get(reverse('my_bookings'))
+        request.COOKIES[db.PIN_COOKIE] = response.cookies[db.PIN_COOKIE].value
+        self.assertTrue(db.is_pinned(request))
+        request.COOKIES[db.PIN_COOKIE] = str(timer.time() - 1)
+        self.assertFalse(db.is_pinned(request))
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.time_slot = create_time_slot(capacity=5)
+
+    def request(self, path, **params):
+        request = AsyncRequestFactory().get(path, params)
+        request.user = AnonymousUser()
+
+        async def auser():
+            return request.user
+        request.auser = auser
+        return request
+
+    async def test_index_matches_sync_view(self):
+        expected = await sync_to_async(self.client.get)(reverse('index'), {'city': 'Paris'})
+        # Premier appel : page et COUNT en parallèle ; second : entrée en cache, relue par aiterator
+        for _ in range(2):
+            response = await views.index_async(self.request(reverse('index'), city='Paris'))
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, 'Matinée Coworking')
+            self.assertContains(response, f'{expected.context["total_count"]}</span> créneau(x)')
+
+    async def test_timeslot_detail_and_availability(self):
+        response = await views.timeslot_detail_async(self.request('/'), pk=self.time_slot.pk)
+        self.assertContains(response, 'Le Comptoir')
+        with self.assertRaises(Http404):
+            await views.timeslot_detail_async(self.request('/'), pk=self.time_slot.pk + 1)
+
+        response = await api.availability_async(self.request('/', ids=str(self.time_slot.pk)))
+        self.assertEqual(json.loads(response.content)['results'], [
+            {'time_slot': self.time_slot.pk, 'available': 5, 'reserved': 0, 'total': 5},
+        ])
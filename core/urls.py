@@ -1,16 +1,29 @@
+from django.conf import settings
 from django.urls import path
 from django.contrib.auth import views as auth_views
-from . import views
+from . import api, views
+
+# Vues async sous ASGI (voir settings.ASYNC_VIEWS)
+ASYNC = settings.ASYNC_VIEWS
 
 urlpatterns = [
     # Page d'accueil et créneaux
-    path('', views.index, name='index'),
-    path('timeslot/<int:pk>/', views.timeslot_detail, name='timeslot_detail'),
+    path('', views.index_async if ASYNC else views.index, name='index'),
+    path('timeslots/more/', views.index_more, name='index_more'),
+    path('establishments/nearby/', views.nearby_establishments, name='nearby_establishments'),
+    path('timeslot/<int:pk>/', views.timeslot_detail_async if ASYNC else views.timeslot_detail, name='timeslot_detail'),
+    path('timeslots/availability/stream/', views.availability_stream, name='availability_stream'),
     path('timeslot/<int:pk>/book/', views.book_timeslot, name='book_timeslot'),
+    path('timeslot/<int:pk>/waitlist/', views.join_waitlist, name='join_waitlist'),
+    path('timeslot/<int:pk>/waitlist/leave/', views.leave_waitlist, name='leave_waitlist'),
     
     # Réservations
     path('my-bookings/', views.my_bookings, name='my_bookings'),
+    path('my-bookings/history/', views.my_bookings_history, name='my_bookings_history'),
+    path('my-bookings/calendar.ics', views.my_bookings_ics, name='my_bookings_ics'),
     path('booking/<int:pk>/cancel/', views.cancel_booking, name='cancel_booking'),
+    path('bookings/group/', views.group_booking, name='group_booking'),
+    path('notifications/', views.notification_list, name='notifications'),
     
     # Authentification
     path('register/', views.register, name='register'),
@@ -20,11 +33,24 @@ urlpatterns = [
     
     # Dashboard établissement
     path('establishment/dashboard/', views.establishment_dashboard, name='establishment_dashboard'),
+    path('establishment/analytics/', views.establishment_analytics, name='establishment_analytics'),
+    path('booking/<int:pk>/attendance/', views.record_attendance, name='record_attendance'),
     path('establishment/create/', views.create_establishment, name='create_establishment'),
     path('establishment/<int:pk>/edit/', views.edit_establishment, name='edit_establishment'),
     path('timeslot/create/', views.create_timeslot, name='create_timeslot'),
+    path('timeslot/recurring/', views.create_recurring_timeslots, name='create_recurring_timeslots'),
     path('timeslot/<int:pk>/edit/', views.edit_timeslot, name='edit_timeslot'),
     
+    # API JSON en lecture seule
+    path('api/v1/timeslots/', api.time_slot_list, name='api_time_slot_list'),
+    path('api/v1/timeslots/<int:pk>/', api.time_slot_detail, name='api_time_slot_detail'),
+    path('api/v1/establishments/', api.establishment_list, name='api_establishment_list'),
+    path('api/v1/establishments/<int:pk>/', api.establishment_detail, name='api_establishment_detail'),
+    path('api/v1/availability/', api.availability_async if ASYNC else api.availability, name='api_availability'),
+    
+    # Mesures de performance (staff)
+    path('metrics', views.metrics_view, name='metrics'),
+    
     # Landing
     path('landing/', views.landing, name='landing'),
 ]
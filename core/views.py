@@ -1,76 +1,458 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
 from django.contrib.auth import login
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q
-from datetime import date, datetime
-from .models import TimeSlot, Establishment, Booking, CustomUser
-from .forms import CustomUserCreationForm, BookingForm, TimeSlotForm, EstablishmentForm
+from django.views.decorators.http import require_POST
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+import asyncio
+import json
+from datetime import date, datetime, time, timedelta
+from .models import TimeSlot, Establishment, Booking, CustomUser, Waitlist
+from .forms import CustomUserCreationForm, BookingForm, TimeSlotForm, EstablishmentForm, RecurringTimeSlotForm
+from . import services
+from .pagination import paginate_time_slots, paginate_ranked, paginate_booking_history
+from . import archive, db, facets, geo, ical, listing_cache, metrics, notifications, occupancy, realtime, recurrence, search
 
+DEFAULT_RADIUS_KM = 2
+MAX_RADIUS_KM = 50
+RADIUS_CHOICES = (1, 2, 5, 10, 25)
 
-def index(request):
+DASHBOARD_DEFAULT_DAYS = 14
+DASHBOARD_MAX_DAYS = 92
+DASHBOARD_MAX_SLOTS = 200
+
+ANALYTICS_DEFAULT_DAYS = 84
+ANALYTICS_MAX_DAYS = 366
+
+BOOKING_HISTORY_PAGE_SIZE = 20
+
+MAX_GROUP_SLOTS = 100
+
+NOTIFICATION_PAGE_SIZE = 50
+
+SSE_MAX_SLOTS = 100
+SSE_HEARTBEAT_SECONDS = 15
+SSE_MAX_SECONDS = 300
+SSE_RETRY_MS = 3000
+
+
+def _listing_filters(params):
+    """Valeurs des filtres GET de la page d'accueil (sans requête SQL)."""
+    return {
+        'search_query': params.get('search', ''),
+        'city_filter': params.get('city', ''),
+        'establishment_type_filter': params.get('type', ''),
+        'date_filter': params.get('date', ''),
+        'wifi_filter': params.get('wifi', ''),
+        'power_filter': params.get('power', ''),
+        'now_filter': params.get('now', ''),
+        'near_filter': params.get('near', ''),
+        **_position_filters(params),
+    }
+
+
+def _filter_time_slots(params):
     """
-    Page d'accueil avec la liste des créneaux disponibles et les filtres.
+    Applique les filtres GET de la page d'accueil aux créneaux futurs.
+    
+    Retourne le queryset filtré et le dictionnaire des valeurs de filtres.
     """
     # Récupérer tous les créneaux futurs
     time_slots = TimeSlot.objects.filter(date__gte=date.today()).select_related('establishment')
     
-    # Filtres
-    search_query = request.GET.get('search', '')
-    city_filter = request.GET.get('city', '')
-    establishment_type_filter = request.GET.get('type', '')
-    date_filter = request.GET.get('date', '')
-    wifi_filter = request.GET.get('wifi', '')
+    filters = _listing_filters(params)
+    search_query = filters['search_query']
     
     if search_query:
+        # Index plein texte (FTS5 / tsvector), annoté de `search_rank`
+        time_slots = search.search_time_slots(time_slots, search_query)
+    
+    if filters['city_filter']:
+        # Même clé normalisée que les facettes : « Orleans » trouve aussi « Orléans »
+        time_slots = time_slots.filter(establishment__city_key__contains=facets.city_key(filters['city_filter']))
+    
+    if filters['establishment_type_filter']:
+        time_slots = time_slots.filter(establishment__establishment_type=filters['establishment_type_filter'])
+    
+    if filters['date_filter']:
+        time_slots = time_slots.filter(date=filters['date_filter'])
+    
+    if filters['wifi_filter']:
+        time_slots = time_slots.filter(establishment__wifi_available=True)
+    
+    if filters['power_filter']:
+        time_slots = time_slots.filter(establishment__power_outlets=True)
+    
+    if filters['now_filter']:
+        # Créneaux en cours, avec encore de la place
+        now = timezone.localtime()
         time_slots = time_slots.filter(
-            Q(title__icontains=search_query) |
-            Q(establishment__name__icontains=search_query) |
-            Q(establishment__city__icontains=search_query)
+            date=now.date(),
+            start_time__lte=now.time(),
+            end_time__gt=now.time(),
+            reserved_places__lt=F('total_capacity'),
         )
     
-    if city_filter:
-        time_slots = time_slots.filter(establishment__city__icontains=city_filter)
+    point = _search_point(filters)
+    if point is not None:
+        # Rayon : cellules geohash indexées, puis distance exacte
+        nearby = geo.within_radius(*point, filters['radius_filter'])
+        time_slots = time_slots.filter(establishment_id__in=list(nearby))
     
-    if establishment_type_filter:
-        time_slots = time_slots.filter(establishment__establishment_type=establishment_type_filter)
+    return time_slots, filters
+
+
+def _position_filters(params):
+    """
+    Position de l'utilisateur (lat/lng du navigateur) et rayon en km.
     
-    if date_filter:
-        time_slots = time_slots.filter(date=date_filter)
+    Les coordonnées sont arrondies à ~100 m pour que des positions voisines
+    partagent la même entrée du cache de listing.
+    """
+    position = {'lat_filter': '', 'lng_filter': '', 'radius_filter': DEFAULT_RADIUS_KM}
+    try:
+        radius = float(params.get('radius') or DEFAULT_RADIUS_KM)
+        position['radius_filter'] = min(max(radius, 0.1), MAX_RADIUS_KM)
+        latitude, longitude = float(params.get('lat', '')), float(params.get('lng', ''))
+    except ValueError:
+        return position
+    if -90 <= latitude <= 90 and -180 <= longitude <= 180:
+        position['lat_filter'] = f'{latitude:.3f}'
+        position['lng_filter'] = f'{longitude:.3f}'
+    return position
+
+
+def _search_point(filters):
+    """Centre de la recherche par rayon : position du navigateur, sinon lieu saisi."""
+    if filters['lat_filter'] and filters['lng_filter']:
+        return float(filters['lat_filter']), float(filters['lng_filter'])
+    if filters['near_filter']:
+        return geo.geocode(filters['near_filter'], filters['near_filter'])
+    return None
+
+
+def _paginate(time_slots, filters, cursor=None):
+    """Résultats de recherche par pertinence, sinon par date (curseur keyset)."""
+    if filters['search_query']:
+        return paginate_ranked(time_slots, cursor=cursor)
+    return paginate_time_slots(time_slots, cursor=cursor)
+
+
+def _listing_lookup(params, cursor=None):
+    """Filtres GET, queryset filtré, clé et entrée (ou None) du cache de listing."""
+    time_slots, filters = _filter_time_slots(params)
+    key = listing_cache.listing_key(filters, cursor)
+    return time_slots, filters, key, listing_cache.get_entry(key)
+
+
+def _set_distances(page, filters):
+    """Distance au centre de la recherche par rayon, pour l'affichage."""
+    point = _search_point(filters)
+    if point is not None:
+        for slot in page:
+            establishment = slot.establishment
+            if establishment.latitude is not None and establishment.longitude is not None:
+                slot.distance_km = geo.haversine_km(*point, establishment.latitude, establishment.longitude)
+
+
+def _listing_page(params, cursor=None):
+    """
+    Page de créneaux pour les filtres GET, via le cache de listing.
     
-    if wifi_filter:
-        time_slots = time_slots.filter(establishment__wifi_available=True)
+    En cas de succès, seuls les créneaux de la page sont relus par clé primaire ;
+    les jointures, filtres et le COUNT ne sont exécutés qu'en cas d'échec.
+    """
+    time_slots, filters, key, entry = _listing_lookup(params, cursor)
     
-    # Obtenir les villes disponibles pour le filtre
-    cities = Establishment.objects.values_list('city', flat=True).distinct()
+    if entry is None:
+        page, next_cursor = _paginate(time_slots, filters, cursor=cursor)
+        entry = {
+            'ids': [slot.pk for slot in page],
+            'next_cursor': next_cursor,
+            'total_count': time_slots.count() if cursor is None else None,
+        }
+        listing_cache.set_entry(key, entry)
+    else:
+        slots = TimeSlot.objects.select_related('establishment').in_bulk(entry['ids'])
+        page = [slots[pk] for pk in entry['ids'] if pk in slots]
     
-    context = {
-        'time_slots': time_slots,
-        'cities': cities,
-        'search_query': search_query,
-        'city_filter': city_filter,
-        'establishment_type_filter': establishment_type_filter,
-        'date_filter': date_filter,
-        'wifi_filter': wifi_filter,
+    _set_distances(page, filters)
+    return page, entry, filters
+
+
+async def _alisting_page(params, cursor=None):
+    """
+    Variante async de `_listing_page`. En cas d'échec du cache, la page
+    puis le COUNT sont calculés ; en cas de succès, la page est relue par
+    `aiterator`.
+    
+    Les requêtes se suivent : l'ORM async de Django exécute toutes celles
+    d'une requête HTTP sur le même thread, une à la fois, et les lancer par
+    asyncio.gather n'en ferait pas chevaucher deux.
+    """
+    time_slots, filters, key, entry = await sync_to_async(_listing_lookup)(params, cursor)
+    
+    if entry is None:
+        page, next_cursor = await sync_to_async(_paginate)(time_slots, filters, cursor=cursor)
+        total_count = await time_slots.acount() if cursor is None else None
+        entry = {'ids': [slot.pk for slot in page], 'next_cursor': next_cursor, 'total_count': total_count}
+        await sync_to_async(listing_cache.set_entry)(key, entry)
+    else:
+        slots = {
+            slot.pk: slot
+            async for slot in TimeSlot.objects.select_related('establishment').filter(pk__in=entry['ids']).aiterator()
+        }
+        page = [slots[pk] for pk in entry['ids'] if pk in slots]
+    
+    _set_distances(page, filters)
+    return page, entry, filters
+
+
+def _index_context(params, page, entry, filters, facet_counts):
+    return {
+        'time_slots': page,
+        'total_count': entry['total_count'],
+        'next_cursor': entry['next_cursor'],
+        'query_string': _query_string_without_cursor(params),
+        'cities': facet_counts['cities'],
+        'selected_city_key': facets.city_key(filters['city_filter']),
+        'type_facets': [
+            (value, label, facet_counts['types'].get(value, 0))
+            for value, label in Establishment.ESTABLISHMENT_TYPE_CHOICES
+        ],
+        'wifi_count': facet_counts['wifi']['slots'],
+        'radius_choices': RADIUS_CHOICES,
+        **filters,
     }
+
+
+@db.replica_reads
+def index(request):
+    """
+    Page d'accueil avec la liste des créneaux disponibles et les filtres.
+    
+    Les créneaux sont paginés par curseur : la première page est rendue ici,
+    les suivantes sont chargées par `index_more`.
+    """
+    page, entry, filters = _listing_page(request.GET)
     
+    # Facettes (villes, types, WiFi) avec compteurs, lues dans SlotFacet
+    facet_counts = listing_cache.facet_counts(filters)
+    
+    context = _index_context(request.GET, page, entry, filters, facet_counts)
     return render(request, 'core/index.html', context)
 
 
+@db.replica_reads
+async def index_async(request):
+    """
+    Variante async de `index`, servie sous ASGI (voir settings.ASYNC_VIEWS).
+    
+    La page de créneaux (et son COUNT) puis les facettes sont lues l'une
+    après l'autre (voir `_alisting_page`). Le rendu, qui peut lire
+    l'utilisateur et ses notifications, passe par sync_to_async.
+    """
+    page, entry, filters = await _alisting_page(request.GET)
+    facet_counts = await sync_to_async(listing_cache.facet_counts)(filters)
+    
+    context = _index_context(request.GET, page, entry, filters, facet_counts)
+    return await sync_to_async(render)(request, 'core/index.html', context)
+
+
+@db.replica_reads
+def index_more(request):
+    """
+    Fragment JSON « Charger plus » : page suivante de créneaux pour un curseur.
+    """
+    page, entry, filters = _listing_page(request.GET, cursor=request.GET.get('cursor'))
+    
+    html = render_to_string('core/partials/timeslot_cards.html', {'time_slots': page}, request=request)
+    return JsonResponse({
+        'html': html,
+        'count': len(page),
+        'next_cursor': entry['next_cursor'],
+    })
+
+
+@db.replica_reads
+def nearby_establishments(request):
+    """
+    JSON : les établissements les plus proches d'un point (`lat`, `lng`, `limit`).
+    """
+    try:
+        latitude, longitude = float(request.GET['lat']), float(request.GET['lng'])
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 50)
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'Paramètres lat et lng requis.'}, status=400)
+    
+    nearest = geo.nearest(latitude, longitude, limit=limit, max_radius_km=MAX_RADIUS_KM)
+    establishments = Establishment.objects.in_bulk([pk for pk, _ in nearest])
+    return JsonResponse({
+        'results': [
+            {
+                'id': pk,
+                'name': establishments[pk].name,
+                'city': establishments[pk].city,
+                'distance_km': round(distance, 2),
+                'power_outlets': establishments[pk].power_outlets,
+            }
+            for pk, distance in nearest if pk in establishments
+        ],
+    })
+
+
+def _sse(data, event='availability'):
+    return f'event: {event}\ndata: {data}\n\n'
+
+
+async def _availability_events(time_slot_ids):
+    """
+    Flux SSE : état initial des créneaux, puis chaque changement publié.
+    
+    L'abonnement précède la lecture initiale : aucun changement ne peut
+    tomber entre les deux. Un commentaire est envoyé régulièrement pour
+    garder la connexion ouverte, et le flux se termine après
+    SSE_MAX_SECONDS (le navigateur se reconnecte de lui-même).
+    """
+    loop = asyncio.get_running_loop()
+    subscription = realtime.get_broker().subscribe(realtime.channel_for(pk) for pk in time_slot_ids)
+    try:
+        yield f'retry: {SSE_RETRY_MS}\n\n'
+        for message in await realtime.aavailability(time_slot_ids):
+            yield _sse(json.dumps(message))
+        deadline = loop.time() + SSE_MAX_SECONDS
+        while loop.time() < deadline:
+            message = await subscription.get(min(SSE_HEARTBEAT_SECONDS, deadline - loop.time()))
+            yield _sse(message) if message is not None else ': ping\n\n'
+    finally:
+        subscription.close()
+
+
+async def availability_stream(request):
+    """
+    Server-Sent Events : places disponibles des créneaux `slots` (ids
+    séparés par des virgules), en direct.
+    
+    Nécessite un serveur ASGI (uvicorn, daphne) ; servie en WSGI, la vue
+    répond 204, ce qui arrête les reconnexions du navigateur : la page
+    reste simplement statique.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    try:
+        time_slot_ids = sorted({int(pk) for pk in request.GET.get('slots', '').split(',') if pk.strip()})
+    except ValueError:
+        return JsonResponse({'error': 'Paramètre slots invalide.'}, status=400)
+    if not time_slot_ids:
+        return JsonResponse({'error': 'Paramètre slots requis.'}, status=400)
+    
+    response = StreamingHttpResponse(
+        _availability_events(time_slot_ids[:SSE_MAX_SLOTS]), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Pas de mise en tampon par un proxy nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _query_string_without_cursor(params):
+    """Paramètres GET courants, sans le curseur, pour l'URL « Charger plus »."""
+    params = params.copy()
+    params.pop('cursor', None)
+    return params.urlencode()
+
+
+@db.replica_reads
 def timeslot_detail(request, pk):
     """
     Page de détail d'un créneau.
     """
     time_slot = get_object_or_404(TimeSlot, pk=pk)
     
+    waitlist_entry = None
+    if request.user.is_authenticated and not time_slot.is_available():
+        waitlist_entry = Waitlist.objects.filter(time_slot=time_slot, user=request.user).first()
+    
     context = {
         'time_slot': time_slot,
         'available_places': time_slot.available_capacity(),
+        'waitlist_entry': waitlist_entry,
+        'waitlist_position': services.waitlist_position(waitlist_entry) if waitlist_entry else None,
     }
     
     return render(request, 'core/timeslot_detail.html', context)
 
 
+@db.replica_reads
+async def timeslot_detail_async(request, pk):
+    """
+    Variante async de `timeslot_detail` (voir settings.ASYNC_VIEWS).
+    """
+    time_slot = await aget_object_or_404(TimeSlot.objects.select_related('establishment'), pk=pk)
+    user = await request.auser()
+    
+    waitlist_entry = None
+    if user.is_authenticated and not time_slot.is_available():
+        waitlist_entry = await Waitlist.objects.filter(time_slot=time_slot, user=user).afirst()
+    
+    context = {
+        'time_slot': time_slot,
+        'available_places': time_slot.available_capacity(),
+        'waitlist_entry': waitlist_entry,
+        'waitlist_position': await sync_to_async(services.waitlist_position)(waitlist_entry) if waitlist_entry else None,
+    }
+    
+    return await sync_to_async(render)(request, 'core/timeslot_detail.html', context)
+
+
+@login_required
+@require_POST
+def join_waitlist(request, pk):
+    """
+    Inscription sur la liste d'attente d'un créneau complet.
+    """
+    time_slot = get_object_or_404(TimeSlot, pk=pk, date__gte=date.today())
+    if request.user.user_type == 'ETABLISSEMENT':
+        messages.error(request, 'En tant qu\'établissement, vous ne pouvez pas réserver de créneaux.')
+        return redirect('timeslot_detail', pk=pk)
+    
+    try:
+        number_of_places = int(request.POST.get('number_of_places', 1))
+    except ValueError:
+        number_of_places = 0
+    if not 1 <= number_of_places <= time_slot.total_capacity:
+        messages.error(request, f'Indiquez entre 1 et {time_slot.total_capacity} place(s).')
+        return redirect('timeslot_detail', pk=pk)
+    
+    entry = services.join_waitlist(request.user, time_slot, number_of_places, notes=request.POST.get('notes') or None)
+    # Des places ont pu se libérer entre l'affichage et l'inscription
+    if services.promote_waitlist(time_slot) and not Waitlist.objects.filter(pk=entry.pk).exists():
+        messages.success(request, 'Des places viennent de se libérer : votre réservation est confirmée.')
+        return redirect('my_bookings')
+    messages.success(
+        request, f'Vous êtes en position {services.waitlist_position(entry)} sur la liste d\'attente.'
+    )
+    return redirect('timeslot_detail', pk=pk)
+
+
+@login_required
+@require_POST
+def leave_waitlist(request, pk):
+    """
+    Désinscription de la liste d'attente d'un créneau.
+    """
+    Waitlist.objects.filter(time_slot_id=pk, user=request.user).delete()
+    messages.success(request, 'Vous avez quitté la liste d\'attente.')
+    return redirect('timeslot_detail', pk=pk)
+
+
 @login_required
 def book_timeslot(request, pk):
     """
@@ -86,20 +468,21 @@ def book_timeslot(request, pk):
     if request.method == 'POST':
         form = BookingForm(request.POST, time_slot=time_slot)
         if form.is_valid():
-            booking = form.save(commit=False)
-            booking.user = request.user
-            booking.time_slot = time_slot
-            
-            # Vérifier la disponibilité avant de sauvegarder
-            if not time_slot.is_available(booking.number_of_places):
-                messages.error(request, f'Seulement {time_slot.available_capacity()} place(s) disponible(s).')
+            # Réservation atomique : contrôle de capacité et écriture en une seule opération
+            result = services.reserve_places(
+                request.user,
+                time_slot,
+                form.cleaned_data['number_of_places'],
+                notes=form.cleaned_data.get('notes'),
+            )
+            if result.confirmed:
+                messages.success(request, 'Réservation confirmée ! Rendez-vous sur place.')
+                return redirect('my_bookings')
+            elif result.status == services.BookingResult.SOLD_OUT:
+                messages.error(request, 'Ce créneau est complet : inscrivez-vous sur la liste d\'attente.')
+                return redirect('timeslot_detail', pk=pk)
             else:
-                try:
-                    booking.save()
-                    messages.success(request, 'Réservation confirmée ! Rendez-vous sur place.')
-                    return redirect('my_bookings')
-                except Exception as e:
-                    messages.error(request, f'Erreur lors de la réservation : {str(e)}')
+                messages.error(request, f'Seulement {result.available} place(s) disponible(s).')
     else:
         form = BookingForm(time_slot=time_slot)
     
@@ -112,31 +495,96 @@ def book_timeslot(request, pk):
     return render(request, 'core/book_timeslot.html', context)
 
 
+def _upcoming_bookings(user):
+    """Réservations confirmées d'un utilisateur sur des créneaux à partir d'aujourd'hui."""
+    return Booking.objects.filter(user=user, status='CONFIRMED', time_slot__date__gte=date.today())
+
+
 @login_required
 def my_bookings(request):
     """
-    Liste des réservations de l'utilisateur connecté.
+    Réservations à venir de l'utilisateur connecté.
+    
+    L'historique (créneaux passés, réservations annulées) n'est pas lu ici :
+    il est chargé à la demande, page par page, par `my_bookings_history`.
     """
-    bookings = Booking.objects.filter(user=request.user).select_related('time_slot', 'time_slot__establishment')
+    upcoming = _upcoming_bookings(request.user).select_related(
+        'time_slot', 'time_slot__establishment'
+    ).order_by('time_slot__date', 'time_slot__start_time', 'pk')
     
     context = {
-        'bookings': bookings,
+        'bookings': upcoming,
     }
     
     return render(request, 'core/my_bookings.html', context)
 
 
+@login_required
+def notification_list(request):
+    """
+    Notifications in-app de l'utilisateur ; leur affichage les marque lues.
+    """
+    items = list(request.user.notifications.all()[:NOTIFICATION_PAGE_SIZE])
+    notifications.mark_all_read(request.user)
+    
+    context = {
+        'notifications': items,
+    }
+    
+    return render(request, 'core/notifications.html', context)
+
+
+@login_required
+def my_bookings_history(request):
+    """
+    Fragment JSON de l'historique : réservations passées ou annulées, de la
+    plus récente à la plus ancienne, par pages de curseur.
+    """
+    history = Booking.objects.filter(user=request.user).exclude(
+        status='CONFIRMED', time_slot__date__gte=date.today()
+    ).select_related('time_slot', 'time_slot__establishment')
+    page, next_cursor = paginate_booking_history(
+        history, cursor=request.GET.get('cursor'), page_size=BOOKING_HISTORY_PAGE_SIZE
+    )
+    
+    html = render_to_string(
+        'core/partials/booking_cards.html', {'bookings': page, 'history': True}, request=request
+    )
+    return JsonResponse({
+        'html': html,
+        'count': len(page),
+        'next_cursor': next_cursor,
+    })
+
+
+@login_required
+def my_bookings_ics(request):
+    """
+    Export iCalendar des réservations de l'utilisateur, servi en flux.
+    """
+    response = StreamingHttpResponse(
+        ical.calendar_lines(Booking.objects.filter(user=request.user)),
+        content_type='text/calendar; charset=utf-8',
+    )
+    response['Content-Disposition'] = 'attachment; filename="mes-reservations.ics"'
+    return response
+
+
 @login_required
 def cancel_booking(request, pk):
     """
     Annuler une réservation.
     """
-    booking = get_object_or_404(Booking, pk=pk, user=request.user)
+    booking = get_object_or_404(Booking.objects.select_related('time_slot'), pk=pk, user=request.user)
     
-    if request.method == 'POST':
-        booking.status = 'CANCELLED'
-        booking.save()
-        messages.success(request, 'Réservation annulée.')
+    try:
+        if request.method == 'POST':
+            services.cancel_booking(booking)
+            messages.success(request, 'Réservation annulée.')
+            return redirect('my_bookings')
+        services.check_cancellable(booking)
+    except services.CancellationRefused as error:
+        messages.error(request, str(error))
         return redirect('my_bookings')
     
     context = {
@@ -146,6 +594,85 @@ def cancel_booking(request, pk):
     return render(request, 'core/cancel_booking.html', context)
 
 
+def _group_time_slots(payload):
+    """
+    Créneaux visés par une réservation de groupe : liste d'ids
+    (`time_slots`), ou sélection dans un établissement (`establishment`,
+    `from`, `to`, et en option `weekdays` « TU » et `start_time` « 09:00 »).
+    Lève ValueError si la demande est invalide.
+    """
+    time_slots = TimeSlot.objects.filter(date__gte=date.today()).select_related('establishment')
+    if 'time_slots' in payload:
+        ids = {int(pk) for pk in payload['time_slots']}
+        time_slots = list(time_slots.filter(pk__in=ids))
+        if len(time_slots) != len(ids):
+            raise ValueError('Créneau introuvable ou passé.')
+    else:
+        time_slots = time_slots.filter(
+            establishment_id=int(payload['establishment']),
+            date__gte=date.fromisoformat(payload['from']),
+            date__lte=date.fromisoformat(payload['to']),
+        )
+        if payload.get('weekdays'):
+            weekdays = recurrence.parse_weekdays(payload['weekdays'])
+            time_slots = time_slots.filter(date__iso_week_day__in=[weekday + 1 for weekday in weekdays])
+        if payload.get('start_time'):
+            time_slots = time_slots.filter(start_time=time.fromisoformat(payload['start_time']))
+        time_slots = list(time_slots[:MAX_GROUP_SLOTS + 1])
+    if not time_slots:
+        raise ValueError('Aucun créneau ne correspond à la demande.')
+    if len(time_slots) > MAX_GROUP_SLOTS:
+        raise ValueError(f'{MAX_GROUP_SLOTS} créneaux maximum par réservation de groupe.')
+    return time_slots
+
+
+@login_required
+@require_POST
+def group_booking(request):
+    """
+    API JSON de réservation de groupe (comptes entreprise) : N places sur
+    plusieurs créneaux, tout ou rien, avec un résultat consolidé.
+    
+    Corps : {"time_slots": [ids] ou "establishment", "from", "to",
+    "weekdays", "start_time" ; "number_of_places": N, "notes": "..."}.
+    """
+    if request.user.user_type != 'ENTREPRISE':
+        return JsonResponse({'error': 'Réservé aux comptes entreprise.'}, status=403)
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Corps JSON invalide.'}, status=400)
+    try:
+        number_of_places = int(payload['number_of_places'])
+        if number_of_places < 1:
+            raise ValueError('Le nombre de places doit être au moins 1.')
+        time_slots = _group_time_slots(payload)
+    except (KeyError, TypeError):
+        return JsonResponse({'error': 'Paramètres manquants ou invalides.'}, status=400)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    
+    result = services.reserve_group(request.user, time_slots, number_of_places, notes=payload.get('notes'))
+    if not result.confirmed:
+        return JsonResponse({
+            'status': 'REJECTED',
+            'requested': number_of_places,
+            'failures': [
+                {'time_slot': time_slot.pk, 'date': time_slot.date.isoformat(), 'available': available}
+                for time_slot, available in result.failures
+            ],
+        }, status=409)
+    return JsonResponse({
+        'status': 'CONFIRMED',
+        'requested': number_of_places,
+        'total_places': result.total_places,
+        'bookings': [
+            {'id': booking.pk, 'time_slot': booking.time_slot_id, 'date': booking.time_slot.date.isoformat()}
+            for booking in result.bookings
+        ],
+    }, status=201)
+
+
 def register(request):
     """
     Page d'inscription.
@@ -183,33 +710,158 @@ def profile(request):
 def establishment_dashboard(request):
     """
     Dashboard pour les gérants d'établissements.
+    
+    Nombre de requêtes fixe quel que soit le volume : les statistiques par
+    établissement et par créneau sont calculées par agrégats SQL sur une
+    période bornée (par défaut les deux prochaines semaines).
     """
     if request.user.user_type != 'ETABLISSEMENT':
         messages.error(request, 'Accès réservé aux établissements.')
         return redirect('index')
     
-    establishments = Establishment.objects.filter(owner=request.user)
+    today = date.today()
+    date_from, date_to = _date_window(request.GET, today, DASHBOARD_DEFAULT_DAYS, DASHBOARD_MAX_DAYS)
+    in_window = Q(time_slots__date__gte=date_from, time_slots__date__lte=date_to)
     
-    # Récupérer tous les créneaux de l'établissement
-    time_slots = TimeSlot.objects.filter(establishment__owner=request.user).select_related('establishment')
+    # Tuiles par établissement : une requête, agrégats sur la période
+    confirmed_bookings = Booking.objects.filter(
+        time_slot__establishment=OuterRef('pk'),
+        time_slot__date__gte=date_from,
+        time_slot__date__lte=date_to,
+        status__in=Booking.OCCUPYING_STATUSES,
+    ).order_by().values('time_slot__establishment').annotate(total=Count('pk')).values('total')
+    establishments = list(Establishment.objects.filter(owner=request.user).annotate(
+        window_slots=Count('time_slots', filter=in_window),
+        window_offered=Coalesce(Sum('time_slots__total_capacity', filter=in_window), 0),
+        window_reserved=Coalesce(Sum('time_slots__reserved_places', filter=in_window), 0),
+        window_bookings=Coalesce(Subquery(confirmed_bookings), 0),
+    ))
+    for establishment in establishments:
+        establishment.fill_rate = _fill_rate(establishment.window_reserved, establishment.window_offered)
     
-    # Récupérer les réservations du jour
-    today = date.today()
-    today_bookings = Booking.objects.filter(
+    # Créneaux de la période, avec leur nombre de réservations confirmées (une requête)
+    time_slots = list(
+        TimeSlot.objects.filter(
+            establishment__owner=request.user, date__gte=date_from, date__lte=date_to,
+        ).select_related('establishment').annotate(
+            confirmed_bookings=Count('bookings', filter=Q(bookings__status__in=Booking.OCCUPYING_STATUSES)),
+        ).order_by('date', 'start_time', 'id')[:DASHBOARD_MAX_SLOTS + 1]
+    )
+    truncated = len(time_slots) > DASHBOARD_MAX_SLOTS
+    time_slots = time_slots[:DASHBOARD_MAX_SLOTS]
+    for slot in time_slots:
+        slot.fill_rate = _fill_rate(slot.reserved_places, slot.total_capacity)
+    
+    # Récupérer les réservations du jour ; présence à pointer une fois le créneau commencé
+    today_bookings = list(Booking.objects.filter(
         time_slot__establishment__owner=request.user,
         time_slot__date=today,
-        status='CONFIRMED'
-    ).select_related('user', 'time_slot')
+        status__in=Booking.OCCUPYING_STATUSES
+    ).select_related('user', 'time_slot', 'time_slot__establishment'))
+    now = timezone.localtime().time()
+    for booking in today_bookings:
+        booking.attendance_open = booking.time_slot.start_time <= now
+    
+    # Jours précédents encore à pointer (voir archive.ATTENDANCE_DAYS)
+    pending_attendance = Booking.objects.filter(
+        time_slot__establishment__owner=request.user,
+        time_slot__date__gte=today - timedelta(days=archive.ATTENDANCE_DAYS),
+        time_slot__date__lt=today,
+        status='CONFIRMED',
+    ).select_related('user', 'time_slot', 'time_slot__establishment').order_by(
+        'time_slot__date', 'time_slot__start_time', 'pk',
+    )[:DASHBOARD_MAX_SLOTS]
     
     context = {
         'establishments': establishments,
         'time_slots': time_slots,
+        'truncated': truncated,
         'today_bookings': today_bookings,
+        'pending_attendance': pending_attendance,
+        'attendance_days': archive.ATTENDANCE_DAYS,
+        'date_from': date_from,
+        'date_to': date_to,
     }
     
     return render(request, 'core/establishment_dashboard.html', context)
 
 
+@login_required
+@require_POST
+def record_attendance(request, pk):
+    """
+    Pointage de la présence d'un client (`attended` : 1 présent, 0 absent)
+    par l'établissement du créneau.
+    """
+    booking = get_object_or_404(Booking, pk=pk, time_slot__establishment__owner=request.user)
+    attended = request.POST.get('attended') == '1'
+    try:
+        services.record_attendance(booking, attended)
+    except ValueError as error:
+        messages.error(request, str(error))
+    else:
+        messages.success(request, f'{booking.user.username} : {booking.get_status_display().lower()}.')
+    return redirect('establishment_dashboard')
+
+
+def _date_window(params, default_from, default_days, max_days):
+    """Période demandée (`from` / `to`), bornée à `max_days` jours."""
+    try:
+        date_from = date.fromisoformat(params.get('from', ''))
+    except ValueError:
+        date_from = default_from
+    try:
+        date_to = date.fromisoformat(params.get('to', ''))
+    except ValueError:
+        date_to = date_from + timedelta(days=default_days - 1)
+    date_to = min(max(date_to, date_from), date_from + timedelta(days=max_days - 1))
+    return date_from, date_to
+
+
+def _fill_rate(reserved, offered):
+    """Taux de remplissage en pourcentage entier."""
+    return round(100 * reserved / offered) if offered else 0
+
+
+@login_required
+@db.replica_reads
+def establishment_analytics(request):
+    """
+    Statistiques d'occupation : remplissage par jour et heure, annulations,
+    absences et meilleurs clients. Lit uniquement les rollups
+    (core/occupancy.py), jamais les réservations.
+    """
+    if request.user.user_type != 'ETABLISSEMENT':
+        messages.error(request, 'Accès réservé aux établissements.')
+        return redirect('index')
+    
+    today = date.today()
+    date_from, date_to = _date_window(
+        request.GET, today - timedelta(days=ANALYTICS_DEFAULT_DAYS - 1), ANALYTICS_DEFAULT_DAYS, ANALYTICS_MAX_DAYS,
+    )
+    establishments = list(Establishment.objects.filter(owner=request.user).only('pk', 'name'))
+    selected = request.GET.get('establishment', '')
+    establishment_ids = [e.pk for e in establishments if not selected or str(e.pk) == selected]
+    
+    series = occupancy.daily_series(establishment_ids, date_from, date_to)
+    grid = occupancy.weekday_hour_grid(establishment_ids, date_from, date_to)
+    context = {
+        'establishments': establishments,
+        'selected_establishment': selected,
+        'date_from': date_from,
+        'date_to': date_to,
+        'summary': occupancy.summary(establishment_ids, date_from, date_to),
+        'grid_hours': grid['hours'],
+        'grid_rows': [(recurrence.WEEKDAY_LABELS[weekday - 1], cells) for weekday, cells in grid['rows']],
+        'series': series,
+        'series_max': max((capacity for _, capacity, _, _ in series), default=0),
+        'top_customers': occupancy.top_customers(establishment_ids, date_from, date_to),
+        'attendance_days': archive.ATTENDANCE_DAYS,
+    }
+    
+    return render(request, 'core/establishment_analytics.html', context)
+
+
 @login_required
 def create_timeslot(request):
     """
@@ -226,13 +878,15 @@ def create_timeslot(request):
         return redirect('create_establishment')
     
     if request.method == 'POST':
-        form = TimeSlotForm(request.POST)
         establishment_id = request.POST.get('establishment')
+        # Établissement connu avant la validation : contrôle des places assises (TimeSlot.clean)
+        instance = TimeSlot()
+        if establishment_id:
+            instance.establishment = get_object_or_404(Establishment, pk=establishment_id, owner=request.user)
+        form = TimeSlotForm(request.POST, instance=instance)
         
         if form.is_valid() and establishment_id:
-            time_slot = form.save(commit=False)
-            time_slot.establishment = get_object_or_404(Establishment, pk=establishment_id, owner=request.user)
-            time_slot.save()
+            form.save()
             messages.success(request, 'Créneau créé avec succès !')
             return redirect('establishment_dashboard')
     else:
@@ -246,6 +900,45 @@ def create_timeslot(request):
     return render(request, 'core/create_timeslot.html', context)
 
 
+@login_required
+def create_recurring_timeslots(request):
+    """
+    Générer des créneaux récurrents : aperçu, puis création en une transaction.
+    """
+    if request.user.user_type != 'ETABLISSEMENT':
+        messages.error(request, 'Accès réservé aux établissements.')
+        return redirect('index')
+    
+    if not Establishment.objects.filter(owner=request.user).exists():
+        messages.warning(request, 'Vous devez d\'abord créer un établissement.')
+        return redirect('create_establishment')
+    
+    form = RecurringTimeSlotForm(request.POST or None, owner=request.user)
+    preview = None
+    
+    if request.method == 'POST' and form.is_valid():
+        establishment = form.cleaned_data['establishment']
+        try:
+            if request.POST.get('action') == 'confirm':
+                result = recurrence.create(establishment, form.rule(), **form.slot_fields())
+                messages.success(request, f'{len(result.to_create)} créneau(x) créé(s).')
+                if result.conflicts:
+                    messages.warning(request, f'{len(result.conflicts)} créneau(x) ignoré(s) car déjà occupé(s).')
+                if result.over_capacity:
+                    messages.warning(request, f'{len(result.over_capacity)} créneau(x) ignoré(s) : places assises insuffisantes.')
+                return redirect('establishment_dashboard')
+            preview = recurrence.plan(establishment, form.rule(), **form.slot_fields())
+        except ValueError as error:
+            form.add_error(None, str(error))
+    
+    context = {
+        'form': form,
+        'preview': preview,
+    }
+    
+    return render(request, 'core/create_recurring_timeslots.html', context)
+
+
 @login_required
 def create_establishment(request):
     """
@@ -333,3 +1026,12 @@ def edit_timeslot(request, pk):
     }
     
     return render(request, 'core/edit_timeslot.html', context)
+
+
+@staff_member_required
+def metrics_view(request):
+    """
+    Mesures des dernières requêtes par nom d'URL, au format texte de
+    Prometheus (voir core/metrics.py). Réservé au staff.
+    """
+    return HttpResponse(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # En premier : mesure aussi le coût des autres middlewares (voir core/metrics.py)
+    'core.middleware.InstrumentationMiddleware',
+    'core.middleware.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -63,6 +67,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'core.context_processors.unread_notifications',
             ],
         },
     },
@@ -70,17 +75,148 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'workandvibe_project.wsgi.application'
 
+# Variantes async des vues publiques en lecture (accueil, détail d'un
+# créneau, disponibilités), pour un déploiement ASGI : ASYNC_VIEWS=1. Sous
+# WSGI, chaque vue async coûterait une boucle d'événements. Désactivées par
+# défaut : rendu et ORM restant synchrones, elles ne sont pas plus rapides
+# sur ce code (voir bench_asgi).
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS') == '1'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
+# Profil choisi par l'environnement : DB_ENGINE=sqlite (défaut) ou postgresql.
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+# PRAGMA appliqués à chaque connexion SQLite (voir core/db.py). WAL : les
+# lectures ne bloquent plus derrière les écritures. SQLITE_PROFILE=default
+# garde le comportement SQLite d'origine (comparaison, voir bench_sqlite_profiles).
+SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'tuned')
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+} if SQLITE_PROFILE == 'tuned' else {}
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'workandvibe'),
+            'USER': os.environ.get('DB_USER', 'workandvibe'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            # Connexions persistantes, vérifiées avant réutilisation
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            # Les exports (QuerySet.iterator) lisent par curseur serveur ; à
+            # désactiver derrière PgBouncer en mode transaction
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('DB_DISABLE_SERVER_SIDE_CURSORS') == '1',
+            'OPTIONS': {
+                'connect_timeout': 5,
+            },
+        }
+    }
+    if os.environ.get('DB_POOL') == '1':
+        # Pool psycopg 3 dans le processus (remplace les connexions persistantes)
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 20)),
+            'timeout': 10,
+        }
+elif DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+        }
+    }
+    if SQLITE_PROFILE == 'tuned':
+        DATABASES['default']['OPTIONS'] = {
+            # Attente du verrou d'écriture (secondes) avant « database is locked ».
+            # Transactions DEFERRED : seuls les chemins d'écriture prennent le
+            # verrou dès BEGIN (core.db.write_transaction)
+            'timeout': 20,
+        }
+else:
+    raise ValueError(f'DB_ENGINE inconnu : {DB_ENGINE} (sqlite ou postgresql).')
+
+# Réplique en lecture (voir core/db.py) : DB_REPLICA_NAME (SQLite, second
+# fichier tenu à jour par sync_sqlite_replica) ou DB_REPLICA_HOST
+# (PostgreSQL). Accueil, recherche, détail, API et statistiques y lisent.
+READ_REPLICA_ALIAS = 'replica'
+DB_REPLICA_NAME = os.environ.get('DB_REPLICA_NAME')
+DB_REPLICA_HOST = os.environ.get('DB_REPLICA_HOST')
+if DB_REPLICA_NAME or DB_REPLICA_HOST:
+    DATABASES[READ_REPLICA_ALIAS] = {
+        **DATABASES['default'],
+        'OPTIONS': dict(DATABASES['default'].get('OPTIONS', {})),
+        # En test, la réplique est la base de test par défaut
+        'TEST': {'MIRROR': 'default'},
+    }
+    if DB_REPLICA_NAME:
+        DATABASES[READ_REPLICA_ALIAS]['NAME'] = DB_REPLICA_NAME
+    if DB_REPLICA_HOST:
+        DATABASES[READ_REPLICA_ALIAS]['HOST'] = DB_REPLICA_HOST
+        DATABASES[READ_REPLICA_ALIAS]['PORT'] = os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT'])
+
+DATABASE_ROUTERS = ['core.db.ReplicaRouter']
+# Après une écriture, la session lit sur le primaire pendant ce délai
+# (secondes), supérieur au retard de réplication attendu
+REPLICA_PIN_SECONDS = int(os.environ.get('DB_REPLICA_PIN_SECONDS', 5))
+
 
-DATABASES = {
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Mémoire locale par défaut (un cache par processus). En production multi-processus,
+# préférer un backend partagé (FileBasedCache, Redis...) pour que l'invalidation
+# du listing (core/listing_cache.py) soit vue par tous les workers.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'workandvibe',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
 }
 
+# Broker pub/sub des places disponibles en temps réel (voir core/realtime.py).
+# Le broker en mémoire ne relie que les clients d'un même processus.
+REALTIME_BROKER = 'core.realtime.InMemoryBroker'
+
+# Miniatures des logos et avatars (voir core/images.py), produites après le
+# commit par un pool de threads ; False : traitement synchrone.
+IMAGE_PIPELINE_ASYNC = True
+IMAGE_PIPELINE_WORKERS = 2
+
+# Mesures par requête (voir core/metrics.py), exposées au staff sur /metrics.
+# Taille du tampon circulaire : nombre de requêtes dans la fenêtre agrégée.
+METRICS_BUFFER_SIZE = 2048
+# Budget de requêtes SQL par nom d'URL, indépendant du volume de données.
+# Dépassement journalisé ; QUERY_BUDGET_STRICT le transforme en erreur (tests).
+QUERY_BUDGETS = {
+    'index': 12,
+    'index_more': 8,
+    'timeslot_detail': 10,
+    'my_bookings': 8,
+    'my_bookings_history': 8,
+    'establishment_dashboard': 10,
+    'establishment_analytics': 12,
+    'api_time_slot_list': 3,
+    'api_time_slot_detail': 3,
+    'api_establishment_list': 3,
+    'api_establishment_detail': 3,
+    'api_availability': 2,
+}
+QUERY_BUDGET_STRICT = False
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators